@@ -1,15 +1,43 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from pymongo import MongoClient
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure
 from bson.objectid import ObjectId
-from werkzeug.security import generate_password_hash, check_password_hash
+from bson.errors import InvalidId
+from werkzeug.security import check_password_hash
 from functools import wraps
+from migraciones import (aplicar_migraciones, migraciones_en_curso, verificar_planes, registrar_comandos,
+                         PlanConsultaError, RETENCION_TOMBSTONES_DIAS)
+from catalogo import TOURS_PREDEFINIDOS, TEMPORADAS
+from respuestas_estaticas import precalculada, precalcular
+from cache import CacheTTL
+from cache_itinerarios import CacheItinerarios, ruta_compartida_desde_entorno
+from fragmentos import configurar_plantillas
+from archivo import registrar_comandos_archivo, restaurar_itinerario
+from datos import registrar_comandos_datos, validar_destino, validar_itinerario, validar_usuario, ValidacionError
+from modelos import Destino, Itinerario, Usuario
+from conexion import ConexionMongo, opciones_desde_entorno
+from metricas import Metricas
+from consultas_lentas import RegistroConsultasLentas
+from cotizaciones import MotorCotizaciones, CotizacionError, columnas_json, generar_csv, DIAS_CALENDARIO
+from busqueda import construir_indice, agregar_destino, eliminar_destino
+from serializacion import linea_ndjson
+from mapa import pipeline_mapa, mapa_serializado
+from planificacion import PlanificadorViajes
+from rutas import ordenar_paradas, RutaError
 import os
+import heapq
+import time
+import threading
 import datetime
 from datetime import timedelta
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET", "travelasia-secret-key-2024")
 
+# Métricas por ruta y de MongoDB, agregadas entre workers en METRICAS_DIR y servidas en /metrics
+metricas = Metricas(os.environ.get("METRICAS_DIR"))
+metricas.instrumentar(app)
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -22,166 +50,92 @@ def login_required(f):
 # Configuración de MongoDB Atlas 
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/travelasia_db")
 
-try:
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=10000)  # Aumentado a 10s
-    db = client.travelasia_db
-    destinos_collection = db.destinos
-    usuarios_collection = db.usuarios
-    itinerarios_collection = db.itinerarios
-    
-    # Test de conexión más robusto
-    client.admin.command('ping')
-    print("✅ ¡CONECTADO A MONGODB ATLAS! - TravelAsia")
-    print(f"✅ Base de datos: {db.name}")
-    print(f"✅ Colecciones disponibles: {db.list_collection_names()}")
-    
-except Exception as e:
-    db = None
-    destinos_collection = None
-    usuarios_collection = None
-    itinerarios_collection = None
-    print(f"❌ Error MongoDB: {e}")
-    print("⚠️ La aplicación funcionará en modo demo sin base de datos")
-
-# DATOS DE TODOS LOS TOURS PREDEFINIDOS
-TOURS_PREDEFINIDOS = {
-    "japon": {
-        "nombre": "Tour Japón Esencial",
-        "pais": "Japón",
-        "ciudad": "Tokio, Kioto, Osaka",
-        "duracion": "10 días",
-        "precio_base": 1500,
-        "incluye": ["Hoteles 4*", "Vuelos internos", "Guía turístico", "Desayunos"],
-        "imagen": "https://images.unsplash.com/photo-1493976040374-85c8e12f0c0e?ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D&auto=format&fit=crop&w=600&q=80",
-        "descripcion": "Descubre lo mejor de Japón: desde el moderno Tokio hasta los templos ancestrales de Kioto."
-    },
-    "tailandia": {
-        "nombre": "Aventura Tailandia",
-        "pais": "Tailandia", 
-        "ciudad": "Bangkok, Phuket, Chiang Mai",
-        "duracion": "12 días",
-        "precio_base": 1200,
-        "incluye": ["Hoteles 4*", "Tours incluidos", "Algunas comidas", "Transporte"],
-        "imagen": "https://images.unsplash.com/photo-1552465011-b4e21bf6e79a?w=600",
-        "descripcion": "Playas paradisíacas, templos budistas y la vibrante vida nocturna de Bangkok."
-    },
-    "vietnam": {
-        "nombre": "Vietnam Clásico",
-        "pais": "Vietnam",
-        "ciudad": "Hanoi, Halong Bay, Ho Chi Minh",
-        "duracion": "9 días",
-        "precio_base": 900,
-        "incluye": ["Hoteles 3-4*", "Crucero en Halong Bay", "Todas las comidas", "Guía local"],
-        "imagen": "https://images.unsplash.com/photo-1583417319070-4a69db38a482?w=600",
-        "descripcion": "Explora la rica historia y paisajes espectaculares de Vietnam."
-    },
-    "china": {
-        "nombre": "Gran Tour de China",
-        "pais": "China",
-        "ciudad": "Beijing, Shanghai, Gran Muralla",
-        "duracion": "14 días",
-        "precio_base": 1100,
-        "incluye": ["Hoteles 4*", "Entradas a atracciones", "Tren bala", "Guía español"],
-        "imagen": "https://images.unsplash.com/photo-1508804185872-d7badad00f7d?w=600",
-        "descripcion": "Descubre la milenaria cultura china y sus maravillas modernas."
-    },
-    "corea": {
-        "nombre": "Corea del Sur Completa",
-        "pais": "Corea del Sur",
-        "ciudad": "Seúl, Busan, Jeju Island",
-        "duracion": "11 días",
-        "precio_base": 1300,
-        "incluye": ["Hoteles 4*", "Vuelo a Jeju", "Tours K-pop", "Comidas típicas"],
-        "imagen": "https://images.unsplash.com/photo-1534274867514-d5b47ef89ed7?w=600",
-        "descripcion": "Experimenta la mezcla única de tradición y modernidad en Corea."
-    },
-    "indonesia": {
-        "nombre": "Paraíso de Bali",
-        "pais": "Indonesia",
-        "ciudad": "Bali, Ubud, Seminyak",
-        "duracion": "8 días",
-        "precio_base": 800,
-        "incluye": ["Villas de lujo", "Spa y yoga", "Tours culturales", "Desayunos"],
-        "imagen": "https://images.unsplash.com/photo-1537953773345-d172ccf13cf1?w=600",
-        "descripcion": "Relájate en las playas y templos del paraíso indonesio."
-    },
-    "malasia": {
-        "nombre": "Malasia Diversa",
-        "pais": "Malasia",
-        "ciudad": "Kuala Lumpur, Penang, Langkawi",
-        "duracion": "10 días",
-        "precio_base": 950,
-        "incluye": ["Hoteles 4*", "Vuelos domésticos", "City tours", "Desayunos"],
-        "imagen": "https://images.unsplash.com/photo-1596422846543-75c6fc197f07?w=600",
-        "descripcion": "Descubre la diversidad cultural y natural de Malasia."
-    },
-    "singapur": {
-        "nombre": "Singapur Moderno",
-        "pais": "Singapur",
-        "ciudad": "Singapur",
-        "duracion": "5 días",
-        "precio_base": 1400,
-        "incluye": ["Hotel 5*", "Entradas a atracciones", "Tour gastronómico", "Transporte"],
-        "imagen": "https://images.unsplash.com/photo-1525625293386-3f8f99389edd?w=600",
-        "descripcion": "Vive la experiencia futurista de la ciudad jardín de Singapur."
-    },
-    "india": {
-        "nombre": "India Mística",
-        "pais": "India",
-        "ciudad": "Delhi, Agra, Jaipur",
-        "duracion": "12 días",
-        "precio_base": 850,
-        "incluye": ["Hoteles 4*", "Visita al Taj Mahal", "Guía local", "Desayunos"],
-        "imagen": "https://images.unsplash.com/photo-1524492412937-b28074a5d7da?w=600",
-        "descripcion": "Sumérgete en la cultura y espiritualidad de la India."
-    },
-    "filipinas": {
-        "nombre": "Islas Filipinas",
-        "pais": "Filipinas",
-        "ciudad": "Palawan, Cebu, Boracay",
-        "duracion": "10 días",
-        "precio_base": 1100,
-        "incluye": ["Resorts playeros", "Tours de snorkel", "Transporte entre islas", "Desayunos"],
-        "imagen": "https://images.unsplash.com/photo-1558642084-fd07fae5282e?w=600",
-        "descripcion": "Descubre las playas más hermosas del mundo en Filipinas."
-    },
-    "sri-lanka": {
-        "nombre": "Perla del Índico",
-        "pais": "Sri Lanka",
-        "ciudad": "Colombo, Kandy, Galle",
-        "duracion": "9 días",
-        "precio_base": 950,
-        "incluye": ["Hoteles boutique", "Safari en Yala", "Tren montañoso", "Guía"],
-        "imagen": "https://images.unsplash.com/photo-1573804633921-5c87f5d3a1c9?w=600",
-        "descripcion": "Explora los tesoros naturales y culturales de Sri Lanka."
-    },
-    "camboya": {
-        "nombre": "Reino de Angkor",
-        "pais": "Camboya",
-        "ciudad": "Siem Reap, Phnom Penh",
-        "duracion": "7 días",
-        "precio_base": 750,
-        "incluye": ["Hoteles 4*", "Entrada a Angkor Wat", "Tour histórico", "Desayunos"],
-        "imagen": "https://images.unsplash.com/photo-1560169897-fc0cdbdfa4d5?w=600",
-        "descripcion": "Maravíllate con los templos ancestrales de Angkor Wat."
-    }
-}
-
-# COORDENADAS DE PAÍSES PARA EL MAPA
-COORDENADAS_PAISES = {
-    "Japón": {"lat": 36.2048, "lng": 138.2529, "zoom": 5},
-    "Tailandia": {"lat": 15.8700, "lng": 100.9925, "zoom": 5},
-    "Vietnam": {"lat": 14.0583, "lng": 108.2772, "zoom": 5},
-    "China": {"lat": 35.8617, "lng": 104.1954, "zoom": 4},
-    "Corea del Sur": {"lat": 35.9078, "lng": 127.7669, "zoom": 6},
-    "Indonesia": {"lat": -0.7893, "lng": 113.9213, "zoom": 5},
-    "Malasia": {"lat": 4.2105, "lng": 101.9758, "zoom": 6},
-    "Singapur": {"lat": 1.3521, "lng": 103.8198, "zoom": 11},
-    "India": {"lat": 20.5937, "lng": 78.9629, "zoom": 4},
-    "Filipinas": {"lat": 12.8797, "lng": 121.7740, "zoom": 5},
-    "Sri Lanka": {"lat": 7.8731, "lng": 80.7718, "zoom": 7},
-    "Camboya": {"lat": 12.5657, "lng": 104.9910, "zoom": 6}
-}
+# El cliente se crea en el primer uso y uno por worker (seguro ante el fork de gunicorn).
+# Pool y timeouts: MONGO_MAX_POOL, MONGO_MIN_POOL, MONGO_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS...
+# La base de datos es MONGO_DB (travelasia_db por defecto)
+escuchas_mongodb = metricas.escuchas_mongodb()
+conexion = ConexionMongo(MONGO_URI, os.environ.get("MONGO_DB", "travelasia_db"),
+                         event_listeners=escuchas_mongodb,
+                         **opciones_desde_entorno())
+
+# Diagnóstico: comandos más lentos que CONSULTAS_LENTAS_MS se explican y se guardan en `consultas_lentas`
+if os.environ.get("CONSULTAS_LENTAS_MS"):
+    escuchas_mongodb.append(RegistroConsultasLentas(
+        conexion.cliente, float(os.environ["CONSULTAS_LENTAS_MS"]), conexion.nombre_db
+    ))
+
+def obtener_db():
+    """Base de datos del worker, o None en modo demo (URI inválida o servidor caído)"""
+    return conexion.db()
+
+def destinos_collection():
+    return conexion.coleccion("destinos")
+
+def usuarios_collection():
+    return conexion.coleccion("usuarios")
+
+def itinerarios_collection():
+    return conexion.coleccion("itinerarios")
+
+def itinerarios_archivo_collection():
+    return conexion.coleccion("itinerarios_archivo")
+
+def itinerarios_eliminados_collection():
+    return conexion.coleccion("itinerarios_eliminados")
+
+# Motor de precios compartido por el formulario y la API de lotes.
+# Las reglas de temporada se compilan aquí, una vez por worker.
+motor_cotizaciones = MotorCotizaciones(TOURS_PREDEFINIDOS, TEMPORADAS)
+
+# Planificación de itinerarios automáticos (catálogo de tours + destinos de los países elegidos)
+planificador_viajes = PlanificadorViajes(TOURS_PREDEFINIDOS)
+MAX_DESTINOS_PLAN = 200
+
+# LISTADO DE DESTINOS DE LA PÁGINA PRINCIPAL (solo los campos que pintan las tarjetas)
+DESTINOS_POR_PAGINA = int(os.environ.get("DESTINOS_POR_PAGINA", 12))
+cache_destinos = CacheTTL(max_entradas=64, ttl=int(os.environ.get("CACHE_DESTINOS_TTL", 300)))
+
+# BÚSQUEDA DE DESTINOS (índice invertido en memoria, reconstruido cada REINDEXAR_CADA segundos)
+REINDEXAR_CADA = int(os.environ.get("REINDEXAR_CADA", 600))
+MAX_RESULTADOS_BUSQUEDA = 50
+indice_busqueda = None
+indice_busqueda_construido = 0.0
+indice_busqueda_lock = threading.Lock()
+
+# MAPA DEL PLANIFICADOR (GeoJSON por usuario ya serializado, por revisión usuarios.rev_itinerarios)
+cache_mapa = CacheTTL(max_entradas=256, ttl=int(os.environ.get("CACHE_MAPA_TTL", 300)))
+
+# ITINERARIOS COMPLETOS POR (id, usuario): caché local y, con varios workers, compartida entre ellos
+cache_itinerarios = CacheItinerarios(
+    max_entradas=int(os.environ.get("CACHE_ITINERARIOS_MAX", 512)),
+    ttl=int(os.environ.get("CACHE_ITINERARIOS_TTL", 60)),
+    ruta_compartida=ruta_compartida_desde_entorno(conexion.nombre_db),
+    contar=lambda resultado: metricas.registro.incrementar(
+        "travelasia_cache_itinerarios_total", [("resultado", resultado)])
+)
+
+# PLANTILLAS: fragmentos HTML por (itinerario, fecha_actualizacion) y bytecode de Jinja en disco
+cache_fragmentos = CacheTTL(max_entradas=int(os.environ.get("CACHE_FRAGMENTOS_MAX", 4096)),
+                            ttl=int(os.environ.get("CACHE_FRAGMENTOS_TTL", 600)))
+configurar_plantillas(app, cache_fragmentos, os.environ.get("JINJA_BYTECODE_DIR"))
+
+# PAGINACIÓN DE ITINERARIOS (keyset sobre fecha_creacion + _id)
+ITINERARIOS_POR_PAGINA = int(os.environ.get("ITINERARIOS_POR_PAGINA", 20))
+MAX_ITINERARIOS_POR_PAGINA = 100
+# Operaciones en lote sobre actividades (una sola ida y vuelta a MongoDB)
+MAX_ACTIVIDADES_LOTE = 200
+
+# Sincronización incremental (/api/itinerarios/cambios)
+MAX_CAMBIOS_POR_PAGINA = 500
+ID_MINIMO = ObjectId("0" * 24)
+
+# Documentos por lote del cursor en la exportación NDJSON (memoria constante por worker)
+NDJSON_BATCH_SIZE = int(os.environ.get("NDJSON_BATCH_SIZE", 500))
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Estadísticas por usuario materializadas en usuarios.estadisticas (se mantienen con $inc,
+# protegidas por la revisión usuarios.rev_estadisticas)
+ESTADISTICAS_MATERIALIZADAS = os.environ.get("ESTADISTICAS_MATERIALIZADAS", "1") == "1"
 
 # ========== FUNCIONES UTILITARIAS ==========
 
@@ -196,10 +150,15 @@ def calcular_duracion_dias(fecha_inicio, fecha_fin):
 
 def calcular_porcentaje_completado(itinerario):
     """Calcula el porcentaje de completado del itinerario"""
-    if not itinerario.get('actividades'):
+    # Contadores mantenidos con $inc: no hace falta cargar las actividades
+    if 'actividades_total' in itinerario:
+        total_actividades = itinerario['actividades_total']
+        completadas = itinerario.get('actividades_completadas', 0)
+    elif itinerario.get('actividades'):
+        total_actividades = len(itinerario['actividades'])
+        completadas = sum(1 for act in itinerario['actividades'] if act.get('completada', False))
+    else:
         return 0
-    total_actividades = len(itinerario['actividades'])
-    completadas = sum(1 for act in itinerario['actividades'] if act.get('completada', False))
     return int((completadas / total_actividades) * 100) if total_actividades > 0 else 0
 
 def calcular_porcentaje_presupuesto(itinerario):
@@ -210,41 +169,373 @@ def calcular_porcentaje_presupuesto(itinerario):
     return 0
 
 def generar_itinerario_automatico(datos_ia, user_id):
-    """Genera un itinerario automático basado en las preferencias del usuario"""
-    
-    # Lógica de sugerencia de países según tipo de viaje
-    sugerencias_paises = {
-        'cultural': ['Japón', 'Corea del Sur', 'China'],
-        'aventura': ['Tailandia', 'Vietnam', 'Indonesia'],
-        'relax': ['Tailandia', 'Indonesia', 'Filipinas'],
-        'gastronomia': ['Japón', 'Tailandia', 'Vietnam'],
-        'shopping': ['Corea del Sur', 'Japón', 'Singapur']
-    }
-    
-    paises = sugerencias_paises.get(datos_ia['tipo_viaje'], ['Japón', 'Tailandia'])
-    
-    # Calcular fechas
-    fecha_inicio = (datetime.datetime.now() + datetime.timedelta(days=30)).strftime('%Y-%m-%d')
-    fecha_fin = (datetime.datetime.now() + datetime.timedelta(days=30 + datos_ia['duracion'])).strftime('%Y-%m-%d')
-    
+    """Genera un itinerario automático con actividades día a día según las preferencias del usuario"""
+    parametros = (datos_ia['presupuesto'], datos_ia['duracion'], datos_ia['tipo_viaje'], datos_ia['viajeros'])
+    paises = planificador_viajes.elegir_paises(*parametros)
+    # Los días se reparten en el orden de la ruta más corta entre los países elegidos
+    claves_por_pais = {TOURS_PREDEFINIDOS[clave]['pais']: clave for clave in paises}
+    ruta = ordenar_paradas(list(claves_por_pais))
+    paises = [claves_por_pais[pais] for pais in ruta['paradas']]
+
+    # Destinos de la comunidad en los países elegidos (consulta por el índice de pais)
+    destinos = []
+    if obtener_db() is not None:
+        nombres_paises = [TOURS_PREDEFINIDOS[clave]['pais'] for clave in paises]
+        destinos = list(destinos_collection().find(
+            {"pais": {"$in": nombres_paises}}, Destino.proyeccion("plan")
+        ).limit(MAX_DESTINOS_PLAN))
+
+    fecha_inicio = (datetime.datetime.now() + datetime.timedelta(days=30)).date()
+    plan = planificador_viajes.planificar(*parametros, destinos=destinos, paises=paises, fecha_inicio=fecha_inicio)
+
+    ahora = datetime.datetime.utcnow()
+    actividades = [dict(actividad, _id=ObjectId(), completada=False, fecha_creacion=ahora)
+                   for actividad in plan['actividades']]
     return {
         'usuario_id': ObjectId(user_id),
         'nombre_viaje': f"Viaje {datos_ia['tipo_viaje'].title()} - {datos_ia['duracion']} días",
-        'paises': paises[:2],  # Máximo 2 países para no complicar
-        'fecha_inicio': fecha_inicio,
-        'fecha_fin': fecha_fin,
+        'paises': plan['paises'],
+        'ciudades': plan['ciudades'],
+        'ruta_km': ruta['distancia_km'],
+        'fecha_inicio': plan['fecha_inicio'],
+        'fecha_fin': plan['fecha_fin'],
         'presupuesto_total': datos_ia['presupuesto'],
-        'presupuesto_restante': datos_ia['presupuesto'],
-        'descripcion': f'Itinerario generado automáticamente para {datos_ia["viajeros"]}. Tipo: {datos_ia["tipo_viaje"]}',
+        'presupuesto_restante': datos_ia['presupuesto'] - plan['costo_actividades'],
+        'descripcion': f'Itinerario generado automáticamente para {datos_ia["viajeros"]}. Tipo: {datos_ia["tipo_viaje"]}. '
+                       f'Ruta: {", ".join(plan["ciudades"])}',
         'estado': 'planificando',
-        'actividades': [],
+        'actividades': actividades,
+        'actividades_total': len(actividades),
+        'actividades_completadas': 0,
         'duracion_dias': datos_ia['duracion'],
-        'fecha_creacion': datetime.datetime.utcnow(),
-        'fecha_actualizacion': datetime.datetime.utcnow(),
+        'fecha_creacion': ahora,
+        'fecha_actualizacion': ahora,
         'generado_ia': True,
         'prioridad': 'media'
     }
 
+def codificar_posicion(fecha, oid):
+    """Codifica una posición (fecha, _id) como cursor opaco '<ms>_<id>'"""
+    ms = (fecha - EPOCH) // timedelta(milliseconds=1)
+    return f"{ms}_{oid}"
+
+def codificar_cursor(itinerario):
+    """Cursor de la lista de itinerarios (orden por fecha_creacion)"""
+    return codificar_posicion(itinerario['fecha_creacion'], itinerario['_id'])
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha_creacion, _id) de un cursor; lanza ValueError si no es válido"""
+    try:
+        ms, oid = cursor.split('_', 1)
+        return EPOCH + timedelta(milliseconds=int(ms)), ObjectId(oid)
+    except (ValueError, TypeError, InvalidId):
+        raise ValueError(f"Cursor inválido: {cursor}")
+
+def obtener_limite_pagina(valor):
+    """Normaliza el tamaño de página pedido por el cliente"""
+    try:
+        limite = int(valor)
+    except (ValueError, TypeError):
+        return ITINERARIOS_POR_PAGINA
+    return max(1, min(limite, MAX_ITINERARIOS_POR_PAGINA))
+
+def filtro_desde_cursor(user_id, cursor=None):
+    """Filtro de los itinerarios del usuario posteriores (en el orden de la lista) a un cursor"""
+    filtro = {"usuario_id": ObjectId(user_id)}
+    if cursor:
+        fecha_creacion, oid = decodificar_cursor(cursor)
+        filtro["$or"] = [
+            {"fecha_creacion": {"$lt": fecha_creacion}},
+            {"fecha_creacion": fecha_creacion, "_id": {"$lt": oid}}
+        ]
+    return filtro
+
+def decodificar_desde(desde):
+    """Posición (fecha, _id) del parámetro `desde`: un cursor de cambios, milisegundos o fecha ISO"""
+    if "_" in desde:
+        return decodificar_cursor(desde)
+    try:
+        if desde.isdigit():
+            return EPOCH + timedelta(milliseconds=int(desde)), ID_MINIMO
+        fecha = datetime.datetime.fromisoformat(desde.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Parámetro desde inválido: {desde}")
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return fecha, ID_MINIMO
+
+def filtro_posterior(campo, posicion):
+    """Condición keyset ascendente: documentos después de (fecha, _id) en el orden (campo, _id)"""
+    fecha, oid = posicion
+    return {"$or": [
+        {campo: {"$gt": fecha}},
+        {campo: fecha, "_id": {"$gt": oid}}
+    ]}
+
+def itinerario_api(itinerario):
+    """Representación de un itinerario en la API (ids como texto y porcentajes calculados)"""
+    itinerario['_id'] = str(itinerario['_id'])
+    itinerario['usuario_id'] = str(itinerario['usuario_id'])
+    itinerario['porcentaje_completado'] = calcular_porcentaje_completado(itinerario)
+    itinerario['porcentaje_presupuesto'] = calcular_porcentaje_presupuesto(itinerario)
+    return itinerario
+
+def paginar_itinerarios(user_id, cursor=None, limite=ITINERARIOS_POR_PAGINA, proyeccion=None,
+                        incluir_archivados=False):
+    """Obtiene una página de itinerarios del usuario, del más reciente al más antiguo.
+
+    Usa paginación por cursor (keyset) sobre (fecha_creacion, _id), así el coste
+    de cada página no depende de cuántos itinerarios tenga la cuenta.
+    Con incluir_archivados mezcla también los de `itinerarios_archivo`.
+    Devuelve (itinerarios, siguiente_cursor); siguiente_cursor es None en la última página.
+    """
+    filtro = filtro_desde_cursor(user_id, cursor)
+    orden = [("fecha_creacion", -1), ("_id", -1)]
+    # Pedimos uno de más para saber si existe una página siguiente
+    itinerarios = list(itinerarios_collection().find(filtro, proyeccion).sort(orden).limit(limite + 1))
+    if incluir_archivados:
+        archivados = list(itinerarios_archivo_collection().find(filtro, proyeccion).sort(orden).limit(limite + 1))
+        # Las dos listas vienen en el mismo orden: se mezclan y se corta como si fueran una
+        itinerarios = list(heapq.merge(itinerarios, archivados, reverse=True,
+                                       key=lambda it: (it["fecha_creacion"], it["_id"])))[:limite + 1]
+    
+    siguiente_cursor = None
+    if len(itinerarios) > limite:
+        itinerarios = itinerarios[:limite]
+        siguiente_cursor = codificar_cursor(itinerarios[-1])
+    return itinerarios, siguiente_cursor
+
+def resumen_vacio():
+    """Resumen de estadísticas para un usuario sin itinerarios"""
+    return {
+        'total': 0,
+        'planificando': 0,
+        'activos': 0,
+        'favoritos': 0,
+        'presupuesto_total': 0,
+        'dias_totales': 0,
+        'paises_unicos': 0
+    }
+
+def resumen_itinerarios(user_id):
+    """Estadísticas de todos los itinerarios del usuario en una sola agregación"""
+    resultado = list(itinerarios_collection().aggregate([
+        {"$match": {"usuario_id": ObjectId(user_id)}},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "planificando": {"$sum": {"$cond": [{"$eq": ["$estado", "planificando"]}, 1, 0]}},
+            "activos": {"$sum": {"$cond": [{"$eq": ["$estado", "activo"]}, 1, 0]}},
+            "favoritos": {"$sum": {"$cond": [{"$eq": ["$favorito", True]}, 1, 0]}},
+            "presupuesto_total": {"$sum": "$presupuesto_total"},
+            "dias_totales": {"$sum": "$duracion_dias"},
+            "paises": {"$addToSet": {"$ifNull": ["$paises", []]}}
+        }},
+        {"$project": {
+            "_id": 0,
+            "total": 1,
+            "planificando": 1,
+            "activos": 1,
+            "favoritos": 1,
+            "presupuesto_total": 1,
+            "dias_totales": 1,
+            "paises_unicos": {"$size": {"$reduce": {
+                "input": "$paises",
+                "initialValue": [],
+                "in": {"$setUnion": ["$$value", "$$this"]}
+            }}}
+        }}
+    ]))
+    resumen = resumen_vacio()
+    if resultado:
+        resumen.update(resultado[0])
+    return resumen
+
+def estadisticas_usuario(user_id):
+    """Estadísticas que muestra el perfil, calculadas con una sola agregación (sin los archivados)"""
+    resumen = resumen_itinerarios(user_id)
+    return {
+        'itinerarios_count': resumen['total'],
+        'viajes_activos': resumen['activos'],
+        'presupuesto_total': resumen['presupuesto_total']
+    }
+
+def delta_estadisticas(itinerario, signo=1):
+    """Incrementos que un itinerario aporta (signo=1) o retira (signo=-1) de las estadísticas"""
+    return {
+        'estadisticas.itinerarios_count': signo,
+        'estadisticas.viajes_activos': signo if itinerario.get('estado') == 'activo' else 0,
+        'estadisticas.presupuesto_total': signo * itinerario.get('presupuesto_total', 0)
+    }
+
+def iniciar_cambio_estadisticas(user_id):
+    """Primera fase de una escritura que cambia las estadísticas: sube usuarios.rev_estadisticas.
+
+    Se llama antes de escribir el itinerario y devuelve la revisión anterior
+    (None si no hay estadísticas materializadas), que luego se pasa a
+    actualizar_estadisticas().
+    """
+    if not ESTADISTICAS_MATERIALIZADAS or obtener_db() is None:
+        return None
+    try:
+        usuario = usuarios_collection().find_one_and_update(
+            {"_id": ObjectId(user_id)}, {"$inc": {"rev_estadisticas": 1}},
+            projection={"rev_estadisticas": 1}, return_document=ReturnDocument.AFTER
+        )
+    except Exception as e:
+        print(f"❌ Error actualizando estadísticas: {e}")
+        return None
+    return usuario["rev_estadisticas"] - 1 if usuario else None
+
+def actualizar_estadisticas(user_id, revision, incrementos):
+    """Segunda fase: aplica los incrementos a las estadísticas materializadas.
+
+    /profile guarda la copia con la revisión que leyó antes de agregar
+    (estadisticas_rev) y solo si nadie la subió mientras agregaba. Los
+    incrementos se aplican si la copia es anterior a esta escritura y ninguna
+    otra empezó entretanto; si no, se sube la revisión, la copia queda
+    obsoleta y /profile la recalcula. Así una escritura nunca se cuenta dos
+    veces ni se pierde.
+    """
+    if revision is None:
+        return
+    try:
+        resultado = usuarios_collection().update_one(
+            {"_id": ObjectId(user_id), "estadisticas_rev": revision, "rev_estadisticas": revision + 1},
+            {"$inc": dict(incrementos, rev_estadisticas=1), "$set": {"estadisticas_rev": revision + 2}}
+        )
+        if resultado.matched_count == 0:
+            usuarios_collection().update_one({"_id": ObjectId(user_id)}, {"$inc": {"rev_estadisticas": 1}})
+    except Exception as e:
+        print(f"❌ Error actualizando estadísticas: {e}")
+
+def obtener_itinerario(itinerario_id, user_id):
+    """Itinerario completo del usuario (o None) a través de la caché de lectura.
+
+    Si no está en la colección principal se busca en el archivo (lleva `fecha_archivado`).
+    """
+    oid = ObjectId(itinerario_id)
+    filtro = {"_id": oid, "usuario_id": ObjectId(user_id)}
+    return cache_itinerarios.obtener(str(oid), str(user_id), lambda: (
+        itinerarios_collection().find_one(filtro) or itinerarios_archivo_collection().find_one(filtro)
+    ))
+
+def invalidar_caches_usuario(user_id, itinerario_id=None):
+    """Descarta lo cacheado de un usuario tras modificar sus itinerarios o actividades.
+
+    El mapa se cachea por revisión del usuario: subirla en MongoDB deja obsoletas
+    las copias de todos los workers, no solo la de este.
+    """
+    if obtener_db() is not None:
+        usuarios_collection().update_one({"_id": ObjectId(user_id)}, {"$inc": {"rev_itinerarios": 1}})
+    if itinerario_id is not None:
+        invalidar_cache_itinerario(user_id, itinerario_id)
+
+def invalidar_cache_itinerario(user_id, itinerario_id):
+    """Descarta la copia cacheada de un itinerario (también la usa `flask archivo`)"""
+    cache_itinerarios.invalidar(str(ObjectId(itinerario_id)), str(user_id))
+
+def filtro_actividad(itinerario_id, actividad_id, user_id):
+    """Filtro que localiza un itinerario del usuario que contiene la actividad"""
+    return {
+        "_id": ObjectId(itinerario_id),
+        "usuario_id": ObjectId(user_id),
+        "actividades._id": ObjectId(actividad_id)
+    }
+
+def actividad_expr(actividad_id, campo):
+    """Expresión de agregación con el valor de `campo` de una actividad del itinerario"""
+    return {"$arrayElemAt": [
+        {"$map": {
+            "input": {"$filter": {
+                "input": "$actividades",
+                "as": "a",
+                "cond": {"$eq": ["$$a._id", actividad_id]}
+            }},
+            "as": "a",
+            "in": f"$$a.{campo}"
+        }},
+        0
+    ]}
+
+def modificar_actividad_expr(actividad_id, cambios):
+    """Expresión que devuelve `actividades` con `cambios` aplicados a una actividad"""
+    return {"$map": {
+        "input": "$actividades",
+        "as": "a",
+        "in": {"$cond": [
+            {"$eq": ["$$a._id", actividad_id]},
+            {"$mergeObjects": ["$$a", cambios]},
+            "$$a"
+        ]}
+    }}
+
+def contadores_actividades_expr(total=0, completadas=0):
+    """Expresiones de actividades_total y actividades_completadas sumándoles `total` y `completadas`.
+
+    Un itinerario anterior a los contadores (la migración aún no ha pasado por él)
+    parte del array real y no de cero: si no, la migración lo saltaría ya descuadrado.
+    """
+    actividades = {"$ifNull": ["$actividades", []]}
+    return {
+        "actividades_total": {"$add": [
+            {"$ifNull": ["$actividades_total", {"$size": actividades}]},
+            total
+        ]},
+        "actividades_completadas": {"$add": [
+            {"$ifNull": ["$actividades_completadas", {"$size": {"$filter": {
+                "input": actividades,
+                "as": "a",
+                "cond": {"$eq": ["$$a.completada", True]}
+            }}}]},
+            completadas
+        ]},
+    }
+
+def listado_destinos_html(cursor=None):
+    """HTML de una página de destinos de la comunidad, servido desde caché si es posible"""
+    clave = cursor or ""
+    html = cache_destinos.obtener(clave)
+    if html is None:
+        filtro = {"_id": {"$lt": ObjectId(cursor)}} if cursor else {}
+        destinos = list(destinos_collection().find(filtro, Destino.proyeccion("tarjeta"))
+                        .sort("_id", -1)
+                        .limit(DESTINOS_POR_PAGINA + 1))
+        siguiente_cursor = None
+        if len(destinos) > DESTINOS_POR_PAGINA:
+            destinos = destinos[:DESTINOS_POR_PAGINA]
+            siguiente_cursor = str(destinos[-1]["_id"])
+        html = render_template("_destinos_comunidad.html",
+                               destinos=[Destino.desde_documento(d) for d in destinos],
+                               cursor=cursor,
+                               siguiente_cursor=siguiente_cursor)
+        cache_destinos.guardar(clave, html)
+    return html
+
+def obtener_indice_busqueda():
+    """Índice de búsqueda del worker; se reconstruye desde MongoDB cuando caduca.
+
+    Los cambios de /new, /edit y /delete se aplican al índice en el momento;
+    la reconstrucción periódica recoge los que hagan otros workers.
+    """
+    global indice_busqueda, indice_busqueda_construido
+    if indice_busqueda is not None and time.monotonic() - indice_busqueda_construido < REINDEXAR_CADA:
+        return indice_busqueda
+    with indice_busqueda_lock:
+        if indice_busqueda is None or time.monotonic() - indice_busqueda_construido >= REINDEXAR_CADA:
+            destinos = []
+            if obtener_db() is not None:
+                try:
+                    # find() es perezoso: se materializa aquí para que un fallo de MongoDB
+                    # caiga en este except y el índice se construya solo con los tours
+                    destinos = list(destinos_collection().find({}, Destino.proyeccion("busqueda")))
+                except Exception as e:
+                    print(f"❌ Error cargando destinos para la búsqueda: {e}")
+            # El índice nuevo se construye aparte y se sustituye de una vez
+            indice_busqueda = construir_indice(TOURS_PREDEFINIDOS, destinos)
+            indice_busqueda_construido = time.monotonic()
+    return indice_busqueda
+
 def calcular_dias_restantes(itinerario):
     """Calcula días restantes hasta el viaje"""
     try:
@@ -265,28 +556,31 @@ def calcular_dias_restantes(itinerario):
 @app.route("/")
 def index():
     """Página principal con diseño TravelAsia"""
-    destinos = []
+    destinos_html = None
     try:
-        if db is not None:
-            destinos = list(destinos_collection.find())
+        if obtener_db() is not None:
+            destinos_html = listado_destinos_html(request.args.get("destinos_cursor"))
         else:
             flash("⚠️ Modo demo: Base de datos temporalmente no disponible", "info")
     except Exception as e:
         flash(f"⚠️ Error cargando destinos: {str(e)[:100]}...", "warning")
     
-    return render_template("index.html", destinos=destinos, tours=TOURS_PREDEFINIDOS)
+    return render_template("index.html", destinos_html=destinos_html, tours=TOURS_PREDEFINIDOS)
 
 @app.route("/destinos")
+@precalculada()
 def destinos():
     """Página de destinos disponibles"""
     return render_template("destinos.html", tours=TOURS_PREDEFINIDOS)
 
 @app.route("/explora")
+@precalculada()
 def explora():
     """Página de exploración y búsqueda de destinos"""
     return render_template("explora.html", tours=TOURS_PREDEFINIDOS)
 
 @app.route("/cotizar")
+@precalculada()
 def cotizar():
     """Página de cotización"""
     return render_template("cotizar.html", tours=TOURS_PREDEFINIDOS)
@@ -321,26 +615,17 @@ def procesar_cotizacion():
             flash("Tour no disponible", "danger")
             return redirect(url_for("error_cotizacion"))
         
-        precio_base = tour["precio_base"]
-        
-        # Ajustes por categoría
-        multiplicadores = {
-            "economico": 0.8,
-            "estandar": 1.0,
-            "premium": 1.5,
-            "lujo": 2.0
-        }
-        
-        # ✅ CÁLCULO SEGURO - VERIFICAR DIVISIÓN POR CERO
-        if noches <= 0:
-            noches = 7  # Valor por defecto seguro
-        
-        precio_final = precio_base * multiplicadores.get(categoria, 1.0) * personas * (noches / 7)
+        try:
+            precio_final = motor_cotizaciones.cotizar(pais, categoria, personas, noches,
+                                                      fecha=datos.get("fecha_inicio"))
+        except CotizacionError:
+            flash("❌ Error: Fecha de salida inválida", "danger")
+            return redirect(url_for("error_cotizacion"))
         
         return render_template("resultado_cotizacion.html", 
                              datos=datos,
                              tour=tour,
-                             precio_final=round(precio_final, 2))
+                             precio_final=precio_final)
                              
     except Exception as e:
         print(f"❌ ERROR EN COTIZACIÓN: {e}")  # Log para debugging
@@ -385,40 +670,22 @@ def resultado_cotizacion():
 def register():
     """Registro de nuevos usuarios"""
     if request.method == "POST":
-        nombre = request.form.get("nombre", "").strip()
-        email = request.form.get("email", "").strip().lower()
-        password = request.form.get("password", "").strip()
-        tipo_usuario = request.form.get("tipo_usuario", "viajero")
-        
-        # Validaciones básicas
-        if not nombre or not email or not password:
-            flash("❌ Todos los campos son obligatorios", "danger")
-            return redirect(url_for("register"))
-        
-        if len(password) < 6:
-            flash("❌ La contraseña debe tener al menos 6 caracteres", "danger")
+        try:
+            nuevo_usuario = validar_usuario(request.form)
+        except ValidacionError as e:
+            flash(f"❌ {e}", "danger")
             return redirect(url_for("register"))
         
         # Verificar si el usuario ya existe
-        if db is not None:
-            usuario_existente = usuarios_collection.find_one({"email": email})
+        if obtener_db() is not None:
+            usuario_existente = usuarios_collection().find_one({"email": nuevo_usuario["email"]},
+                                                               Usuario.proyeccion("registro"))
             if usuario_existente:
                 flash("❌ Este email ya está registrado", "danger")
                 return redirect(url_for("register"))
             
-            # Crear nuevo usuario
-            nuevo_usuario = {
-                "nombre": nombre,
-                "email": email,
-                "password": generate_password_hash(password),
-                "tipo_usuario": tipo_usuario,
-                "pais_interes": request.form.get("pais_interes", ""),
-                "presupuesto": float(request.form.get("presupuesto", 0) or 0),
-                "fecha_registro": datetime.datetime.utcnow()
-            }
-            
             try:
-                usuarios_collection.insert_one(nuevo_usuario)
+                usuarios_collection().insert_one(nuevo_usuario)
                 flash("✅ ¡Registro exitoso! Ahora puedes iniciar sesión", "success")
                 return redirect(url_for("login"))
             except Exception as e:
@@ -439,9 +706,9 @@ def login():
             flash("❌ Email y contraseña requeridos", "danger")
             return redirect(url_for("login"))
         
-        if db is not None:
+        if obtener_db() is not None:
             try:
-                usuario = usuarios_collection.find_one({"email": email})
+                usuario = usuarios_collection().find_one({"email": email}, Usuario.proyeccion("login"))
                 if usuario and check_password_hash(usuario["password"], password):
                     # Iniciar sesión
                     session["user_id"] = str(usuario["_id"])
@@ -472,34 +739,27 @@ def logout():
 @login_required
 def profile():
     """Perfil del usuario"""
-    if db is not None:
+    if obtener_db() is not None:
         try:
-            usuario = usuarios_collection.find_one({"_id": ObjectId(session["user_id"])})
+            usuario = usuarios_collection().find_one({"_id": ObjectId(session["user_id"])},
+                                                     Usuario.proyeccion("perfil"))
             if usuario:
-                # Calcular estadísticas del usuario
-                itinerarios_count = itinerarios_collection.count_documents({
-                    "usuario_id": ObjectId(session["user_id"])
-                })
-                
-                viajes_activos = itinerarios_collection.count_documents({
-                    "usuario_id": ObjectId(session["user_id"]),
-                    "estado": "activo"
-                })
-                
-                # Calcular presupuesto total de todos los itinerarios
-                presupuesto_total = 0
-                itinerarios = itinerarios_collection.find({
-                    "usuario_id": ObjectId(session["user_id"])
-                })
-                for itinerario in itinerarios:
-                    presupuesto_total += itinerario.get('presupuesto_total', 0)
+                # Estadísticas materializadas: una sola lectura del usuario si están al día
+                revision = usuario.get('rev_estadisticas', 0)
+                estadisticas = None
+                if ESTADISTICAS_MATERIALIZADAS and usuario.get('estadisticas_rev') == revision:
+                    estadisticas = usuario.get('estadisticas')
+                if estadisticas is None:
+                    estadisticas = estadisticas_usuario(session["user_id"])
+                    if ESTADISTICAS_MATERIALIZADAS:
+                        # Solo si ninguna escritura empezó mientras se agregaba
+                        usuarios_collection().update_one(
+                            {"_id": usuario["_id"], "rev_estadisticas": usuario.get('rev_estadisticas')},
+                            {"$set": {"estadisticas": estadisticas, "estadisticas_rev": revision}}
+                        )
                 
-                # Agregar estadísticas al usuario
-                usuario['itinerarios_count'] = itinerarios_count
-                usuario['viajes_activos'] = viajes_activos
-                usuario['presupuesto_total'] = presupuesto_total
-                
-                return render_template("profile.html", usuario=usuario, tours=TOURS_PREDEFINIDOS)
+                return render_template("profile.html", usuario=Usuario.desde_documento(usuario, **estadisticas),
+                                       tours=TOURS_PREDEFINIDOS)
         except Exception as e:
             flash(f"❌ Error cargando perfil: {e}", "danger")
     
@@ -512,32 +772,19 @@ def profile():
 def create():
     """Crear nuevo destino asiático"""
     if request.method == "POST":
-        # Validar campos obligatorios
-        nombre = request.form.get("nombre", "").strip()
-        pais = request.form.get("pais", "").strip()
-        descripcion = request.form.get("descripcion", "").strip()
-        
-        if not nombre or not pais or not descripcion:
-            flash("❌ Completa todos los campos obligatorios: Nombre, País y Descripción", "danger")
+        # Mismas validaciones que `flask datos import destinos`
+        try:
+            nuevo_destino = validar_destino(request.form)
+        except ValidacionError as e:
+            flash(f"❌ {e}", "danger")
             return redirect(url_for("create"))
 
-        # Crear nuevo destino
-        nuevo_destino = {
-            "nombre": nombre,
-            "pais": pais,
-            "ciudad": request.form.get("ciudad", "").strip(),
-            "mejor_epoca": request.form.get("mejor_epoca", "Todo el año"),
-            "presupuesto": float(request.form.get("presupuesto", 0) or 0),
-            "actividades": request.form.get("actividades", "").strip(),
-            "descripcion": descripcion,
-            "imagen": request.form.get("imagen", "").strip(),
-            "calificacion": int(request.form.get("calificacion", 3))
-        }
-
         # Guardar en MongoDB
-        if db is not None:
+        if obtener_db() is not None:
             try:
-                destinos_collection.insert_one(nuevo_destino)
+                destinos_collection().insert_one(nuevo_destino)
+                cache_destinos.limpiar()
+                agregar_destino(obtener_indice_busqueda(), nuevo_destino)
                 flash("✅ ¡Destino asiático agregado correctamente!", "success")
             except Exception as e:
                 flash(f"❌ Error guardando en base de datos: {e}", "danger")
@@ -551,12 +798,12 @@ def create():
 @app.route("/view/<id>")
 def view(id):
     """Ver detalles de un destino"""
-    if db is None:
+    if obtener_db() is None:
         flash("❌ Base de datos no disponible", "danger")
         return redirect(url_for("index"))
     
     try:
-        destino = destinos_collection.find_one({"_id": ObjectId(id)})
+        destino = destinos_collection().find_one({"_id": ObjectId(id)}, Destino.proyeccion("detalle"))
         if not destino:
             flash("⚠️ Destino no encontrado", "warning")
             return redirect(url_for("index"))
@@ -564,18 +811,18 @@ def view(id):
         flash(f"❌ Error buscando destino: {e}", "danger")
         return redirect(url_for("index"))
     
-    return render_template("view.html", destino=destino)
+    return render_template("view.html", destino=Destino.desde_documento(destino))
 
 @app.route("/edit/<id>", methods=["GET", "POST"])
 @login_required
 def edit(id):
     """Editar destino existente"""
-    if db is None:
+    if obtener_db() is None:
         flash("❌ Base de datos no disponible", "danger")
         return redirect(url_for("index"))
     
     try:
-        destino = destinos_collection.find_one({"_id": ObjectId(id)})
+        destino = destinos_collection().find_one({"_id": ObjectId(id)}, Destino.proyeccion("detalle"))
         if not destino:
             flash("⚠️ Destino no encontrado", "warning")
             return redirect(url_for("index"))
@@ -595,35 +842,37 @@ def edit(id):
 
         # Actualizar destino
         try:
-            destinos_collection.update_one(
-                {"_id": ObjectId(id)},
-                {"$set": {
-                    "nombre": nombre,
-                    "pais": pais,
-                    "ciudad": request.form.get("ciudad", "").strip(),
-                    "mejor_epoca": request.form.get("mejor_epoca", "Todo el año"),
-                    "presupuesto": float(request.form.get("presupuesto", 0) or 0),
-                    "actividades": request.form.get("actividades", "").strip(),
-                    "descripcion": descripcion,
-                    "imagen": request.form.get("imagen", "").strip(),
-                    "calificacion": int(request.form.get("calificacion", 3))
-                }}
-            )
+            cambios = {
+                "nombre": nombre,
+                "pais": pais,
+                "ciudad": request.form.get("ciudad", "").strip(),
+                "mejor_epoca": request.form.get("mejor_epoca", "Todo el año"),
+                "presupuesto": float(request.form.get("presupuesto", 0) or 0),
+                "actividades": request.form.get("actividades", "").strip(),
+                "descripcion": descripcion,
+                "imagen": request.form.get("imagen", "").strip(),
+                "calificacion": int(request.form.get("calificacion", 3))
+            }
+            destinos_collection().update_one({"_id": ObjectId(id)}, {"$set": cambios})
+            cache_destinos.limpiar()
+            agregar_destino(obtener_indice_busqueda(), dict(cambios, _id=destino["_id"]))
             flash("✏️ ¡Destino actualizado correctamente!", "info")
         except Exception as e:
             flash(f"❌ Error actualizando destino: {e}", "danger")
 
         return redirect(url_for("index"))
 
-    return render_template("edit.html", destino=destino)
+    return render_template("edit.html", destino=Destino.desde_documento(destino))
 
 @app.route("/delete/<id>", methods=["POST"])
 @login_required
 def delete(id):
     """Eliminar destino"""
-    if db is not None:
+    if obtener_db() is not None:
         try:
-            destinos_collection.delete_one({"_id": ObjectId(id)})
+            destinos_collection().delete_one({"_id": ObjectId(id)})
+            cache_destinos.limpiar()
+            eliminar_destino(obtener_indice_busqueda(), id)
             flash("🗑️ Destino eliminado correctamente", "secondary")
         except Exception as e:
             flash(f"❌ Error eliminando destino: {e}", "danger")
@@ -639,76 +888,56 @@ def delete(id):
 def planificador():
     """Página principal del planificador con mapa interactivo"""
     itinerarios = []
-    if db is not None:
+    siguiente_cursor = None
+    resumen = resumen_vacio()
+    if obtener_db() is not None:
         try:
-            itinerarios = list(itinerarios_collection.find({
-                "usuario_id": ObjectId(session["user_id"])
-            }).sort("fecha_creacion", -1))
+            cursor = request.args.get("cursor")
+            itinerarios, siguiente_cursor = paginar_itinerarios(
+                session["user_id"],
+                cursor=cursor,
+                limite=obtener_limite_pagina(request.args.get("limite")),
+                proyeccion=Itinerario.proyeccion("planificador")  # El progreso sale de los contadores
+            )
+            
+            # Las estadísticas globales solo hacen falta en la primera página
+            if not cursor:
+                resumen = resumen_itinerarios(session["user_id"])
             
             # Calcular estadísticas para cada itinerario
-            for itinerario in itinerarios:
-                itinerario['porcentaje_completado'] = calcular_porcentaje_completado(itinerario)
-                itinerario['porcentaje_presupuesto'] = calcular_porcentaje_presupuesto(itinerario)
+            itinerarios = [Itinerario.desde_documento(
+                itinerario,
+                porcentaje_completado=calcular_porcentaje_completado(itinerario),
+                porcentaje_presupuesto=calcular_porcentaje_presupuesto(itinerario)
+            ) for itinerario in itinerarios]
                 
         except Exception as e:
             flash(f"❌ Error cargando itinerarios: {e}", "danger")
     
     return render_template("planificador.html", 
                          itinerarios=itinerarios,
-                         tours=TOURS_PREDEFINIDOS,
-                         coordenadas=COORDENADAS_PAISES)
+                         siguiente_cursor=siguiente_cursor,
+                         resumen=resumen,
+                         tours=TOURS_PREDEFINIDOS)
 
 @app.route("/crear-itinerario", methods=["GET", "POST"])
 @login_required
 def crear_itinerario():
     """Crear nuevo itinerario multi-país"""
     if request.method == "POST":
-        nombre_viaje = request.form.get("nombre_viaje", "").strip()
-        descripcion = request.form.get("descripcion", "").strip()
-        fecha_inicio = request.form.get("fecha_inicio")
-        fecha_fin = request.form.get("fecha_fin")
-        presupuesto_total = float(request.form.get("presupuesto_total", 0) or 0)
-        
-        if not nombre_viaje or not fecha_inicio or not fecha_fin:
-            flash("❌ Nombre del viaje y fechas son obligatorios", "danger")
-            return redirect(url_for("crear_itinerario"))
-        
-        fecha_inicio_dt = datetime.datetime.strptime(fecha_inicio, "%Y-%m-%d")
-        fecha_fin_dt = datetime.datetime.strptime(fecha_fin, "%Y-%m-%d")
-        duracion_dias = (fecha_fin_dt - fecha_inicio_dt).days
-        
-        if duracion_dias <= 0:
-            flash("❌ La fecha fin debe ser posterior a la fecha inicio", "danger")
-            return redirect(url_for("crear_itinerario"))
-        
-        paises = request.form.getlist("paises")
-        if not paises:
-            flash("❌ Selecciona al menos un país", "danger")
+        try:
+            nuevo_itinerario = validar_itinerario(request.form, request.form.getlist("paises"),
+                                                  ObjectId(session["user_id"]))
+        except ValidacionError as e:
+            flash(f"❌ {e}", "danger")
             return redirect(url_for("crear_itinerario"))
         
-        nuevo_itinerario = {
-            "usuario_id": ObjectId(session["user_id"]),
-            "nombre_viaje": nombre_viaje,
-            "descripcion": descripcion,
-            "paises": paises,
-            "ciudades": [],
-            "fecha_inicio": fecha_inicio,
-            "fecha_fin": fecha_fin,
-            "duracion_dias": duracion_dias,
-            "presupuesto_total": presupuesto_total,
-            "presupuesto_restante": presupuesto_total,
-            "actividades": [],
-            "transportes": [],
-            "estado": "planificando",
-            "fecha_creacion": datetime.datetime.utcnow(),
-            "fecha_actualizacion": datetime.datetime.utcnow(),
-            "prioridad": "media",
-            "favorito": False
-        }
-        
-        if db is not None:
+        if obtener_db() is not None:
             try:
-                result = itinerarios_collection.insert_one(nuevo_itinerario)
+                revision = iniciar_cambio_estadisticas(session["user_id"])
+                result = itinerarios_collection().insert_one(nuevo_itinerario)
+                actualizar_estadisticas(session["user_id"], revision, delta_estadisticas(nuevo_itinerario))
+                invalidar_caches_usuario(session["user_id"])
                 flash("✅ ¡Itinerario creado correctamente! Ahora agrega actividades.", "success")
                 return redirect(url_for("ver_itinerario", id=result.inserted_id))
             except Exception as e:
@@ -732,22 +961,22 @@ def crear_itinerario():
 @login_required
 def ver_itinerario(id):
     """Ver detalles de un itinerario"""
-    if db is None:
+    if obtener_db() is None:
         flash("❌ Base de datos no disponible", "danger")
         return redirect(url_for("planificador"))
     
     try:
-        itinerario = itinerarios_collection.find_one({
-            "_id": ObjectId(id),
-            "usuario_id": ObjectId(session["user_id"])
-        })
+        itinerario = obtener_itinerario(id, session["user_id"])
         if not itinerario:
             flash("⚠️ Itinerario no encontrado", "warning")
             return redirect(url_for("planificador"))
         
         # Calcular porcentajes
-        itinerario['porcentaje_completado'] = calcular_porcentaje_completado(itinerario)
-        itinerario['porcentaje_presupuesto'] = calcular_porcentaje_presupuesto(itinerario)
+        itinerario = Itinerario.desde_documento(
+            itinerario,
+            porcentaje_completado=calcular_porcentaje_completado(itinerario),
+            porcentaje_presupuesto=calcular_porcentaje_presupuesto(itinerario)
+        )
         
         return render_template("ver_itinerario.html", itinerario=itinerario)
         
@@ -761,20 +990,31 @@ def editar_itinerario(id):
     """Editar un itinerario existente"""
     try:
         user_id = session["user_id"]
-        itinerario = itinerarios_collection.find_one({
-            "_id": ObjectId(id),
-            "usuario_id": ObjectId(user_id)
-        })
+        itinerario = obtener_itinerario(id, user_id)
         
         if not itinerario:
             flash("⚠️ Itinerario no encontrado", "warning")
             return redirect(url_for("planificador"))
         
+        if itinerario.get("fecha_archivado"):
+            flash("🗄️ Este itinerario está archivado: restáuralo para editarlo", "warning")
+            return redirect(url_for("ver_itinerario", id=id))
+        
         if request.method == "POST":
+            # Las escrituras no parten de la caché de lectura: puede ir por detrás de otro worker
+            filtro = {"_id": ObjectId(id), "usuario_id": ObjectId(user_id)}
+            # El formulario de edición no siempre envía los países: se conservan los guardados
+            paises = request.form.getlist("paises")
+            if not paises:
+                guardado = itinerarios_collection().find_one(filtro, {"paises": 1})
+                paises = guardado.get("paises", []) if guardado else []
+            ruta = ordenar_paradas(paises)
+            
             # Recoger datos actualizados
             updates = {
                 "nombre_viaje": request.form.get("nombre_viaje"),
-                "paises": request.form.getlist("paises"),
+                "paises": ruta["paradas"],
+                "ruta_km": ruta["distancia_km"],
                 "fecha_inicio": request.form.get("fecha_inicio"),
                 "fecha_fin": request.form.get("fecha_fin"),
                 "presupuesto_total": float(request.form.get("presupuesto_total", 0)),
@@ -787,16 +1027,30 @@ def editar_itinerario(id):
             }
             
             # Actualizar en la base de datos
-            itinerarios_collection.update_one(
-                {"_id": ObjectId(id)}, 
-                {"$set": updates}
+            revision = iniciar_cambio_estadisticas(user_id)
+            anterior = itinerarios_collection().find_one_and_update(
+                filtro,
+                {"$set": updates},
+                projection={"presupuesto_total": 1},
+                return_document=ReturnDocument.BEFORE
             )
+            # El delta sale del documento tal como estaba justo antes de esta escritura
+            actualizar_estadisticas(user_id, revision, {
+                'estadisticas.presupuesto_total':
+                    updates['presupuesto_total'] - anterior.get('presupuesto_total', 0)
+            } if anterior else {})
+            invalidar_caches_usuario(user_id, id)
+            
+            if anterior is None:
+                # La copia de la caché estaba obsoleta: se archivó o se eliminó en otro worker
+                flash("⚠️ El itinerario ya no está disponible para editar (archivado o eliminado)", "warning")
+                return redirect(url_for("ver_itinerario", id=id))
             
             flash("✅ ¡Itinerario actualizado exitosamente!", "success")
             return redirect(url_for("ver_itinerario", id=id))
         
         # GET - Mostrar formulario de edición
-        return render_template("editar_itinerario.html", itinerario=itinerario)
+        return render_template("editar_itinerario.html", itinerario=Itinerario.desde_documento(itinerario))
         
     except Exception as e:
         flash(f"❌ Error al editar el itinerario: {str(e)}", "danger")
@@ -808,24 +1062,28 @@ def duplicar_itinerario(id):
     """Duplicar un itinerario existente"""
     try:
         user_id = session["user_id"]
-        itinerario_original = itinerarios_collection.find_one({
-            "_id": ObjectId(id),
-            "usuario_id": ObjectId(user_id)
-        })
+        itinerario_original = obtener_itinerario(id, user_id)
         
         if itinerario_original:
             # Crear copia sin el _id original
             itinerario_copia = itinerario_original.copy()
             itinerario_copia.pop('_id', None)
+            itinerario_copia.pop('fecha_archivado', None)  # La copia de un archivado es un viaje nuevo
             
             # Actualizar campos para la copia
             itinerario_copia['nombre_viaje'] += ' (Copia)'
             itinerario_copia['fecha_creacion'] = datetime.datetime.utcnow()
+            itinerario_copia['fecha_actualizacion'] = itinerario_copia['fecha_creacion']
             itinerario_copia['presupuesto_restante'] = itinerario_copia['presupuesto_total']
             itinerario_copia['actividades'] = []  # Limpiar actividades
+            itinerario_copia['actividades_total'] = 0
+            itinerario_copia['actividades_completadas'] = 0
             
             # Insertar la copia
-            itinerarios_collection.insert_one(itinerario_copia)
+            revision = iniciar_cambio_estadisticas(user_id)
+            itinerarios_collection().insert_one(itinerario_copia)
+            actualizar_estadisticas(user_id, revision, delta_estadisticas(itinerario_copia))
+            invalidar_caches_usuario(user_id)
             flash("✅ Itinerario duplicado exitosamente!", "success")
         else:
             flash("❌ Itinerario no encontrado", "error")
@@ -854,7 +1112,10 @@ def generar_itinerario_ia():
         itinerario_ia = generar_itinerario_automatico(datos_ia, user_id)
         
         # Guardar en la base de datos
-        result = itinerarios_collection.insert_one(itinerario_ia)
+        revision = iniciar_cambio_estadisticas(user_id)
+        result = itinerarios_collection().insert_one(itinerario_ia)
+        actualizar_estadisticas(user_id, revision, delta_estadisticas(itinerario_ia))
+        invalidar_caches_usuario(user_id)
         flash("🤖 ¡Itinerario IA generado exitosamente!", "success")
         return redirect(url_for("ver_itinerario", id=result.inserted_id))
         
@@ -881,6 +1142,7 @@ def agregar_actividad(itinerario_id):
             return redirect(url_for("ver_itinerario", id=itinerario_id))
         
         nueva_actividad = {
+            "_id": ObjectId(),
             "pais": pais,
             "ciudad": ciudad,
             "actividad": actividad,
@@ -891,56 +1153,67 @@ def agregar_actividad(itinerario_id):
             "fecha_creacion": datetime.datetime.utcnow()
         }
         
-        if db is not None:
+        if obtener_db() is not None:
             try:
-                itinerarios_collection.update_one(
+                itinerarios_collection().update_one(
                     {
                         "_id": ObjectId(itinerario_id),
                         "usuario_id": ObjectId(session["user_id"])
                     },
-                    {
-                        "$push": {"actividades": nueva_actividad},
-                        "$inc": {"presupuesto_restante": -costo},
-                        "$set": {"fecha_actualizacion": datetime.datetime.utcnow()}
-                    }
+                    [{"$set": {
+                        # $literal: un texto del usuario que empiece por "$" no se evalúa como campo
+                        "actividades": {"$concatArrays": [
+                            {"$ifNull": ["$actividades", []]},
+                            {"$literal": [nueva_actividad]}
+                        ]},
+                        "presupuesto_restante": {"$subtract": [{"$ifNull": ["$presupuesto_restante", 0]}, costo]},
+                        **contadores_actividades_expr(total=1),
+                        "fecha_actualizacion": datetime.datetime.utcnow()
+                    }}]
                 )
+                invalidar_caches_usuario(session["user_id"], itinerario_id)
                 flash("✅ Actividad agregada correctamente", "success")
             except Exception as e:
                 flash(f"❌ Error agregando actividad: {e}", "danger")
         
         return redirect(url_for("ver_itinerario", id=itinerario_id))
 
-@app.route("/eliminar-actividad/<itinerario_id>/<int:actividad_index>", methods=["POST"])
+@app.route("/eliminar-actividad/<itinerario_id>/<actividad_id>", methods=["POST"])
 @login_required
-def eliminar_actividad(itinerario_id, actividad_index):
+def eliminar_actividad(itinerario_id, actividad_id):
     """Eliminar una actividad de un itinerario"""
     try:
         user_id = session["user_id"]
+        oid = ObjectId(actividad_id)
         
-        # Verificar que el itinerario pertenece al usuario
-        itinerario = itinerarios_collection.find_one({
-            "_id": ObjectId(itinerario_id),
-            "usuario_id": ObjectId(user_id)
-        })
+        # Una sola operación atómica: quitar la actividad y devolver su costo al presupuesto
+        itinerario = itinerarios_collection().find_one_and_update(
+            filtro_actividad(itinerario_id, actividad_id, user_id),
+            [{"$set": {
+                "presupuesto_restante": {"$add": [
+                    "$presupuesto_restante",
+                    {"$ifNull": [actividad_expr(oid, "costo"), 0]}
+                ]},
+                **contadores_actividades_expr(
+                    total=-1,
+                    completadas={"$cond": [{"$ifNull": [actividad_expr(oid, "completada"), False]}, -1, 0]}
+                ),
+                "actividades": {"$filter": {
+                    "input": "$actividades",
+                    "as": "a",
+                    "cond": {"$ne": ["$$a._id", oid]}
+                }},
+                "fecha_actualizacion": datetime.datetime.utcnow()
+            }}],
+            projection={"_id": 1},
+            return_document=ReturnDocument.AFTER
+        )
         
-        if not itinerario or actividad_index >= len(itinerario.get("actividades", [])):
+        if not itinerario:
             flash("❌ Actividad no encontrada", "danger")
             return redirect(url_for("ver_itinerario", id=itinerario_id))
         
-        # Obtener costo de la actividad a eliminar
-        actividad = itinerario["actividades"][actividad_index]
-        costo_actividad = actividad.get("costo", 0)
-        
-        # Remover actividad y actualizar presupuesto
-        itinerarios_collection.update_one(
-            {"_id": ObjectId(itinerario_id)},
-            {
-                "$pull": {"actividades": actividad},
-                "$inc": {"presupuesto_restante": costo_actividad},
-                "$set": {"fecha_actualizacion": datetime.datetime.utcnow()}
-            }
-        )
-        
+        invalidar_caches_usuario(user_id, itinerario_id)
         flash("✅ Actividad eliminada correctamente", "success")
         return redirect(url_for("ver_itinerario", id=itinerario_id))
         
@@ -948,35 +1221,85 @@ def eliminar_actividad(itinerario_id, actividad_index):
         flash(f"❌ Error al eliminar actividad: {str(e)}", "danger")
         return redirect(url_for("ver_itinerario", id=itinerario_id))
 
-@app.route("/toggle-actividad/<itinerario_id>/<int:actividad_index>", methods=["POST"])
+@app.route("/toggle-actividad/<itinerario_id>/<actividad_id>", methods=["POST"])
 @login_required
-def toggle_actividad(itinerario_id, actividad_index):
+def toggle_actividad(itinerario_id, actividad_id):
     """Marcar/desmarcar actividad como completada"""
     try:
         user_id = session["user_id"]
+        oid = ObjectId(actividad_id)
         
-        itinerario = itinerarios_collection.find_one({
-            "_id": ObjectId(itinerario_id),
-            "usuario_id": ObjectId(user_id)
-        })
+        # Cambiar estado de completada en una sola operación atómica
+        itinerario = itinerarios_collection().find_one_and_update(
+            filtro_actividad(itinerario_id, actividad_id, user_id),
+            [{"$set": {
+                **contadores_actividades_expr(
+                    completadas={"$cond": [{"$ifNull": [actividad_expr(oid, "completada"), False]}, -1, 1]}
+                ),
+                "actividades": modificar_actividad_expr(oid, {
+                    "completada": {"$not": [{"$ifNull": ["$$a.completada", False]}]}
+                }),
+                "fecha_actualizacion": datetime.datetime.utcnow()
+            }}],
+            projection={
+                "actividades": {"$elemMatch": {"_id": oid}},
+                "actividades_total": 1,
+                "actividades_completadas": 1
+            },
+            return_document=ReturnDocument.AFTER
+        )
         
-        if not itinerario or actividad_index >= len(itinerario.get("actividades", [])):
+        if not itinerario:
             return jsonify({'success': False, 'error': 'Actividad no encontrada'})
         
-        # Cambiar estado de completada
-        nueva_estado = not itinerario['actividades'][actividad_index].get('completada', False)
+        invalidar_caches_usuario(user_id, itinerario_id)
+        nueva_estado = itinerario['actividades'][0].get('completada', False)
+        return jsonify({
+            'success': True,
+            'completada': nueva_estado,
+            'porcentaje_completado': calcular_porcentaje_completado(itinerario)
+        })
         
-        itinerarios_collection.update_one(
-            {'_id': ObjectId(itinerario_id)},
-            {
-                '$set': {
-                    f'actividades.{actividad_index}.completada': nueva_estado,
-                    'fecha_actualizacion': datetime.datetime.utcnow()
-                }
-            }
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route("/actualizar-costo-actividad/<itinerario_id>/<actividad_id>", methods=["POST"])
+@login_required
+def actualizar_costo_actividad(itinerario_id, actividad_id):
+    """Cambiar el costo de una actividad ajustando el presupuesto restante"""
+    try:
+        user_id = session["user_id"]
+        oid = ObjectId(actividad_id)
+        
+        try:
+            costo = float(request.form.get("costo", 0) or 0)
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Costo inválido'}), 400
+        
+        # El presupuesto recibe la diferencia entre el costo anterior y el nuevo
+        itinerario = itinerarios_collection().find_one_and_update(
+            filtro_actividad(itinerario_id, actividad_id, user_id),
+            [{"$set": {
+                "presupuesto_restante": {"$add": [
+                    "$presupuesto_restante",
+                    {"$subtract": [{"$ifNull": [actividad_expr(oid, "costo"), 0]}, costo]}
+                ]},
+                "actividades": modificar_actividad_expr(oid, {"costo": costo}),
+                "fecha_actualizacion": datetime.datetime.utcnow()
+            }}],
+            projection={"_id": 0, "presupuesto_restante": 1},
+            return_document=ReturnDocument.AFTER
         )
         
-        return jsonify({'success': True, 'completada': nueva_estado})
+        if not itinerario:
+            return jsonify({'success': False, 'error': 'Actividad no encontrada'})
+        
+        invalidar_caches_usuario(user_id, itinerario_id)
+        return jsonify({
+            'success': True,
+            'costo': costo,
+            'presupuesto_restante': itinerario['presupuesto_restante']
+        })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -985,12 +1308,27 @@ def toggle_actividad(itinerario_id, actividad_index):
 @login_required
 def eliminar_itinerario(id):
     """Eliminar itinerario"""
-    if db is not None:
+    if obtener_db() is not None:
         try:
-            itinerarios_collection.delete_one({
-                "_id": ObjectId(id),
-                "usuario_id": ObjectId(session["user_id"])
-            })
+            filtro = {"_id": ObjectId(id), "usuario_id": ObjectId(session["user_id"])}
+            proyeccion = {"estado": 1, "presupuesto_total": 1}
+            revision = iniciar_cambio_estadisticas(session["user_id"])
+            eliminado = itinerarios_collection().find_one_and_delete(filtro, projection=proyeccion)
+            incrementos = delta_estadisticas(eliminado, signo=-1) if eliminado else {}
+            if eliminado is None:
+                # Los archivados no cuentan en las estadísticas: no hay nada que descontar
+                eliminado = itinerarios_archivo_collection().find_one_and_delete(filtro, projection=proyeccion)
+            actualizar_estadisticas(session["user_id"], revision, incrementos)
+            if eliminado:
+                invalidar_caches_usuario(session["user_id"], id)
+                # Marca para que los clientes con sincronización incremental borren su copia
+                # (upsert: un itinerario archivado ya tiene la suya)
+                itinerarios_eliminados_collection().update_one(
+                    {"_id": eliminado["_id"]},
+                    {"$set": {"usuario_id": ObjectId(session["user_id"]),
+                              "fecha_eliminacion": datetime.datetime.utcnow()}},
+                    upsert=True
+                )
             flash("🗑️ Itinerario eliminado correctamente", "secondary")
         except Exception as e:
             flash(f"❌ Error eliminando itinerario: {e}", "danger")
@@ -999,29 +1337,64 @@ def eliminar_itinerario(id):
     
     return redirect(url_for("planificador"))
 
+@app.route("/restaurar-itinerario/<id>", methods=["POST"])
+@login_required
+def restaurar_itinerario_archivado(id):
+    """Devolver un itinerario archivado a la lista de itinerarios activos"""
+    if obtener_db() is None:
+        flash("⚠️ Base de datos no disponible", "warning")
+        return redirect(url_for("planificador"))
+    
+    try:
+        if restaurar_itinerario(obtener_db(), id, session["user_id"]):
+            invalidar_caches_usuario(session["user_id"], id)
+            flash("📂 Itinerario restaurado: ya puedes editarlo", "success")
+        else:
+            flash("⚠️ Itinerario no encontrado en el archivo", "warning")
+    except Exception as e:
+        flash(f"❌ Error restaurando itinerario: {e}", "danger")
+    
+    return redirect(url_for("ver_itinerario", id=id))
+
 # ========== NUEVAS RUTAS PARA SISTEMA COMPLETO ==========
 
 @app.route("/mis-itinerarios")
 @login_required
 def mis_itinerarios():
     """Página para ver todos los itinerarios del usuario"""
-    if db is None:
+    if obtener_db() is None:
         flash("❌ Base de datos no disponible", "danger")
         return redirect(url_for("index"))
     
     try:
         user_id = session["user_id"]
-        itinerarios = list(itinerarios_collection.find({
-            "usuario_id": ObjectId(user_id)
-        }).sort("fecha_creacion", -1))
+        cursor = request.args.get("cursor")
+        # Por defecto solo la colección principal; ?archivados=1 incluye los archivados
+        archivados = request.args.get("archivados") == "1"
+        itinerarios, siguiente_cursor = paginar_itinerarios(
+            user_id,
+            cursor=cursor,
+            limite=obtener_limite_pagina(request.args.get("limite")),
+            proyeccion=Itinerario.proyeccion("mis_itinerarios"),  # El progreso sale de los contadores
+            incluir_archivados=archivados
+        )
+        
+        # Las estadísticas globales solo hacen falta en la primera página
+        resumen = resumen_itinerarios(user_id) if not cursor else resumen_vacio()
         
         # Calcular estadísticas para cada itinerario
-        for itinerario in itinerarios:
-            itinerario['porcentaje_completado'] = calcular_porcentaje_completado(itinerario)
-            itinerario['porcentaje_presupuesto'] = calcular_porcentaje_presupuesto(itinerario)
-            itinerario['dias_restantes'] = calcular_dias_restantes(itinerario)
+        itinerarios = [Itinerario.desde_documento(
+            itinerario,
+            porcentaje_completado=calcular_porcentaje_completado(itinerario),
+            porcentaje_presupuesto=calcular_porcentaje_presupuesto(itinerario),
+            dias_restantes=calcular_dias_restantes(itinerario)
+        ) for itinerario in itinerarios]
             
-        return render_template("mis_itinerarios.html", itinerarios=itinerarios)
+        return render_template("mis_itinerarios.html",
+                             itinerarios=itinerarios,
+                             siguiente_cursor=siguiente_cursor,
+                             archivados=archivados,
+                             resumen=resumen)
         
     except Exception as e:
         flash(f"❌ Error cargando itinerarios: {e}", "danger")
@@ -1042,7 +1415,7 @@ def actualizar_perfil():
             }
             
             # Actualizar en base de datos
-            usuarios_collection.update_one(
+            usuarios_collection().update_one(
                 {"_id": ObjectId(user_id)},
                 {"$set": updates}
             )
@@ -1060,27 +1433,397 @@ def actualizar_perfil():
 # ========== API ENDPOINTS ==========
 
 @app.route("/api/destinos")
+@precalculada(solo_anonimas=False)
 def api_destinos():
     """API para obtener datos de destinos"""
     return jsonify(TOURS_PREDEFINIDOS)
 
+@app.route("/api/buscar")
+def api_buscar():
+    """Busca tours y destinos por texto (con prefijos) y filtros de país, presupuesto y experiencia"""
+    inicio = time.perf_counter()
+    try:
+        limite = min(max(int(request.args.get("limite", 20)), 1), MAX_RESULTADOS_BUSQUEDA)
+        total, resultados = obtener_indice_busqueda().buscar(
+            request.args.get("q", ""),
+            pais=request.args.get("pais") or None,
+            presupuesto=request.args.get("presupuesto") or None,
+            experiencia=request.args.get("experiencia") or None,
+            limite=limite
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "resultados": resultados,
+        "total": total,
+        "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 3)
+    })
+
+@app.route("/api/ruta")
+def api_ruta():
+    """Ordena países y ciudades del catálogo por la ruta más corta (?paradas=Japón,Vietnam&inicio=Japón)"""
+    inicio = time.perf_counter()
+    paradas = [p.strip() for valor in request.args.getlist("paradas") for p in valor.split(",")]
+    try:
+        ruta = ordenar_paradas(paradas, inicio=request.args.get("inicio") or None)
+    except RutaError as e:
+        return jsonify({"error": str(e)}), 400
+
+    ruta["tiempo_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+    return jsonify(ruta)
+
+@app.route("/api/mapa")
+@login_required
+def api_mapa():
+    """GeoJSON del mapa del planificador: países del catálogo y lugares de actividad agrupados por zoom"""
+    user_id = session["user_id"]
+    if obtener_db() is None:
+        entrada = mapa_serializado({})
+    else:
+        try:
+            # La revisión se lee antes de agregar: si otra petición escribe mientras tanto,
+            # lo calculado queda guardado con la revisión antigua y no se vuelve a servir
+            usuario = usuarios_collection().find_one({"_id": ObjectId(user_id)}, {"rev_itinerarios": 1})
+            clave = f"{user_id}:{(usuario or {}).get('rev_itinerarios', 0)}"
+            entrada = cache_mapa.obtener(clave)
+            if entrada is None:
+                resumen = next(itinerarios_collection().aggregate(pipeline_mapa(ObjectId(user_id))), {})
+                entrada = mapa_serializado(resumen)
+                cache_mapa.guardar(clave, entrada)
+        except Exception as e:
+            print(f"❌ Error calculando el mapa: {e}")
+            return jsonify({"error": "No se pudo calcular el mapa"}), 503
+
+    cuerpo, etag = entrada
+    if request.if_none_match.contains(etag):
+        respuesta = Response(status=304)
+    else:
+        respuesta = Response(cuerpo, mimetype="application/geo+json")
+    respuesta.set_etag(etag)
+    respuesta.headers["Cache-Control"] = "private, no-cache"
+    return respuesta
+
+@app.route("/api/cotizaciones/batch", methods=["POST"])
+def api_cotizaciones_batch():
+    """API para cotizar miles de combinaciones en una sola petición.
+
+    Acepta {"combinaciones": [{pais, categoria, personas, noches}, ...]} o
+    {"rejilla": {paises, categorias, personas: [min, max], noches: [min, max]}}.
+    Responde JSON columnar o CSV (?formato=csv o Accept: text/csv).
+    """
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        return jsonify({'error': 'Se esperaba un cuerpo JSON'}), 400
+    
+    try:
+        if "rejilla" in datos:
+            rejilla = datos["rejilla"] or {}
+            if not isinstance(rejilla, dict):
+                return jsonify({'error': '"rejilla" debe ser un objeto JSON'}), 400
+            resultado = motor_cotizaciones.cotizar_rejilla(
+                paises=rejilla.get("paises"),
+                categorias=rejilla.get("categorias"),
+                personas=rejilla.get("personas", (1, 10)),
+                noches=rejilla.get("noches", (3, 30)),
+                fecha=rejilla.get("fecha")
+            )
+        elif isinstance(datos.get("combinaciones"), list):
+            resultado = motor_cotizaciones.cotizar_combinaciones(datos["combinaciones"])
+        else:
+            return jsonify({'error': 'Indica "combinaciones" o "rejilla"'}), 400
+    except CotizacionError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    formato = request.args.get("formato") or datos.get("formato")
+    if formato == "csv" or (not formato and request.accept_mimetypes.best == "text/csv"):
+        return Response(generar_csv(resultado), mimetype="text/csv",
+                        headers={"Content-Disposition": "attachment; filename=cotizaciones.csv"})
+    return jsonify(columnas_json(resultado))
+
+@app.route("/api/tours/<pais>/calendario")
+def api_calendario_tour(pais):
+    """API con el calendario de precios de 365 días de un tour.
+
+    Sin parámetros devuelve la tarifa por persona y noche de cada día;
+    con ?noches=N, el precio por persona de una estancia que sale ese día.
+    """
+    noches = request.args.get("noches", type=int)
+    try:
+        precios = motor_cotizaciones.calendario(pais, noches=noches)
+    except CotizacionError as e:
+        return jsonify({'error': str(e)}), 404 if pais not in TOURS_PREDEFINIDOS else 400
+    
+    return jsonify({
+        'pais': pais,
+        'noches': noches,
+        'dias': DIAS_CALENDARIO,
+        'inicio': '01-01',
+        'temporadas': TEMPORADAS.get("*", []) + TEMPORADAS.get(pais, []),
+        'precios': {categoria: valores.tolist() for categoria, valores in precios.items()}
+    })
+
 @app.route("/api/itinerarios")
 @login_required
 def api_itinerarios():
-    """API para obtener itinerarios del usuario"""
+    """API para obtener itinerarios del usuario (JSON paginado o exportación NDJSON en streaming)"""
     user_id = session["user_id"]
-    itinerarios = list(itinerarios_collection.find(
-        {"usuario_id": ObjectId(user_id)},
-        {"actividades": 0}  # Excluir actividades para optimizar
-    ).sort("fecha_creacion", -1))
+    formato = request.args.get("formato", request.args.get("format"))
+    if (formato == "ndjson"
+            or request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"]) == "application/x-ndjson"):
+        return exportar_itinerarios_ndjson(user_id, request.args.get("cursor"))
+
+    limite = obtener_limite_pagina(request.args.get("limite"))
+    try:
+        itinerarios, siguiente_cursor = paginar_itinerarios(
+            user_id,
+            cursor=request.args.get("cursor"),
+            limite=limite,
+            proyeccion={"actividades": 0}  # Excluir actividades para optimizar
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Convertir ObjectId a string
     for itinerario in itinerarios:
-        itinerario['_id'] = str(itinerario['_id'])
-        itinerario['porcentaje_completado'] = calcular_porcentaje_completado(itinerario)
-        itinerario['porcentaje_presupuesto'] = calcular_porcentaje_presupuesto(itinerario)
+        itinerario_api(itinerario)
     
-    return jsonify(itinerarios)
+    # El cuerpo sigue siendo una lista; la página siguiente se anuncia en cabeceras
+    respuesta = jsonify(itinerarios)
+    if siguiente_cursor:
+        siguiente_url = url_for("api_itinerarios", cursor=siguiente_cursor, limite=limite)
+        respuesta.headers["X-Siguiente-Cursor"] = siguiente_cursor
+        respuesta.headers["Link"] = f'<{siguiente_url}>; rel="next"'
+    return respuesta
+
+@app.route("/api/itinerarios/<itinerario_id>/actividades/bulk", methods=["POST"])
+@login_required
+def api_agregar_actividades(itinerario_id):
+    """Agrega N actividades con un solo $push/$each y un solo $inc del presupuesto"""
+    datos = request.get_json(silent=True) or {}
+    actividades = datos.get("actividades")
+    if not isinstance(actividades, list) or not actividades:
+        return jsonify({'success': False, 'error': 'Se esperaba una lista "actividades"'}), 400
+    if len(actividades) > MAX_ACTIVIDADES_LOTE:
+        return jsonify({'success': False, 'error': f'Máximo {MAX_ACTIVIDADES_LOTE} actividades por lote'}), 400
+
+    ahora = datetime.datetime.utcnow()
+    nuevas = []
+    for i, actividad in enumerate(actividades):
+        try:
+            nueva = {
+                "_id": ObjectId(),
+                "pais": str(actividad.get("pais", "")).strip(),
+                "ciudad": str(actividad.get("ciudad", "")).strip(),
+                "actividad": str(actividad.get("actividad", "")).strip(),
+                "tipo": actividad.get("tipo", "cultural"),
+                "costo": float(actividad.get("costo", 0) or 0),
+                "fecha": actividad.get("fecha", ""),
+                "completada": False,
+                "fecha_creacion": ahora
+            }
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({'success': False, 'error': f'Actividad {i} inválida'}), 400
+        if not nueva["pais"] or not nueva["ciudad"] or not nueva["actividad"]:
+            return jsonify({'success': False, 'error': f'Actividad {i}: país, ciudad y actividad son obligatorios'}), 400
+        nuevas.append(nueva)
+
+    try:
+        itinerario = itinerarios_collection().find_one_and_update(
+            {"_id": ObjectId(itinerario_id), "usuario_id": ObjectId(session["user_id"])},
+            [{"$set": {
+                "actividades": {"$concatArrays": [{"$ifNull": ["$actividades", []]}, {"$literal": nuevas}]},
+                "presupuesto_restante": {"$subtract": [
+                    {"$ifNull": ["$presupuesto_restante", 0]},
+                    sum(a["costo"] for a in nuevas)
+                ]},
+                **contadores_actividades_expr(total=len(nuevas)),
+                "fecha_actualizacion": ahora
+            }}],
+            projection={"presupuesto_restante": 1, "actividades_total": 1, "actividades_completadas": 1},
+            return_document=ReturnDocument.AFTER
+        )
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+    if not itinerario:
+        return jsonify({'success': False, 'error': 'Itinerario no encontrado'}), 404
+    invalidar_caches_usuario(session["user_id"], itinerario_id)
+    return jsonify({
+        'success': True,
+        'actividades': [str(a["_id"]) for a in nuevas],
+        'presupuesto_restante': itinerario.get('presupuesto_restante', 0),
+        'porcentaje_completado': calcular_porcentaje_completado(itinerario)
+    })
+
+@app.route("/api/itinerarios/<itinerario_id>/actividades/completar", methods=["POST"])
+@login_required
+def api_completar_actividades(itinerario_id):
+    """Marca, desmarca o alterna varias actividades con un solo bulk_write.
+
+    Con `completada` (true/false) fija ese estado; sin él alterna cada
+    actividad. actividades_completadas se ajusta solo si el estado cambia.
+    """
+    datos = request.get_json(silent=True) or {}
+    completada = datos.get("completada")
+    try:
+        ids = list(dict.fromkeys(ObjectId(a) for a in datos.get("actividades") or []))
+    except (InvalidId, TypeError):
+        return jsonify({'success': False, 'error': 'Identificador de actividad inválido'}), 400
+    if not ids:
+        return jsonify({'success': False, 'error': 'Se esperaba una lista "actividades"'}), 400
+    if len(ids) > MAX_ACTIVIDADES_LOTE:
+        return jsonify({'success': False, 'error': f'Máximo {MAX_ACTIVIDADES_LOTE} actividades por lote'}), 400
+    if completada not in (None, True, False):
+        return jsonify({'success': False, 'error': 'completada debe ser true o false'}), 400
+
+    try:
+        filtro = {"_id": ObjectId(itinerario_id), "usuario_id": ObjectId(session["user_id"])}
+    except InvalidId:
+        return jsonify({'success': False, 'error': 'Itinerario no encontrado'}), 404
+
+    ahora = datetime.datetime.utcnow()
+    operaciones = []
+    for oid in ids:
+        if completada is None:
+            # Alternar: misma actualización con pipeline que /toggle-actividad
+            operaciones.append(UpdateOne(dict(filtro, **{"actividades._id": oid}), [{"$set": {
+                **contadores_actividades_expr(
+                    completadas={"$cond": [{"$ifNull": [actividad_expr(oid, "completada"), False]}, -1, 1]}
+                ),
+                "actividades": modificar_actividad_expr(oid, {
+                    "completada": {"$not": [{"$ifNull": ["$$a.completada", False]}]}
+                }),
+                "fecha_actualizacion": ahora
+            }}]))
+        else:
+            # Solo coincide si la actividad está en el estado contrario: el contador no se descuadra
+            estado_actual = {"$ne": True} if completada else True
+            operaciones.append(UpdateOne(
+                dict(filtro, actividades={"$elemMatch": {"_id": oid, "completada": estado_actual}}),
+                [{"$set": {
+                    **contadores_actividades_expr(completadas=1 if completada else -1),
+                    "actividades": modificar_actividad_expr(oid, {"completada": completada}),
+                    "fecha_actualizacion": ahora
+                }}]
+            ))
+
+    try:
+        resultado = itinerarios_collection().bulk_write(operaciones, ordered=False)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+    if resultado.modified_count:
+        invalidar_caches_usuario(session["user_id"], itinerario_id)
+    return jsonify({
+        'success': True,
+        'modificadas': resultado.modified_count,
+        'sin_cambios': len(operaciones) - resultado.modified_count
+    })
+
+@app.route("/api/itinerarios/cambios")
+@login_required
+def api_itinerarios_cambios():
+    """Itinerarios creados o modificados y eliminaciones desde `desde`, con el cursor siguiente.
+
+    Los cambios van en orden (fecha, _id) y el cursor devuelto apunta al
+    último; con `completo: false` el cliente repite la llamada con él. Si
+    nada cambió, el ETag coincide y la respuesta es un 304 sin cuerpo.
+    """
+    if obtener_db() is None:
+        return jsonify({'error': 'Base de datos no disponible'}), 503
+    user_id = ObjectId(session["user_id"])
+    try:
+        limite = max(1, min(int(request.args.get("limite", MAX_CAMBIOS_POR_PAGINA)), MAX_CAMBIOS_POR_PAGINA))
+        posicion = decodificar_desde(request.args["desde"]) if request.args.get("desde") else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    retencion = datetime.datetime.utcnow() - timedelta(days=RETENCION_TOMBSTONES_DIAS)
+    if posicion and posicion[0] < retencion:
+        # Las marcas de borrado más antiguas ya caducaron: hace falta una descarga completa
+        return jsonify({'error': "Cursor demasiado antiguo", 'resincronizar': True}), 410
+
+    filtro_itinerarios = {"usuario_id": user_id}
+    filtro_eliminados = {"usuario_id": user_id}
+    if posicion:
+        filtro_itinerarios.update(filtro_posterior("fecha_actualizacion", posicion))
+        filtro_eliminados.update(filtro_posterior("fecha_eliminacion", posicion))
+
+    modificados = list(itinerarios_collection().find(filtro_itinerarios, {"actividades": 0})
+                       .sort([("fecha_actualizacion", 1), ("_id", 1)])
+                       .limit(limite + 1))
+    eliminados = list(itinerarios_eliminados_collection().find(filtro_eliminados)
+                      .sort([("fecha_eliminacion", 1), ("_id", 1)])
+                      .limit(limite + 1)) if posicion else []
+
+    # Una sola línea temporal con las dos colecciones
+    cambios = sorted(
+        [(it["fecha_actualizacion"], it["_id"], it) for it in modificados]
+        + [(marca["fecha_eliminacion"], marca["_id"], None) for marca in eliminados],
+        key=lambda cambio: (cambio[0], cambio[1])
+    )
+    completo = len(cambios) <= limite
+    cambios = cambios[:limite]
+    cursor = codificar_posicion(cambios[-1][0], cambios[-1][1]) if cambios else request.args.get("desde")
+
+    etag = f"{cursor or 'inicio'}-{int(completo)}"
+    if request.if_none_match.contains(etag):
+        respuesta = Response(status=304)
+    else:
+        respuesta = jsonify({
+            'itinerarios': [itinerario_api(it) for _, _, it in cambios if it is not None],
+            'eliminados': [str(oid) for _, oid, it in cambios if it is None],
+            'cursor': cursor,
+            'completo': completo
+        })
+    respuesta.set_etag(etag)
+    respuesta.headers["Cache-Control"] = "private, no-cache"
+    return respuesta
+
+def exportar_itinerarios_ndjson(user_id, cursor=None):
+    """Todos los itinerarios del usuario (desde `cursor`), un documento JSON por línea.
+
+    El cuerpo se genera mientras se recorre el cursor de MongoDB, por lotes
+    de NDJSON_BATCH_SIZE: la memoria del worker no depende del número de
+    itinerarios y el cliente recibe el primero sin esperar al último.
+    """
+    try:
+        filtro = filtro_desde_cursor(user_id, cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    resultados = (itinerarios_collection().find(filtro, {"actividades": 0})
+                  .sort([("fecha_creacion", -1), ("_id", -1)])
+                  .batch_size(NDJSON_BATCH_SIZE))
+
+    def generar():
+        try:
+            for itinerario in resultados:
+                yield linea_ndjson(itinerario_api(itinerario))
+        finally:
+            resultados.close()
+
+    # Sin Content-Length: gunicorn lo envía con Transfer-Encoding: chunked
+    respuesta = Response(generar(), mimetype="application/x-ndjson")
+    respuesta.headers["X-Accel-Buffering"] = "no"
+    return respuesta
+
+@app.route("/healthz")
+def healthz():
+    """Readiness: 200 si MongoDB responde a un ping, 503 si no (modo demo, servidor caído o COLLSCAN)"""
+    ok, detalles = conexion.comprobar(timeout=float(os.environ.get("HEALTHZ_TIMEOUT", 2)))
+    if error_planes is not None:
+        # Con VERIFICAR_PLANES_AL_ARRANCAR=1 una ruta sin índice deja el worker fuera de servicio
+        ok = False
+        detalles["planes"] = error_planes
+    detalles.update({"estado": "ok" if ok else "degradado", "pid": os.getpid()})
+    return jsonify(detalles), 200 if ok else 503
+
+@app.route("/metrics")
+def metrics():
+    """Métricas de todos los workers en formato de texto de Prometheus"""
+    return Response(metricas.exportar(), mimetype="text/plain; version=0.0.4; charset=utf-8")
 
 # ========== MANEJO DE ERRORES ==========
 
@@ -1094,22 +1837,50 @@ def internal_error(error):
 
 # ========== INICIALIZACIÓN ==========
 
-def init_db():
-    """Inicializar la base de datos con índices"""
+# Fallo de la verificación de planes al arrancar (VERIFICAR_PLANES_AL_ARRANCAR=1); /healthz lo informa
+error_planes = None
+
+def init_db(db):
+    """Inicializar la base de datos con índices y migraciones pendientes"""
+    global error_planes
     try:
-        if db is not None:
-            # Crear índices
-            usuarios_collection.create_index('email', unique=True)
-            itinerarios_collection.create_index('usuario_id')
-            itinerarios_collection.create_index([('fecha_creacion', -1)])
-            destinos_collection.create_index([('pais', 1)])
-            print("✅ Base de datos inicializada correctamente")
+        aplicadas = aplicar_migraciones(db)
+        bloqueadas = [m["_id"] for m in migraciones_en_curso(db)]
+        print(f"✅ Base de datos inicializada correctamente (migraciones: {aplicadas or 'al día'})")
+        if bloqueadas:
+            print(f"⏳ Migraciones en curso en otro proceso: {bloqueadas}")
     except Exception as e:
         print(f"❌ Error inicializando BD: {e}")
+        return
+    if os.environ.get("VERIFICAR_PLANES_AL_ARRANCAR") == "1":
+        try:
+            verificar_planes(db)
+        except (PlanConsultaError, OperationFailure) as e:
+            error_planes = str(e)
+            app.logger.error("❌ Verificación de planes de consulta: %s", e)
+            return
+        error_planes = None
+        print("✅ Planes de consulta verificados: ninguna ruta hace COLLSCAN")
+
+registrar_comandos(app, obtener_db)
+registrar_comandos_archivo(app, obtener_db, invalidar_cache_itinerario)
+registrar_comandos_datos(app, obtener_db)
+
+# Las migraciones corren en segundo plano cuando cada worker crea su cliente,
+# así el arranque no espera a MongoDB
+if os.environ.get("MIGRAR_AL_ARRANCAR", "1") == "1":
+    conexion.al_conectar(init_db)
+
+# Páginas del catálogo generadas una vez por worker (o en el master con --preload)
+RUTAS_CATALOGO = ["/destinos", "/explora", "/cotizar", "/api/destinos"]
+if os.environ.get("PRECALCULAR_CATALOGO", "1") == "1":
+    try:
+        precalcular(app, RUTAS_CATALOGO)
+    except Exception as e:
+        print(f"❌ Error precalculando catálogo: {e}")
 
 # ========== CONFIGURACIÓN PARA PRODUCCIÓN ==========
 
 if __name__ == "__main__":
-    init_db()
     port = int(os.environ.get("PORT", 10000))
     app.run(host='0.0.0.0', port=port, debug=False)  # IMPORTANTE: debug=False
\ No newline at end of file
@@ -0,0 +1,182 @@
+"""Archivo de itinerarios terminados: colección caliente y colección fría.
+
+`itinerarios` solo debería contener los viajes con los que se trabaja: los
+listados, el mapa y la sincronización leen de ella, y sus índices tienen que
+caber en memoria. Un itinerario pasa a `itinerarios_archivo` cuando su
+`fecha_fin` quedó hace más de ARCHIVAR_TRAS_DIAS días o cuando está
+`completado`, siempre que nadie lo haya modificado en los últimos
+ARCHIVAR_SIN_CAMBIOS_DIAS (así un itinerario restaurado para editarlo no
+vuelve al archivo en la siguiente pasada).
+
+El traslado se hace por lotes (copia con upsert y borrado condicionado a que
+`fecha_actualizacion` no haya cambiado), así que se puede interrumpir y
+repetir, y un itinerario que alguien edita durante el traslado se queda en
+la colección caliente. Pensado para un cron o un scheduler:
+
+    flask --app app archivo ejecutar [--dias 365] [--lote 500] [--simular]
+    flask --app app archivo restaurar <id>
+
+Los itinerarios archivados se pueden seguir viendo (ver_itinerario cae al
+archivo si no lo encuentra) y listando con /mis-itinerarios?archivados=1;
+para editarlos hay que restaurarlos.
+
+Las estadísticas del perfil solo cuentan la colección caliente: archivar o
+restaurar sube usuarios.rev_estadisticas de los usuarios afectados para que
+/profile las recalcule, y usuarios.rev_itinerarios para que el mapa también.
+
+Para la sincronización incremental (/api/itinerarios/cambios) archivar es
+una eliminación: cada itinerario trasladado deja su marca en
+`itinerarios_eliminados`, igual que un borrado, y restaurarlo la quita.
+"""
+import datetime
+import itertools
+import os
+
+import click
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from flask.cli import AppGroup
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+ARCHIVAR_TRAS_DIAS = int(os.environ.get("ARCHIVAR_TRAS_DIAS", 365))
+ARCHIVAR_SIN_CAMBIOS_DIAS = int(os.environ.get("ARCHIVAR_SIN_CAMBIOS_DIAS", 30))
+TAMANO_LOTE_ARCHIVO = 500
+# fecha_fin se guarda como texto YYYY-MM-DD: el límite inferior deja fuera las vacías
+FECHA_MINIMA = "1000-01-01"
+
+
+def filtro_archivables(ahora, dias=ARCHIVAR_TRAS_DIAS, dias_sin_cambios=ARCHIVAR_SIN_CAMBIOS_DIAS):
+    """Itinerarios que ya no pertenecen a la colección caliente"""
+    limite_fin = (ahora - datetime.timedelta(days=dias)).strftime("%Y-%m-%d")
+    return {
+        "fecha_actualizacion": {"$lt": ahora - datetime.timedelta(days=dias_sin_cambios)},
+        "$or": [
+            {"fecha_fin": {"$gte": FECHA_MINIMA, "$lt": limite_fin}},
+            {"estado": "completado"},
+        ],
+    }
+
+def archivar_itinerarios(db, dias=ARCHIVAR_TRAS_DIAS, dias_sin_cambios=ARCHIVAR_SIN_CAMBIOS_DIAS,
+                         tamano_lote=TAMANO_LOTE_ARCHIVO, simular=False, ahora=None, invalidar=None):
+    """Traslada a `itinerarios_archivo` los itinerarios archivables, lote a lote.
+
+    Devuelve {"archivados", "modificados", "lotes"}; "modificados" son los que
+    cambiaron durante el traslado y se quedaron en la colección caliente.
+    `invalidar(usuario_id, itinerario_id)` se llama por cada itinerario
+    trasladado para descartar las copias cacheadas.
+    """
+    ahora = ahora or datetime.datetime.utcnow()
+    filtro = filtro_archivables(ahora, dias, dias_sin_cambios)
+    if simular:
+        return {"archivados": db.itinerarios.count_documents(filtro), "modificados": 0, "lotes": 0}
+
+    resultado = {"archivados": 0, "modificados": 0, "lotes": 0}
+    # Un solo cursor para toda la pasada: cada lote es el siguiente tramo, sin repetir la consulta
+    cursor = db.itinerarios.find(filtro).batch_size(tamano_lote)
+    while True:
+        lote = list(itertools.islice(cursor, tamano_lote))
+        if not lote:
+            return resultado
+        resultado["lotes"] += 1
+
+        # Copia idempotente: si un traslado anterior se cortó aquí, se sobrescribe
+        db.itinerarios_archivo.bulk_write([
+            ReplaceOne({"_id": it["_id"]}, dict(it, fecha_archivado=ahora), upsert=True) for it in lote
+        ], ordered=False)
+        # Solo se borra el original que sigue igual que la copia
+        db.itinerarios.bulk_write([
+            DeleteOne({"_id": it["_id"], "fecha_actualizacion": it.get("fecha_actualizacion")}) for it in lote
+        ], ordered=False)
+
+        ids = [it["_id"] for it in lote]
+        modificados = {it["_id"] for it in db.itinerarios.find({"_id": {"$in": ids}}, {"_id": 1})}
+        if modificados:
+            db.itinerarios_archivo.delete_many({"_id": {"$in": list(modificados)}})
+        archivados = [it for it in lote if it["_id"] not in modificados]
+        resultado["modificados"] += len(modificados)
+        resultado["archivados"] += len(archivados)
+        if not archivados:
+            continue
+
+        # Marca de eliminación para los clientes con sincronización incremental (idempotente)
+        fecha_eliminacion = datetime.datetime.utcnow()
+        db.itinerarios_eliminados.bulk_write([
+            UpdateOne({"_id": it["_id"]},
+                      {"$set": {"usuario_id": it.get("usuario_id"), "fecha_eliminacion": fecha_eliminacion}},
+                      upsert=True)
+            for it in archivados
+        ], ordered=False)
+        # Estadísticas del perfil y mapa obsoletos para los dueños de lo archivado
+        usuarios = {it.get("usuario_id") for it in archivados}
+        db.usuarios.update_many({"_id": {"$in": list(usuarios)}},
+                                {"$inc": {"rev_estadisticas": 1, "rev_itinerarios": 1}})
+        if invalidar is not None:
+            for it in archivados:
+                invalidar(it.get("usuario_id"), it["_id"])
+
+def restaurar_itinerario(db, itinerario_id, usuario_id=None):
+    """Devuelve un itinerario archivado a la colección caliente; None si no estaba archivado"""
+    filtro = {"_id": ObjectId(itinerario_id)}
+    if usuario_id is not None:
+        filtro["usuario_id"] = ObjectId(usuario_id)
+    itinerario = db.itinerarios_archivo.find_one(filtro)
+    if itinerario is None:
+        return None
+    itinerario.pop("fecha_archivado", None)
+    # Cuenta como una modificación: no se vuelve a archivar en la próxima pasada
+    itinerario["fecha_actualizacion"] = datetime.datetime.utcnow()
+    db.itinerarios.replace_one({"_id": itinerario["_id"]}, itinerario, upsert=True)
+    db.itinerarios_archivo.delete_one({"_id": itinerario["_id"]})
+    # Vuelve a existir: su fecha_actualizacion nueva lo lleva a los clientes incrementales
+    db.itinerarios_eliminados.delete_one({"_id": itinerario["_id"]})
+    db.usuarios.update_one({"_id": itinerario.get("usuario_id")}, {"$inc": {"rev_estadisticas": 1, "rev_itinerarios": 1}})
+    return itinerario
+
+
+# ========== COMANDOS FLASK ==========
+
+def registrar_comandos_archivo(app, obtener_db, invalidar=None):
+    """Registra el grupo `flask archivo` en la aplicación.
+
+    `invalidar(usuario_id, itinerario_id)` descarta la copia cacheada de un
+    itinerario trasladado en cualquiera de los dos sentidos.
+    """
+    archivo_cli = AppGroup("archivo", help="Archivo de itinerarios terminados")
+
+    @archivo_cli.command("ejecutar")
+    @click.option("--dias", default=ARCHIVAR_TRAS_DIAS, show_default=True,
+                  help="Archivar los que terminaron hace más de estos días")
+    @click.option("--dias-sin-cambios", default=ARCHIVAR_SIN_CAMBIOS_DIAS, show_default=True,
+                  help="Solo los que nadie ha modificado en estos días")
+    @click.option("--lote", default=TAMANO_LOTE_ARCHIVO, show_default=True, help="Itinerarios por lote")
+    @click.option("--simular", is_flag=True, help="Solo cuenta los itinerarios archivables")
+    def ejecutar(dias, dias_sin_cambios, lote, simular):
+        """Traslada los itinerarios terminados a itinerarios_archivo"""
+        db = obtener_db()
+        if db is None:
+            raise click.ClickException("Base de datos no disponible")
+        resultado = archivar_itinerarios(db, dias, dias_sin_cambios, lote, simular=simular, invalidar=invalidar)
+        if simular:
+            click.echo(f"🔎 Itinerarios archivables: {resultado['archivados']}")
+            return
+        click.echo(f"🗄️ Archivados: {resultado['archivados']} en {resultado['lotes']} lotes"
+                   f" ({resultado['modificados']} modificados durante el traslado, se quedan)")
+
+    @archivo_cli.command("restaurar")
+    @click.argument("itinerario_id")
+    def restaurar(itinerario_id):
+        """Devuelve un itinerario archivado a la colección principal"""
+        db = obtener_db()
+        if db is None:
+            raise click.ClickException("Base de datos no disponible")
+        try:
+            restaurado = restaurar_itinerario(db, itinerario_id)
+        except InvalidId:
+            raise click.ClickException(f"Identificador inválido: {itinerario_id}")
+        if restaurado is None:
+            raise click.ClickException(f"El itinerario {itinerario_id} no está archivado")
+        if invalidar is not None:
+            invalidar(restaurado.get("usuario_id"), restaurado["_id"])
+        click.echo(f"✅ Itinerario {itinerario_id} restaurado")
+
+    app.cli.add_command(archivo_cli)
@@ -0,0 +1,98 @@
+"""Benchmark de la búsqueda de destinos: índice invertido frente a filtrado lineal.
+
+Uso (desde la raíz del repositorio):
+
+    python benchmarks/bench_busqueda.py [--destinos 20000] [--consultas 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson.objectid import ObjectId
+
+from busqueda import construir_indice, normalizar
+from catalogo import TOURS_PREDEFINIDOS
+
+PALABRAS = ["templo", "playa", "mercado", "montaña", "isla", "palacio", "jardín", "río",
+            "bahía", "volcán", "arrozales", "santuario", "barrio", "museo", "selva", "lago"]
+CIUDADES = ["Tokio", "Kioto", "Osaka", "Bangkok", "Phuket", "Hanói", "Seúl", "Busan", "Bali",
+            "Ubud", "Pekín", "Shanghái", "Delhi", "Jaipur", "Manila", "Cebú", "Kandy", "Siem Reap"]
+CONSULTAS = ["kioto", "templo", "playa bali", "merc", "seul", "isla", "volcan", "palacio jaipur", "pek"]
+
+
+def generar_destinos(cantidad, semilla=42):
+    """Destinos sintéticos con la forma de los de la colección `destinos`"""
+    aleatorio = random.Random(semilla)
+    paises = sorted({tour["pais"] for tour in TOURS_PREDEFINIDOS.values()})
+    destinos = []
+    for _ in range(cantidad):
+        ciudad = aleatorio.choice(CIUDADES)
+        destinos.append({
+            "_id": ObjectId(),
+            "nombre": f"{aleatorio.choice(PALABRAS).capitalize()} de {ciudad}",
+            "pais": aleatorio.choice(paises),
+            "ciudad": ciudad,
+            "descripcion": " ".join(aleatorio.choices(PALABRAS, k=12)),
+            "presupuesto": aleatorio.randint(300, 5000)
+        })
+    return destinos
+
+def buscar_lineal(destinos, consulta):
+    """Filtrado por subcadena sobre todos los documentos, como hacía /explora en el navegador"""
+    terminos = normalizar(consulta).split()
+    resultados = []
+    for destino in destinos:
+        texto = normalizar(" ".join(str(destino.get(c, "")) for c in ("nombre", "pais", "ciudad", "descripcion")))
+        if all(termino in texto for termino in terminos):
+            resultados.append(destino)
+    return resultados
+
+def percentiles(tiempos):
+    """p50 y p99 en milisegundos"""
+    tiempos = sorted(tiempos)
+    return (tiempos[len(tiempos) // 2] * 1000,
+            tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))] * 1000)
+
+def medir(funcion, consultas):
+    """Latencia de cada consulta, en segundos"""
+    tiempos = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        funcion(consulta)
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--destinos", type=int, default=20000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    args = parser.parse_args()
+
+    destinos = generar_destinos(args.destinos)
+    inicio = time.perf_counter()
+    indice = construir_indice(TOURS_PREDEFINIDOS, destinos)
+    construccion = time.perf_counter() - inicio
+
+    consultas = [CONSULTAS[i % len(CONSULTAS)] for i in range(args.consultas)]
+    # El filtrado lineal es lento: basta con una muestra para la comparación
+    muestra = consultas[:max(len(CONSULTAS), args.consultas // 20)]
+
+    resultados = [
+        ("índice invertido", medir(lambda q: indice.buscar(q, limite=20), consultas)),
+        ("índice + filtro de presupuesto",
+         medir(lambda q: indice.buscar(q, presupuesto="medio", limite=20), consultas)),
+        ("filtrado lineal", medir(lambda q: buscar_lineal(destinos, q), muestra)),
+    ]
+
+    print(f"Índice: {len(indice)} documentos construidos en {construccion * 1000:.1f} ms")
+    for nombre, tiempos in resultados:
+        p50, p99 = percentiles(tiempos)
+        print(f"{nombre:32s} p50 {p50:8.3f} ms   p99 {p99:8.3f} ms   ({len(tiempos)} consultas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark del motor de cotizaciones: bucle de Python frente a NumPy.
+
+Uso (desde la raíz del repositorio):
+
+    python benchmarks/bench_cotizaciones.py [--repeticiones 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalogo import TOURS_PREDEFINIDOS, TEMPORADAS
+from cotizaciones import MotorCotizaciones, MULTIPLICADORES_CATEGORIA
+
+
+def cotizar_en_bucle(combinaciones):
+    """Cálculo combinación a combinación, como hacía antes /procesar_cotizacion"""
+    precios = []
+    for pais, categoria, personas, noches in combinaciones:
+        precio_base = TOURS_PREDEFINIDOS[pais]["precio_base"]
+        precio = precio_base * MULTIPLICADORES_CATEGORIA.get(categoria, 1.0) * personas * (noches / 7)
+        precios.append(round(precio, 2))
+    return precios
+
+def medir(funcion, repeticiones):
+    """Mejor tiempo de `repeticiones` ejecuciones, en segundos"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    motor = MotorCotizaciones(TOURS_PREDEFINIDOS, TEMPORADAS)
+    rejilla = motor.cotizar_rejilla()
+    total = len(rejilla["precio"])
+    combinaciones = list(zip(rejilla["pais"], rejilla["categoria"],
+                             rejilla["personas"].tolist(), rejilla["noches"].tolist()))
+    dicts = [{"pais": p, "categoria": c, "personas": n, "noches": m} for p, c, n, m in combinaciones]
+
+    # Los tres caminos deben dar exactamente los mismos precios
+    assert cotizar_en_bucle(combinaciones) == rejilla["precio"].tolist()
+    assert motor.cotizar_combinaciones(dicts)["precio"].tolist() == rejilla["precio"].tolist()
+
+    resultados = [
+        ("bucle Python", medir(lambda: cotizar_en_bucle(combinaciones), args.repeticiones)),
+        ("lote (lista de combinaciones)", medir(lambda: motor.cotizar_combinaciones(dicts), args.repeticiones)),
+        ("lote (rejilla NumPy)", medir(motor.cotizar_rejilla, args.repeticiones)),
+        ("rejilla con fecha (calendario)",
+         medir(lambda: motor.cotizar_rejilla(fecha="2025-04-01"), args.repeticiones)),
+    ]
+
+    print(f"Rejilla completa: {total} cotizaciones "
+          f"({len(motor.paises)} tours × {len(motor.categorias)} categorías × 1-10 personas × 3-30 noches)")
+    for nombre, segundos in resultados:
+        print(f"{nombre:32s} {segundos * 1000:8.2f} ms  {total / segundos:14,.0f} cotizaciones/s")
+
+
+if __name__ == "__main__":
+    main()
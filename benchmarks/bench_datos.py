@@ -0,0 +1,164 @@
+"""Benchmark de `flask datos import/export`: registros por minuto y memoria.
+
+Genera --registros destinos e itinerarios (con actividades) en NDJSON y CSV,
+los importa con distintos tamaños de lote (--lotes) y los vuelve a exportar.
+Por caso mide registros por minuto y el pico de memoria de Python
+(tracemalloc): la exportación y la importación trabajan documento a
+documento, así que el pico no crece con el número de registros.
+
+Uso (desde la raíz del repositorio):
+
+    # MongoDB real (recomendado): una base de datos desechable, la de la URI
+    # (travelasia_bench si la URI no indica ninguna)
+    python benchmarks/bench_datos.py --mongo-uri mongodb://localhost:27017/travelasia_bench --registros 100000
+
+    # Lanzar un mongod local sobre un directorio temporal
+    python benchmarks/bench_datos.py --mongod /usr/bin/mongod --registros 100000
+
+    # Sin MongoDB: mongomock en proceso (resultados orientativos y lentos)
+    python benchmarks/bench_datos.py
+
+Cada caso vacía destinos, itinerarios y usuarios, así que el benchmark se
+niega a usar una base de datos que ya tiene documentos salvo con --borrar.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+
+from carga import NOMBRE_DB, comprobar_vacia, lanzar_mongod, nombre_db
+from datos import exportar, importar, leer_filas
+
+PAISES = ["Japón", "Tailandia", "Vietnam", "China", "Corea del Sur", "Indonesia", "Singapur"]
+TIPOS = ["cultural", "naturaleza", "gastronomia", "aventura", "compras", "relajacion"]
+
+
+def generar_destino(aleatorio, i):
+    return {
+        "nombre": f"Destino {i}", "pais": aleatorio.choice(PAISES), "ciudad": "Ciudad",
+        "mejor_epoca": "Primavera", "presupuesto": float(aleatorio.randint(300, 5000)),
+        "actividades": "Templos, mercados, playas", "descripcion": "Descripción del destino " * 4,
+        "imagen": "", "calificacion": aleatorio.randint(1, 5),
+    }
+
+def generar_itinerario(aleatorio, i, actividades):
+    return {
+        "nombre_viaje": f"Viaje {i}", "descripcion": "Ruta por Asia",
+        "paises": aleatorio.sample(PAISES, aleatorio.randint(1, 3)),
+        "fecha_inicio": "2025-03-01", "fecha_fin": "2025-03-15", "presupuesto_total": 3000.0,
+        "estado": aleatorio.choice(["planificando", "confirmado", "completado"]),
+        "actividades": [{
+            "actividad": f"Actividad {j}", "pais": aleatorio.choice(PAISES), "ciudad": "Ciudad",
+            "tipo": aleatorio.choice(TIPOS), "costo": float(aleatorio.randint(10, 300)),
+            "fecha": "2025-03-02", "completada": aleatorio.random() < 0.3,
+        } for j in range(actividades)],
+    }
+
+def escribir_fichero(ruta, filas, formato):
+    """Fichero de entrada en NDJSON o CSV (columnas de la primera fila)"""
+    with open(ruta, "w", encoding="utf-8", newline="") as f:
+        if formato == "ndjson":
+            for fila in filas:
+                f.write(json.dumps(fila, ensure_ascii=False) + "\n")
+            return
+        escritor = None
+        for fila in filas:
+            fila = {clave: ("|".join(valor) if clave == "paises" else json.dumps(valor) if isinstance(valor, list)
+                            else valor) for clave, valor in fila.items()}
+            if escritor is None:
+                escritor = csv.DictWriter(f, fieldnames=list(fila))
+                escritor.writeheader()
+            escritor.writerow(fila)
+
+def con_memoria(funcion):
+    """(resultado, segundos, pico de memoria en bytes)"""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, segundos, pico
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-uri", help="MongoDB desechable (se borran sus colecciones)")
+    parser.add_argument("--mongod", help="Binario de mongod para lanzar una instancia temporal")
+    parser.add_argument("--borrar", action="store_true",
+                        help="Permite usar una base de datos que ya tiene documentos")
+    parser.add_argument("--registros", type=int, default=5000, help="Registros por colección")
+    parser.add_argument("--actividades", type=int, default=5, help="Actividades por itinerario")
+    parser.add_argument("--lotes", type=int, nargs="*", default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    proceso_mongod = directorio_mongod = None
+    uri = args.mongo_uri
+    if args.mongod:
+        proceso_mongod, uri, directorio_mongod = lanzar_mongod(args.mongod)
+    directorio = tempfile.mkdtemp(prefix="travelasia_datos_")
+    try:
+        if uri:
+            db = MongoClient(uri)[nombre_db(uri)]
+        else:
+            import mongomock
+            print("⚠️ Sin --mongo-uri ni --mongod: se usa mongomock en proceso (resultados orientativos)")
+            db = mongomock.MongoClient()[NOMBRE_DB]
+        comprobar_vacia(db, args.borrar)
+
+        aleatorio = random.Random(11)
+        for formato in ("ndjson", "csv"):
+            escribir_fichero(os.path.join(directorio, f"destinos.{formato}"),
+                             (generar_destino(aleatorio, i) for i in range(args.registros)), formato)
+            escribir_fichero(os.path.join(directorio, f"itinerarios.{formato}"),
+                             (generar_itinerario(aleatorio, i, args.actividades) for i in range(args.registros)),
+                             formato)
+
+        print(f"{'operación':40s} {'lote':>6s} {'segundos':>9s} {'registros/min':>14s} {'pico memoria':>13s}")
+        for coleccion in ("destinos", "itinerarios"):
+            for formato in ("ndjson", "csv"):
+                for lote in args.lotes:
+                    db.drop_collection(coleccion)
+                    db.drop_collection("usuarios")
+                    usuario_id = db.usuarios.insert_one({"_id": ObjectId(), "email": "bench@ejemplo.com"}).inserted_id
+
+                    def importar_fichero():
+                        with open(os.path.join(directorio, f"{coleccion}.{formato}"), encoding="utf-8",
+                                  newline="") as f:
+                            return importar(db, coleccion, leer_filas(f, formato), lote, usuario_id)
+
+                    resultado, segundos, pico = con_memoria(importar_fichero)
+                    if resultado["insertadas"] != args.registros:
+                        print(f"❌ {coleccion}.{formato}: {resultado['rechazadas']} filas rechazadas")
+                        sys.exit(1)
+                    print(f"{'import ' + coleccion + '.' + formato:40s} {lote:6d} {segundos:9.2f} "
+                          f"{args.registros / segundos * 60:14,.0f} {pico / 1e6:10.1f} MB")
+
+            for formato in ("ndjson", "csv"):
+                def exportar_fichero():
+                    with open(os.path.join(directorio, f"salida.{formato}"), "wb") as f:
+                        return exportar(db, coleccion, f, formato)
+
+                total, segundos, pico = con_memoria(exportar_fichero)
+                print(f"{'export ' + coleccion + '.' + formato:40s} {'':>6s} {segundos:9.2f} "
+                      f"{total / segundos * 60:14,.0f} {pico / 1e6:10.1f} MB")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+        if proceso_mongod is not None:
+            proceso_mongod.terminate()
+            proceso_mongod.wait()
+            shutil.rmtree(directorio_mongod, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
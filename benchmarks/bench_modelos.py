@@ -0,0 +1,146 @@
+"""Benchmark de bytes por ruta: documentos completos frente a proyecciones por vista.
+
+Para cada ruta compara lo que leía antes (documento completo, o sin
+actividades en los listados) con la proyección declarada en modelos.py:
+bytes BSON que envía MongoDB, tiempo de decodificación, lo que cuesta pasar
+los documentos a modelos y memoria de lo que llega a la plantilla (dicts
+completos frente a modelos con __slots__). La proyección
+se aplica en Python con la misma semántica que MongoDB para campos de primer
+nivel, así que no hace falta un servidor.
+
+Uso (desde la raíz del repositorio):
+
+    python benchmarks/bench_modelos.py [--itinerarios 20] [--actividades 40] [--repeticiones 200]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from bson.objectid import ObjectId
+
+from modelos import Destino, Itinerario, Usuario
+
+PAISES = ["Japón", "Tailandia", "Vietnam", "China", "Corea del Sur", "Indonesia", "Singapur"]
+TIPOS = ["cultural", "naturaleza", "gastronomia", "aventura", "compras", "relajacion"]
+
+
+def proyectar(documento, proyeccion):
+    """Proyección de campos de primer nivel como la aplica MongoDB"""
+    if proyeccion is None:
+        return dict(documento)
+    if any(valor == 0 for clave, valor in proyeccion.items() if clave != "_id"):
+        return {clave: valor for clave, valor in documento.items() if proyeccion.get(clave, 1)}
+    incluir = set(proyeccion) | ({"_id"} if proyeccion.get("_id", 1) else set())
+    return {clave: valor for clave, valor in documento.items() if clave in incluir}
+
+def generar_usuario(aleatorio):
+    return {
+        "_id": ObjectId(), "nombre": "Viajero", "email": f"u{aleatorio.randint(1, 10 ** 6)}@ejemplo.com",
+        "password": "scrypt:32768:8:1$" + "".join(aleatorio.choices("abcdef0123456789", k=144)),
+        "tipo_usuario": "viajero", "pais_interes": "Japón", "presupuesto": 2500.0,
+        "fecha_registro": datetime.datetime(2024, 1, 1),
+        "estadisticas": {"itinerarios_count": 20, "viajes_activos": 2, "presupuesto_total": 60000.0},
+        "fecha_actualizacion": datetime.datetime(2024, 6, 1),
+    }
+
+def generar_itinerario(aleatorio, usuario_id, actividades):
+    ahora = datetime.datetime.utcnow()
+    return {
+        "_id": ObjectId(), "usuario_id": usuario_id, "nombre_viaje": f"Viaje {aleatorio.randint(1, 10000)}",
+        "descripcion": "Ruta por Asia " * 6, "paises": aleatorio.sample(PAISES, 3),
+        "ciudades": ["Tokio", "Kioto", "Bangkok"], "ruta_km": 4567.8,
+        "fecha_inicio": "2025-03-01", "fecha_fin": "2025-03-15", "duracion_dias": 14,
+        "presupuesto_total": 3000.0, "presupuesto_restante": 1200.0,
+        "estado": "planificando", "prioridad": "media", "favorito": False, "generado_ia": True,
+        "actividades": [{
+            "_id": ObjectId(), "actividad": f"Actividad {i}", "pais": aleatorio.choice(PAISES),
+            "ciudad": "Tokio", "tipo": aleatorio.choice(TIPOS), "costo": 45.0, "fecha": "2025-03-02",
+            "descripcion": "Visita guiada " * aleatorio.randint(0, 4), "completada": False,
+            "fecha_creacion": ahora,
+        } for i in range(actividades)],
+        "actividades_total": actividades, "actividades_completadas": 0,
+        "fecha_creacion": ahora, "fecha_actualizacion": ahora,
+    }
+
+def generar_destino(aleatorio):
+    return {
+        "_id": ObjectId(), "nombre": "Templo Dorado", "pais": aleatorio.choice(PAISES), "ciudad": "Kioto",
+        "mejor_epoca": "Primavera", "presupuesto": 1500.0, "actividades": "Templos, jardines, té " * 3,
+        "descripcion": "Un lugar histórico con jardines zen y ceremonias del té. " * 8,
+        "imagen": "https://ejemplo.com/imagenes/templo-dorado.jpg", "calificacion": 5,
+    }
+
+def medir_ruta(documentos, antes, despues, modelo, repeticiones):
+    """Bytes BSON, µs de decodificación y bytes de memoria antes y después, y µs de pasar a modelos"""
+    datos_antes = [bson.encode(proyectar(d, antes)) for d in documentos]
+    datos_despues = [bson.encode(proyectar(d, despues)) for d in documentos]
+
+    def cronometrar(funcion):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            funcion()
+        return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+    def memoria(funcion):
+        tracemalloc.start()
+        resultado = funcion()
+        actual, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del resultado
+        return actual
+
+    decodificados = [bson.decode(b) for b in datos_despues]
+    return {
+        "bytes": (sum(map(len, datos_antes)), sum(map(len, datos_despues))),
+        "decodificar_us": (cronometrar(lambda: [bson.decode(b) for b in datos_antes]),
+                           cronometrar(lambda: [bson.decode(b) for b in datos_despues])),
+        "modelos_us": cronometrar(lambda: [modelo.desde_documento(d) for d in decodificados]),
+        "memoria": (memoria(lambda: [bson.decode(b) for b in datos_antes]),
+                    memoria(lambda: [modelo.desde_documento(bson.decode(b)) for b in datos_despues])),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--itinerarios", type=int, default=20, help="itinerarios por página")
+    parser.add_argument("--actividades", type=int, default=40, help="actividades por itinerario")
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(5)
+    usuario = generar_usuario(aleatorio)
+    itinerarios = [generar_itinerario(aleatorio, usuario["_id"], args.actividades) for _ in range(args.itinerarios)]
+    destinos = [generar_destino(aleatorio) for _ in range(12)]
+
+    # (ruta, documentos que lee, proyección anterior, vista, modelo)
+    rutas = [
+        ("/login", [usuario], None, "login", Usuario),
+        ("/profile", [usuario], None, "perfil", Usuario),
+        ("/planificador", itinerarios, {"actividades": 0}, "planificador", Itinerario),
+        ("/mis-itinerarios", itinerarios, {"actividades": 0}, "mis_itinerarios", Itinerario),
+        ("/itinerario/<id>", itinerarios[:1], None, "detalle", Itinerario),
+        ("/view/<id>", destinos[:1], None, "detalle", Destino),
+        ("/ (tarjetas)", destinos, None, "tarjeta", Destino),
+    ]
+
+    print(f"{'ruta':18s} {'bytes':>15s} {'ahorro':>7s} {'decodificar µs':>16s} {'a modelo µs':>12s} "
+          f"{'memoria (bytes)':>17s}")
+    total_antes = total_despues = 0
+    for ruta, documentos, antes, vista, modelo in rutas:
+        r = medir_ruta(documentos, antes, modelo.proyeccion(vista), modelo, args.repeticiones)
+        (bytes_antes, bytes_despues), (us_antes, us_despues) = r["bytes"], r["decodificar_us"]
+        total_antes += bytes_antes
+        total_despues += bytes_despues
+        print(f"{ruta:18s} {bytes_antes:7d} → {bytes_despues:5d} {1 - bytes_despues / bytes_antes:7.0%} "
+              f"{us_antes:7.1f} → {us_despues:6.1f} {r['modelos_us']:12.1f} "
+              f"{r['memoria'][0]:8d} → {r['memoria'][1]:6d}")
+    print(f"{'total':18s} {total_antes:7d} → {total_despues:5d} {1 - total_despues / total_antes:7.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark del motor de planificación de itinerarios por duración del viaje.
+
+Mide la latencia de PlanificadorViajes.planificar (mochila por grupos) para
+varias duraciones y compara el interés del plan con el de la selección voraz
+sola. Termina con error si el p99 de un viaje de 30 días pasa de 50 ms.
+
+Uso (desde la raíz del repositorio):
+
+    python benchmarks/bench_planificacion.py [--planes 200] [--destinos 2000]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_busqueda import generar_destinos, percentiles
+from catalogo import TOURS_PREDEFINIDOS
+from planificacion import AFINIDAD, PERSONAS_POR_PERFIL, PlanificadorViajes
+
+DURACIONES = [3, 7, 10, 14, 21, 30, 45, 60, 90]
+OBJETIVO_30_DIAS_MS = 50
+
+
+def generar_peticiones(cantidad, semilla=7):
+    """Combinaciones aleatorias de presupuesto, tipo de viaje y perfil"""
+    aleatorio = random.Random(semilla)
+    return [(aleatorio.randint(500, 10000), aleatorio.choice(list(AFINIDAD)),
+             aleatorio.choice(list(PERSONAS_POR_PERFIL))) for _ in range(cantidad)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--planes", type=int, default=200, help="planes por duración")
+    parser.add_argument("--destinos", type=int, default=2000)
+    args = parser.parse_args()
+
+    planificador = PlanificadorViajes(TOURS_PREDEFINIDOS)
+    destinos = generar_destinos(args.destinos)
+    peticiones = generar_peticiones(args.planes)
+    # Calentamiento: importaciones perezosas de NumPy y cachés de CPU
+    planificador.planificar(2000, 10, "cultural", "pareja", destinos)
+
+    p99_30 = None
+    print(f"{'días':>5s} {'p50 ms':>9s} {'p99 ms':>9s} {'máx ms':>9s} {'act.':>6s} {'interés dp/voraz':>17s} {'voraz':>6s}")
+    for duracion in DURACIONES:
+        tiempos, actividades, interes, interes_voraz, respaldo = [], 0, 0.0, 0.0, 0
+        for presupuesto, tipo_viaje, viajeros in peticiones:
+            paises = planificador.elegir_paises(presupuesto, duracion, tipo_viaje, viajeros)
+            nombres = {TOURS_PREDEFINIDOS[clave]["pais"] for clave in paises}
+            # Como en la aplicación, solo los destinos de los países elegidos
+            seleccion = [d for d in destinos if d["pais"] in nombres][:200]
+            plan = planificador.planificar(presupuesto, duracion, tipo_viaje, viajeros, seleccion, paises)
+            voraz = planificador.planificar(presupuesto, duracion, tipo_viaje, viajeros, seleccion, paises,
+                                            limite_ms=0)
+            tiempos.append(plan["tiempo_ms"] / 1000)
+            actividades += len(plan["actividades"])
+            interes += plan["interes"]
+            interes_voraz += voraz["interes"]
+            respaldo += plan["metodo"] == "voraz"
+        p50, p99 = percentiles(tiempos)
+        if duracion == 30:
+            p99_30 = p99
+        print(f"{duracion:5d} {p50:9.2f} {p99:9.2f} {max(tiempos) * 1000:9.2f} "
+              f"{actividades / len(peticiones):6.1f} {interes / max(interes_voraz, 1e-9):17.3f} {respaldo:6d}")
+
+    if p99_30 is not None and p99_30 > OBJETIVO_30_DIAS_MS:
+        print(f"❌ p99 de 30 días ({p99_30:.1f} ms) por encima del objetivo de {OBJETIVO_30_DIAS_MS} ms")
+        sys.exit(1)
+    print(f"✅ p99 de 30 días: {p99_30:.1f} ms (objetivo {OBJETIVO_30_DIAS_MS} ms)")
+
+
+if __name__ == "__main__":
+    main()
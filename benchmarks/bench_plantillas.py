@@ -0,0 +1,150 @@
+"""Benchmark del render de las plantillas con y sin caché de fragmentos.
+
+Renderiza planificador.html para un usuario con --itinerarios itinerarios
+y ver_itinerario.html para un itinerario con --actividades actividades,
+sin caché de fragmentos y con ella (fría y caliente), y mide lo que cuesta
+compilar las plantillas grandes en un worker nuevo con y sin la caché de
+bytecode en disco.
+
+Uso (desde la raíz del repositorio):
+
+    python benchmarks/bench_plantillas.py [--itinerarios 200] [--actividades 200] [--repeticiones 50]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson.objectid import ObjectId
+from flask import render_template
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+import app as aplicacion
+from bench_busqueda import percentiles
+from fragmentos import FragmentosExtension
+from modelos import Itinerario
+
+PAISES = ["Japón", "Tailandia", "Vietnam", "China", "Corea del Sur", "Indonesia", "Singapur"]
+TIPOS = ["cultural", "naturaleza", "gastronomia", "aventura", "compras", "relajacion"]
+PLANTILLAS_GRANDES = ["planificador.html", "ver_itinerario.html", "editar_itinerario.html"]
+
+
+def generar_actividad(aleatorio, fecha):
+    """Actividad con la forma de las guardadas en `itinerarios.actividades`"""
+    return {
+        "_id": ObjectId(),
+        "actividad": f"Actividad {aleatorio.randint(1, 10000)}",
+        "pais": aleatorio.choice(PAISES),
+        "ciudad": "Ciudad",
+        "tipo": aleatorio.choice(TIPOS),
+        "costo": float(aleatorio.randint(10, 300)),
+        "fecha": fecha.strftime("%Y-%m-%d"),
+        "descripcion": "Descripción de la actividad " * aleatorio.randint(0, 3),
+        "completada": aleatorio.random() < 0.3,
+    }
+
+def generar_itinerario(aleatorio, actividades=0):
+    """Itinerario como lo recibe la plantilla (modelo con los porcentajes ya calculados)"""
+    ahora = datetime.datetime.utcnow()
+    itinerario = {
+        "_id": ObjectId(),
+        "nombre_viaje": f"Viaje {aleatorio.randint(1, 10000)}",
+        "paises": aleatorio.sample(PAISES, aleatorio.randint(1, 3)),
+        "fecha_inicio": "2025-03-01",
+        "fecha_fin": "2025-03-15",
+        "presupuesto_total": 3000.0,
+        "presupuesto_restante": float(aleatorio.randint(0, 3000)),
+        "estado": aleatorio.choice(["planificando", "confirmado"]),
+        "prioridad": aleatorio.choice(["alta", "media", "baja"]),
+        "favorito": aleatorio.random() < 0.2,
+        "actividades": [generar_actividad(aleatorio, ahora) for _ in range(actividades)],
+        "actividades_total": actividades,
+        "actividades_completadas": 0,
+        "descripcion": "Itinerario de prueba",
+        "duracion_dias": 14,
+        "ruta_km": 1234.5,
+        "fecha_actualizacion": ahora,
+    }
+    return Itinerario.desde_documento(
+        itinerario,
+        porcentaje_completado=aplicacion.calcular_porcentaje_completado(itinerario),
+        porcentaje_presupuesto=aplicacion.calcular_porcentaje_presupuesto(itinerario)
+    )
+
+def medir(renderizar, repeticiones):
+    """Tiempos de render, en segundos"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        renderizar()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+def medir_compilacion(directorio):
+    """Segundos para cargar las plantillas grandes en un entorno nuevo (un worker recién arrancado)"""
+    entorno = Environment(loader=FileSystemLoader(os.path.join(aplicacion.app.root_path, "templates")),
+                          extensions=[FragmentosExtension],
+                          bytecode_cache=FileSystemBytecodeCache(directorio) if directorio else None)
+    inicio = time.perf_counter()
+    for nombre in PLANTILLAS_GRANDES:
+        entorno.get_template(nombre)
+    return time.perf_counter() - inicio
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--itinerarios", type=int, default=200)
+    parser.add_argument("--actividades", type=int, default=200, help="actividades del itinerario de ver_itinerario")
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(3)
+    itinerarios = [generar_itinerario(aleatorio) for _ in range(args.itinerarios)]
+    detalle = generar_itinerario(aleatorio, args.actividades)
+    entorno = aplicacion.app.jinja_env
+    cache = aplicacion.cache_fragmentos
+
+    casos = {
+        f"planificador ({args.itinerarios} itinerarios)": lambda: render_template(
+            "planificador.html", itinerarios=itinerarios, siguiente_cursor=None,
+            resumen=aplicacion.resumen_vacio(), tours=aplicacion.TOURS_PREDEFINIDOS),
+        f"ver_itinerario ({args.actividades} actividades)": lambda: render_template(
+            "ver_itinerario.html", itinerario=detalle),
+    }
+
+    print(f"{'plantilla':36s} {'modo':14s} {'p50 ms':>9s} {'p99 ms':>9s}")
+    with aplicacion.app.test_request_context("/planificador"):
+        for nombre, renderizar in casos.items():
+            renderizar()  # Compilación de la plantilla fuera de la medida
+            entorno.cache_fragmentos = None
+            sin_cache = renderizar()
+            p50_sin, p99_sin = percentiles(medir(renderizar, args.repeticiones))
+
+            entorno.cache_fragmentos = cache
+            cache.limpiar()
+            p50_fria, _ = percentiles(medir(renderizar, 1))
+            con_cache = renderizar()
+            p50_con, p99_con = percentiles(medir(renderizar, args.repeticiones))
+            if con_cache != sin_cache:
+                print(f"❌ {nombre}: el HTML con caché de fragmentos no coincide con el renderizado")
+                sys.exit(1)
+
+            print(f"{nombre:36s} {'sin caché':14s} {p50_sin:9.2f} {p99_sin:9.2f}")
+            print(f"{'':36s} {'caché fría':14s} {p50_fria:9.2f} {'':>9s}")
+            print(f"{'':36s} {'caché caliente':14s} {p50_con:9.2f} {p99_con:9.2f}  (x{p50_sin / p50_con:.1f})")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sin_bytecode = medir_compilacion(None)
+        medir_compilacion(directorio)  # El primer worker escribe el bytecode
+        con_bytecode = medir_compilacion(directorio)
+    print(f"\nCarga de {', '.join(PLANTILLAS_GRANDES)} en un worker nuevo:")
+    print(f"  compilando:         {sin_bytecode * 1000:8.2f} ms")
+    print(f"  bytecode en disco:  {con_bytecode * 1000:8.2f} ms  (x{sin_bytecode / con_bytecode:.1f})")
+
+
+if __name__ == "__main__":
+    main()
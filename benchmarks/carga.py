@@ -0,0 +1,402 @@
+"""Prueba de carga reproducible de las rutas de TravelAsia.
+
+Siembra una base de datos con usuarios, itinerarios (con actividades) y
+destinos, y lanza peticiones concurrentes contra las rutas reales de Flask
+(el cliente de pruebas de Flask, sin red). Por ruta mide p50/p95/p99,
+throughput, códigos de estado y el pico de memoria residente, y lo guarda
+en JSON para comparar ejecuciones entre commits.
+
+Uso (desde la raíz del repositorio):
+
+    # MongoDB real (recomendado): una base de datos desechable, la de la URI
+    # (travelasia_bench si la URI no indica ninguna)
+    python benchmarks/carga.py --mongo-uri mongodb://localhost:27017/travelasia_bench
+
+    # Lanzar un mongod local sobre un directorio temporal
+    python benchmarks/carga.py --mongod /usr/bin/mongod
+
+    # Sin MongoDB: mongomock en proceso (no implementa $reduce ni los
+    # updates con pipeline, así que algunas rutas responden con error)
+    python benchmarks/carga.py
+
+Sembrar borra usuarios, itinerarios y destinos, así que la prueba se niega a
+usar una base de datos que ya tiene documentos salvo con --borrar.
+
+Opciones de tamaño: --usuarios, --itinerarios (por usuario), --actividades
+(por itinerario), --destinos, --peticiones (por ruta) y --concurrencia.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+from werkzeug.security import generate_password_hash
+
+CONTRASENA = "benchmark123"
+# Nunca la de la aplicación (travelasia_db): sembrar borra sus colecciones
+NOMBRE_DB = "travelasia_bench"
+PAISES = ["Japón", "Tailandia", "Vietnam", "China", "Corea del Sur", "Indonesia", "Singapur"]
+TIPOS_ACTIVIDAD = ["cultural", "aventura", "gastronomia", "relax", "shopping"]
+
+
+# ========== BASE DE DATOS ==========
+
+def puerto_libre():
+    """Puerto TCP libre en localhost"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def lanzar_mongod(binario):
+    """Arranca un mongod desechable; devuelve (proceso, uri, directorio)"""
+    directorio = tempfile.mkdtemp(prefix="travelasia_bench_")
+    puerto = puerto_libre()
+    proceso = subprocess.Popen(
+        [binario, "--dbpath", directorio, "--port", str(puerto), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    uri = f"mongodb://127.0.0.1:{puerto}/{NOMBRE_DB}"
+    cliente = MongoClient(uri, serverSelectionTimeoutMS=20000)
+    cliente.admin.command("ping")
+    cliente.close()
+    return proceso, uri, directorio
+
+def nombre_db(uri):
+    """Base de datos indicada en la URI, o NOMBRE_DB si no indica ninguna"""
+    cliente = MongoClient(uri, connect=False)
+    try:
+        return cliente.get_default_database(NOMBRE_DB).name
+    finally:
+        cliente.close()
+
+def comprobar_vacia(db, borrar):
+    """Sale con error si la base de datos tiene documentos y no se pidió --borrar"""
+    if borrar:
+        return
+    ocupadas = [nombre for nombre in db.list_collection_names() if db[nombre].estimated_document_count()]
+    if ocupadas:
+        sys.exit(f"❌ La base de datos {db.name} no está vacía ({', '.join(sorted(ocupadas))}): "
+                 f"usa una desechable o añade --borrar")
+
+def sembrar(db, usuarios, itinerarios, actividades, destinos, semilla):
+    """Inserta los datos de la prueba con la misma forma que los que crea la aplicación"""
+    aleatorio = random.Random(semilla)
+    for coleccion in ("usuarios", "itinerarios", "destinos"):
+        db[coleccion].delete_many({})
+
+    # El hash es caro a propósito: se calcula una vez y lo comparten todos los usuarios
+    hash_contrasena = generate_password_hash(CONTRASENA)
+    ahora = datetime.datetime.utcnow()
+    documentos_usuarios = [{
+        "_id": ObjectId(),
+        "nombre": f"Usuario {i}",
+        "email": f"usuario{i}@bench.travelasia",
+        "password": hash_contrasena,
+        "tipo_usuario": "viajero",
+        "pais_interes": aleatorio.choice(PAISES),
+        "presupuesto": 2000.0,
+        "fecha_registro": ahora
+    } for i in range(usuarios)]
+    db.usuarios.insert_many(documentos_usuarios)
+
+    muestras = []
+    lote = []
+    for usuario in documentos_usuarios:
+        for j in range(itinerarios):
+            lista = []
+            for k in range(actividades):
+                lista.append({
+                    "_id": ObjectId(),
+                    "pais": aleatorio.choice(PAISES),
+                    "ciudad": f"Ciudad {k}",
+                    "actividad": f"Actividad {k}",
+                    "tipo": aleatorio.choice(TIPOS_ACTIVIDAD),
+                    "costo": float(aleatorio.randint(10, 200)),
+                    "fecha": "",
+                    "completada": aleatorio.random() < 0.3,
+                    "fecha_creacion": ahora
+                })
+            presupuesto = float(aleatorio.randint(1000, 6000))
+            duracion = aleatorio.randint(3, 21)
+            itinerario = {
+                "_id": ObjectId(),
+                "usuario_id": usuario["_id"],
+                "nombre_viaje": f"Viaje {j}",
+                "descripcion": "Itinerario de la prueba de carga",
+                "paises": aleatorio.sample(PAISES, 2),
+                "ciudades": [],
+                "fecha_inicio": "2026-03-01",
+                "fecha_fin": (datetime.date(2026, 3, 1) + datetime.timedelta(days=duracion)).isoformat(),
+                "duracion_dias": duracion,
+                "presupuesto_total": presupuesto,
+                "presupuesto_restante": presupuesto - sum(a["costo"] for a in lista),
+                "estado": aleatorio.choice(["planificando", "activo", "completado"]),
+                "actividades": lista,
+                "actividades_total": len(lista),
+                "actividades_completadas": sum(a["completada"] for a in lista),
+                "favorito": aleatorio.random() < 0.2,
+                "prioridad": "media",
+                "fecha_creacion": ahora - datetime.timedelta(minutes=aleatorio.randint(0, 100000)),
+                "fecha_actualizacion": ahora
+            }
+            lote.append(itinerario)
+            if lista:
+                muestras.append((usuario["email"], str(itinerario["_id"]), [str(a["_id"]) for a in lista]))
+            if len(lote) >= 1000:
+                db.itinerarios.insert_many(lote)
+                lote = []
+    if lote:
+        db.itinerarios.insert_many(lote)
+
+    db.destinos.insert_many([{
+        "nombre": f"Destino {i}",
+        "pais": aleatorio.choice(PAISES),
+        "ciudad": f"Ciudad {i}",
+        "mejor_epoca": "Todo el año",
+        "presupuesto": float(aleatorio.randint(300, 5000)),
+        "actividades": "",
+        "descripcion": "Destino de la prueba de carga",
+        "imagen": "",
+        "calificacion": aleatorio.randint(1, 5)
+    } for i in range(destinos)] or [{"nombre": "Destino", "pais": PAISES[0], "descripcion": ""}])
+    return [u["email"] for u in documentos_usuarios], muestras
+
+
+# ========== MEDICIÓN ==========
+
+def rss_actual():
+    """Memoria residente del proceso en bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Sin /proc: el máximo histórico (KB en Linux, bytes en macOS)
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maximo if sys.platform == "darwin" else maximo * 1024
+
+class MuestreoRss:
+    """Muestrea el RSS en segundo plano y guarda el pico de cada fase"""
+
+    def __init__(self, intervalo=0.01):
+        self.intervalo = intervalo
+        self.pico = 0
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def __enter__(self):
+        self.pico = rss_actual()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *args):
+        self._parar.set()
+        self._hilo.join()
+        self.pico = max(self.pico, rss_actual())
+
+    def _muestrear(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, rss_actual())
+
+def percentil(ordenados, p):
+    """Percentil por el método del rango más cercano"""
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))]
+
+
+# ========== ESCENARIOS ==========
+
+def iniciar_sesion(app, email):
+    """Cliente de pruebas con la sesión del usuario iniciada"""
+    cliente = app.test_client()
+    respuesta = cliente.post("/login", data={"email": email, "password": CONTRASENA})
+    if respuesta.status_code != 302:
+        raise RuntimeError(f"No se pudo iniciar sesión como {email}: {respuesta.status_code}")
+    return cliente
+
+def escenarios(emails, muestras):
+    """Rutas a medir: nombre → función(cliente, aleatorio) que hace una petición"""
+    # Cada cliente pertenece a un usuario: sus peticiones usan los itinerarios de ese usuario
+    por_email = {}
+    for email, itinerario_id, actividades in muestras:
+        por_email.setdefault(email, []).append((itinerario_id, actividades))
+
+    def itinerario_de(cliente, aleatorio):
+        return aleatorio.choice(por_email[cliente.email_bench])
+
+    def toggle(cliente, aleatorio):
+        itinerario_id, actividades = itinerario_de(cliente, aleatorio)
+        return cliente.post(f"/toggle-actividad/{itinerario_id}/{aleatorio.choice(actividades)}")
+
+    return {
+        "GET /": lambda c, a: c.get("/"),
+        "GET /planificador": lambda c, a: c.get("/planificador"),
+        "GET /mis-itinerarios": lambda c, a: c.get("/mis-itinerarios"),
+        "GET /itinerario/<id>": lambda c, a: c.get(f"/itinerario/{itinerario_de(c, a)[0]}"),
+        "POST /toggle-actividad": toggle,
+        "POST /procesar_cotizacion": lambda c, a: c.post("/procesar_cotizacion", data={
+            "pais": a.choice(["japon", "tailandia", "vietnam", "corea", "singapur"]),
+            "categoria": a.choice(["economico", "estandar", "premium", "lujo"]),
+            "personas": a.randint(1, 6),
+            "noches": a.randint(3, 21)
+        }),
+        "GET /api/itinerarios": lambda c, a: c.get("/api/itinerarios"),
+        "POST /login": lambda c, a: c.post("/login", data={"email": c.email_bench, "password": CONTRASENA}),
+    }
+
+def medir_ruta(app, emails, funcion, peticiones, concurrencia, semilla):
+    """Lanza `peticiones` peticiones repartidas entre `concurrencia` hilos"""
+    clientes = []
+    for i in range(concurrencia):
+        cliente = iniciar_sesion(app, emails[i % len(emails)])
+        cliente.email_bench = emails[i % len(emails)]
+        clientes.append(cliente)
+
+    def trabajador(indice):
+        aleatorio = random.Random(semilla + indice)
+        cliente = clientes[indice]
+        latencias, estados = [], {}
+        for _ in range(indice, peticiones, concurrencia):
+            inicio = time.perf_counter()
+            respuesta = funcion(cliente, aleatorio)
+            respuesta.get_data()
+            latencias.append(time.perf_counter() - inicio)
+            estados[respuesta.status_code] = estados.get(respuesta.status_code, 0) + 1
+        return latencias, estados
+
+    with MuestreoRss() as rss:
+        inicio = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(concurrencia) as ejecutor:
+            resultados = list(ejecutor.map(trabajador, range(concurrencia)))
+        duracion = time.perf_counter() - inicio
+
+    latencias = sorted(l for parcial, _ in resultados for l in parcial)
+    estados = {}
+    for _, parcial in resultados:
+        for codigo, veces in parcial.items():
+            estados[str(codigo)] = estados.get(str(codigo), 0) + veces
+    return {
+        "peticiones": len(latencias),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 3),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 3),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 3),
+        "media_ms": round(sum(latencias) / len(latencias) * 1000, 3),
+        "throughput_rps": round(len(latencias) / duracion, 2),
+        "rss_pico_mb": round(rss.pico / 2 ** 20, 1),
+        "estados": estados,
+    }
+
+def commit_actual():
+    """Hash del commit del repositorio, si está disponible"""
+    try:
+        return subprocess.check_output(["git", "-C", RAIZ, "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-uri", help="MongoDB desechable (se borran sus colecciones)")
+    parser.add_argument("--mongod", help="Binario de mongod para lanzar una instancia temporal")
+    parser.add_argument("--borrar", action="store_true",
+                        help="Permite sembrar sobre una base de datos que ya tiene documentos")
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--itinerarios", type=int, default=25, help="Itinerarios por usuario")
+    parser.add_argument("--actividades", type=int, default=15, help="Actividades por itinerario")
+    parser.add_argument("--destinos", type=int, default=200)
+    parser.add_argument("--peticiones", type=int, default=400, help="Peticiones por ruta")
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--rutas", nargs="*", help="Solo estas rutas (p. ej. 'GET /planificador')")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", default="resultados_carga.json")
+    args = parser.parse_args()
+
+    proceso_mongod = directorio_mongod = None
+    uri = args.mongo_uri
+    if args.mongod:
+        proceso_mongod, uri, directorio_mongod = lanzar_mongod(args.mongod)
+
+    # La aplicación se importa después de configurar el entorno
+    os.environ["MONGO_URI"] = uri or f"mongodb://127.0.0.1:1/{NOMBRE_DB}"
+    os.environ["MONGO_DB"] = nombre_db(uri) if uri else NOMBRE_DB
+    os.environ["MIGRAR_AL_ARRANCAR"] = "0"
+    os.environ.setdefault("METRICAS_DIR", tempfile.mkdtemp(prefix="travelasia_metricas_"))
+    import app as aplicacion
+    from migraciones import aplicar_migraciones
+
+    try:
+        if uri:
+            backend = "mongod"
+            db = aplicacion.conexion.cliente()[os.environ["MONGO_DB"]]
+        else:
+            import mongomock
+            backend = "mongomock"
+            print("⚠️ Sin --mongo-uri ni --mongod: se usa mongomock en proceso (resultados orientativos)")
+            cliente = mongomock.MongoClient()
+            aplicacion.conexion.usar_cliente(cliente)
+            db = cliente[NOMBRE_DB]
+        comprobar_vacia(db, args.borrar)
+
+        inicio = time.perf_counter()
+        emails, muestras = sembrar(db, args.usuarios, args.itinerarios, args.actividades,
+                                   args.destinos, args.semilla)
+        if backend == "mongod":
+            aplicar_migraciones(db)
+        print(f"✅ Datos sembrados en {time.perf_counter() - inicio:.1f} s ({backend})")
+
+        rutas = {}
+        for nombre, funcion in escenarios(emails, muestras).items():
+            if args.rutas and nombre not in args.rutas:
+                continue
+            rutas[nombre] = medir_ruta(aplicacion.app, emails, funcion, args.peticiones,
+                                       args.concurrencia, args.semilla)
+            r = rutas[nombre]
+            print(f"{nombre:28s} p50 {r['p50_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  "
+                  f"p99 {r['p99_ms']:8.2f} ms  {r['throughput_rps']:8.1f} req/s  "
+                  f"RSS {r['rss_pico_mb']:7.1f} MB  {r['estados']}")
+
+        resultado = {
+            "commit": commit_actual(),
+            "fecha": datetime.datetime.utcnow().isoformat() + "Z",
+            "backend": backend,
+            "python": sys.version.split()[0],
+            "configuracion": {
+                "usuarios": args.usuarios,
+                "itinerarios_por_usuario": args.itinerarios,
+                "actividades_por_itinerario": args.actividades,
+                "destinos": args.destinos,
+                "peticiones_por_ruta": args.peticiones,
+                "concurrencia": args.concurrencia,
+                "semilla": args.semilla,
+            },
+            "rutas": rutas,
+        }
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"✅ Resultados en {args.salida}")
+    finally:
+        if proceso_mongod is not None:
+            proceso_mongod.terminate()
+            proceso_mongod.wait()
+            shutil.rmtree(directorio_mongod, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
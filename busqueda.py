@@ -0,0 +1,226 @@
+"""Búsqueda de destinos en el servidor con un índice invertido en memoria.
+
+Indexa los tours de TOURS_PREDEFINIDOS y los destinos creados por los
+usuarios. Los textos se normalizan sin acentos (Japón → japon) y la búsqueda
+admite prefijos (kio → kioto), de modo que cada consulta solo toca las
+listas de documentos de los términos que coinciden.
+"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+# Peso de cada campo en la puntuación
+PESOS_CAMPOS = {"nombre": 3.0, "pais": 2.0, "ciudad": 2.0, "descripcion": 1.0}
+# Un término que solo coincide por prefijo puntúa menos que uno exacto
+FACTOR_PREFIJO = 0.5
+
+# Rangos de presupuesto que usa el filtro de /explora
+RANGOS_PRESUPUESTO = {
+    "economico": lambda precio: precio < 800,
+    "medio": lambda precio: 800 <= precio <= 1500,
+    "premium": lambda precio: 1500 < precio <= 3000,
+    "lujo": lambda precio: precio > 3000,
+}
+
+_TOKEN = re.compile(r"\w+")
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos: 'Japón' → 'japon'"""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    return "".join(c for c in texto if not unicodedata.combining(c)).lower()
+
+def tokenizar(texto):
+    """Lista de términos normalizados de un texto"""
+    return _TOKEN.findall(normalizar(texto))
+
+def filtro_presupuesto(presupuesto):
+    """Convierte el parámetro presupuesto (rango con nombre o importe máximo) en un predicado"""
+    if not presupuesto:
+        return None
+    if presupuesto in RANGOS_PRESUPUESTO:
+        return RANGOS_PRESUPUESTO[presupuesto]
+    try:
+        maximo = float(presupuesto)
+    except ValueError:
+        raise ValueError(f"Presupuesto inválido: {presupuesto}")
+    return lambda precio: precio <= maximo
+
+
+class IndiceBusqueda:
+    """Índice invertido término → {documento: peso}, con términos ordenados para prefijos"""
+
+    def __init__(self):
+        self._postings = defaultdict(dict)
+        self._terminos = []
+        self._tokens_doc = {}
+        self._resultados = {}
+        self._atributos = {}
+        self._orden = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._resultados)
+
+    def agregar(self, doc_id, campos, resultado, pais="", precio=0, experiencia=""):
+        """Indexa (o reindexa) un documento.
+
+        `campos` son los textos a indexar por nombre de campo; `resultado` es
+        lo que devuelve la API para este documento.
+        """
+        pesos = defaultdict(float)
+        for campo, texto in campos.items():
+            for token in tokenizar(texto):
+                pesos[token] += PESOS_CAMPOS.get(campo, 1.0)
+
+        with self._lock:
+            self._eliminar(doc_id)
+            for token, peso in pesos.items():
+                if token not in self._postings:
+                    insort(self._terminos, token)
+                self._postings[token][doc_id] = peso
+            self._tokens_doc[doc_id] = set(pesos)
+            self._resultados[doc_id] = resultado
+            self._atributos[doc_id] = (normalizar(pais), float(precio or 0), experiencia or "")
+            self._orden.setdefault(doc_id, len(self._orden))
+
+    def eliminar(self, doc_id):
+        """Quita un documento del índice"""
+        with self._lock:
+            self._eliminar(doc_id)
+            self._resultados.pop(doc_id, None)
+            self._atributos.pop(doc_id, None)
+            self._orden.pop(doc_id, None)
+
+    def _eliminar(self, doc_id):
+        for token in self._tokens_doc.pop(doc_id, ()):
+            postings = self._postings[token]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                del self._terminos[bisect_left(self._terminos, token)]
+
+    def _terminos_con_prefijo(self, prefijo):
+        inicio = bisect_left(self._terminos, prefijo)
+        fin = bisect_left(self._terminos, prefijo + "\uffff", inicio)
+        return self._terminos[inicio:fin]
+
+    def buscar(self, consulta="", pais=None, presupuesto=None, experiencia=None, limite=20):
+        """Documentos que contienen todos los términos de la consulta, de mayor a menor puntuación.
+
+        Cada término de la consulta coincide con los términos del índice que
+        empiezan por él. Devuelve (total, resultados[:limite]).
+        """
+        tokens = tokenizar(consulta)
+        pais = normalizar(pais) if pais else None
+        cumple_presupuesto = filtro_presupuesto(presupuesto)
+
+        with self._lock:
+            total_docs = max(len(self._resultados), 1)
+            puntuaciones = None
+            for token in tokens:
+                parcial = defaultdict(float)
+                for termino in self._terminos_con_prefijo(token):
+                    postings = self._postings[termino]
+                    idf = math.log(1 + total_docs / len(postings))
+                    factor = idf if termino == token else idf * FACTOR_PREFIJO
+                    for doc_id, peso in postings.items():
+                        valor = peso * factor
+                        if valor > parcial[doc_id]:
+                            parcial[doc_id] = valor
+                if puntuaciones is None:
+                    puntuaciones = parcial
+                else:
+                    # Semántica AND: solo sobreviven los documentos que coinciden con todos los términos
+                    puntuaciones = {d: p + parcial[d] for d, p in puntuaciones.items() if d in parcial}
+                if not puntuaciones:
+                    return 0, []
+
+            if puntuaciones is None:
+                # Sin texto: todos los documentos en orden de inserción
+                puntuaciones = {doc_id: 0.0 for doc_id in self._resultados}
+
+            candidatos = []
+            for doc_id, puntuacion in puntuaciones.items():
+                pais_doc, precio, experiencia_doc = self._atributos[doc_id]
+                if pais and pais_doc != pais:
+                    continue
+                if cumple_presupuesto and not cumple_presupuesto(precio):
+                    continue
+                if experiencia and experiencia_doc != experiencia:
+                    continue
+                candidatos.append((-puntuacion, self._orden[doc_id], doc_id, puntuacion))
+
+            # Solo se ordenan los `limite` mejores, no todos los candidatos
+            mejores = heapq.nsmallest(limite, candidatos)
+            resultados = [dict(self._resultados[doc_id], puntuacion=round(puntuacion, 3))
+                          for _, _, doc_id, puntuacion in mejores]
+            return len(candidatos), resultados
+
+
+def agregar_tour(indice, clave, tour):
+    """Indexa un tour predefinido"""
+    indice.agregar(
+        f"tour:{clave}",
+        {
+            "nombre": tour.get("nombre"),
+            "pais": tour.get("pais"),
+            "ciudad": tour.get("ciudad"),
+            "descripcion": tour.get("descripcion")
+        },
+        {
+            "id": clave,
+            "tipo": "tour",
+            "nombre": tour.get("nombre"),
+            "pais": tour.get("pais"),
+            "imagen": tour.get("imagen"),
+            "precio": tour.get("precio_base"),
+            "descripcion": f"{tour.get('ciudad')} - {tour.get('duracion')}",
+            "url": f"/cotizar/{clave}"
+        },
+        pais=tour.get("pais"),
+        precio=tour.get("precio_base"),
+        experiencia=tour.get("experiencia")
+    )
+
+def agregar_destino(indice, destino):
+    """Indexa un destino de la colección `destinos`"""
+    doc_id = str(destino["_id"])
+    indice.agregar(
+        f"destino:{doc_id}",
+        {
+            "nombre": destino.get("nombre"),
+            "pais": destino.get("pais"),
+            "ciudad": destino.get("ciudad"),
+            "descripcion": destino.get("descripcion")
+        },
+        {
+            "id": doc_id,
+            "tipo": "destino",
+            "nombre": destino.get("nombre"),
+            "pais": destino.get("pais"),
+            "imagen": destino.get("imagen"),
+            "precio": destino.get("presupuesto", 0),
+            "descripcion": destino.get("ciudad", ""),
+            "url": f"/view/{doc_id}"
+        },
+        pais=destino.get("pais"),
+        precio=destino.get("presupuesto", 0)
+    )
+
+def eliminar_destino(indice, destino_id):
+    """Quita un destino del índice"""
+    indice.eliminar(f"destino:{destino_id}")
+
+def construir_indice(tours, destinos=()):
+    """Índice nuevo con todos los tours y los destinos dados"""
+    indice = IndiceBusqueda()
+    for clave, tour in tours.items():
+        agregar_tour(indice, clave, tour)
+    for destino in destinos:
+        agregar_destino(indice, destino)
+    return indice
@@ -0,0 +1,58 @@
+"""Caché en memoria con caducidad (TTL) y expulsión LRU.
+
+Cada worker de gunicorn tiene la suya; las rutas que modifican datos la
+invalidan explícitamente y el TTL acota lo desfasados que pueden quedar
+los demás workers.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_FALTA = object()
+
+
+class CacheTTL:
+    """Diccionario acotado a `max_entradas` cuyas entradas caducan a los `ttl` segundos"""
+
+    def __init__(self, max_entradas=128, ttl=300):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave, defecto=None):
+        """Valor de `clave` si existe y no ha caducado; si no, `defecto`"""
+        with self._lock:
+            entrada = self._datos.get(clave, _FALTA)
+            if entrada is not _FALTA:
+                caduca, valor = entrada
+                if caduca > time.monotonic():
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                del self._datos[clave]
+            self.fallos += 1
+            return defecto
+
+    def guardar(self, clave, valor):
+        """Guarda `valor` y expulsa la entrada usada hace más tiempo si no cabe"""
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave):
+        """Elimina una entrada concreta"""
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        """Elimina todas las entradas"""
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
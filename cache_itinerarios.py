@@ -0,0 +1,200 @@
+"""Caché de lectura (read-through) de documentos de itinerario.
+
+Las vistas de un itinerario lo leen completo por {_id, usuario_id} una y
+otra vez durante la misma sesión. Esta caché guarda el documento codificado
+en BSON (cada lectura devuelve una copia nueva, que las rutas pueden
+modificar sin riesgo) en dos niveles:
+
+- Local: CacheTTL del worker, LRU acotada y con caducidad.
+- Compartido (CACHE_ITINERARIOS_SQLITE): un fichero SQLite en el mismo
+  host, por ejemplo en /dev/shm, que ven todos los workers de gunicorn. Con
+  varios workers (WEB_CONCURRENCY > 1) se activa por defecto; con
+  CACHE_ITINERARIOS_SQLITE vacía se desactiva a sabiendas.
+
+Cada clave tiene una versión que las rutas que escriben incrementan con
+invalidar(). Un documento solo se sirve si se guardó con la versión vigente,
+y la versión se lee antes de ir a MongoDB: si otra petición modifica el
+itinerario mientras se carga, la copia cargada nace obsoleta y no se usa.
+Con el nivel compartido la versión vive en SQLite, así que una invalidación
+en un worker deja sin efecto las copias locales de todos los demás. Sin él,
+cada worker solo ve sus propias invalidaciones y puede servir una copia
+anterior a una edición hecha en otro durante el TTL.
+"""
+import itertools
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import bson
+
+from cache import CacheTTL
+
+# Cada cuántas escrituras se purgan del fichero compartido las filas caducadas
+PURGAR_CADA = 200
+
+
+def ruta_compartida_desde_entorno(nombre_db):
+    """Fichero del nivel compartido según CACHE_ITINERARIOS_SQLITE y WEB_CONCURRENCY.
+
+    Si la variable no está definida y gunicorn arranca más de un worker, se usa
+    un fichero por base de datos en /dev/shm (o en el directorio temporal):
+    así una edición nunca deja a otro worker sirviendo la versión anterior.
+    """
+    ruta = os.environ.get("CACHE_ITINERARIOS_SQLITE")
+    if ruta is not None:
+        return ruta or None
+    if int(os.environ.get("WEB_CONCURRENCY") or 1) <= 1:
+        return None
+    directorio = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directorio, f"travelasia_itinerarios_{nombre_db}.sqlite")
+
+
+class _AlmacenSQLite:
+    """Documentos y versiones compartidos entre procesos en un fichero SQLite"""
+
+    def __init__(self, ruta, max_entradas, ttl):
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._local = threading.local()
+        self._escrituras = itertools.count()
+        with self._conexion() as conexion:
+            conexion.execute("CREATE TABLE IF NOT EXISTS documentos "
+                             "(clave TEXT PRIMARY KEY, version INTEGER, caduca REAL, datos BLOB)")
+            conexion.execute("CREATE TABLE IF NOT EXISTS versiones "
+                             "(clave TEXT PRIMARY KEY, version INTEGER, modificada REAL)")
+            # Documentos de un arranque anterior (p. ej. antes de una migración): se descartan
+            conexion.execute("DELETE FROM documentos")
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso: una conexión SQLite no sobrevive a un fork
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None or self._local.pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=1.0, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=OFF")
+            self._local.conexion, self._local.pid = conexion, os.getpid()
+        return conexion
+
+    def version(self, clave):
+        fila = self._conexion().execute("SELECT version FROM versiones WHERE clave = ?", (clave,)).fetchone()
+        return fila[0] if fila else 0
+
+    def obtener(self, clave, version):
+        fila = self._conexion().execute(
+            "SELECT datos FROM documentos WHERE clave = ? AND version = ? AND caduca > ?",
+            (clave, version, time.time())
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def guardar(self, clave, version, datos):
+        conexion = self._conexion()
+        ahora = time.time()
+        conexion.execute("INSERT OR REPLACE INTO documentos VALUES (?, ?, ?, ?)",
+                         (clave, version, ahora + self.ttl, datos))
+        if next(self._escrituras) % PURGAR_CADA == 0:
+            conexion.execute("DELETE FROM documentos WHERE caduca <= ?", (ahora,))
+            # Pasado el doble del TTL ninguna copia local puede ser anterior a la invalidación
+            conexion.execute("DELETE FROM versiones WHERE modificada <= ?", (ahora - 2 * self.ttl,))
+            conexion.execute("DELETE FROM documentos WHERE clave IN (SELECT clave FROM documentos "
+                             "ORDER BY caduca DESC LIMIT -1 OFFSET ?)", (self.max_entradas,))
+
+    def invalidar(self, clave):
+        conexion = self._conexion()
+        conexion.execute("INSERT INTO versiones VALUES (?, 1, ?) ON CONFLICT(clave) "
+                         "DO UPDATE SET version = version + 1, modificada = excluded.modificada",
+                         (clave, time.time()))
+        conexion.execute("DELETE FROM documentos WHERE clave = ?", (clave,))
+
+
+class CacheItinerarios:
+    """Itinerarios por (id, usuario) con caché local y, opcionalmente, compartida"""
+
+    def __init__(self, max_entradas=512, ttl=60, ruta_compartida=None, contar=None):
+        self.local = CacheTTL(max_entradas=max_entradas, ttl=ttl)
+        self.compartido = _AlmacenSQLite(ruta_compartida, max_entradas * 8, ttl) if ruta_compartida else None
+        self.contar = contar
+        self.aciertos = 0
+        self.aciertos_compartidos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        # Sin nivel compartido las versiones son de este proceso (acotadas como una LRU)
+        self._versiones = OrderedDict()
+        self._max_versiones = max_entradas * 4
+        self._generacion = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clave(itinerario_id, usuario_id):
+        return f"{itinerario_id}:{usuario_id}"
+
+    def _version(self, clave):
+        if self.compartido is not None:
+            return self.compartido.version(clave)
+        with self._lock:
+            return self._versiones.get(clave, 0)
+
+    def _registrar(self, resultado):
+        if self.contar is not None:
+            self.contar(resultado)
+
+    def obtener(self, itinerario_id, usuario_id, cargar):
+        """Documento del itinerario; si no está en caché llama a cargar() (None no se guarda)"""
+        clave = self.clave(itinerario_id, usuario_id)
+        version = self._version(clave)
+
+        entrada = self.local.obtener(clave)
+        if entrada is not None and entrada[0] == version:
+            self.aciertos += 1
+            self._registrar("local")
+            return bson.decode(entrada[1])
+
+        if self.compartido is not None:
+            datos = self.compartido.obtener(clave, version)
+            if datos is not None:
+                self.local.guardar(clave, (version, datos))
+                self.aciertos_compartidos += 1
+                self._registrar("compartido")
+                return bson.decode(datos)
+
+        self.fallos += 1
+        self._registrar("fallo")
+        documento = cargar()
+        if documento is None:
+            return None
+        datos = bson.encode(documento)
+        # Si se invalidó mientras se cargaba, esta copia ya nace obsoleta y no se guarda
+        if self._version(clave) == version:
+            self.local.guardar(clave, (version, datos))
+            if self.compartido is not None:
+                self.compartido.guardar(clave, version, datos)
+        return documento
+
+    def invalidar(self, itinerario_id, usuario_id):
+        """Nueva versión del itinerario: ninguna copia anterior se vuelve a servir"""
+        clave = self.clave(itinerario_id, usuario_id)
+        self.invalidaciones += 1
+        if self.compartido is not None:
+            self.compartido.invalidar(clave)
+        else:
+            with self._lock:
+                self._versiones[clave] = next(self._generacion)
+                self._versiones.move_to_end(clave)
+                while len(self._versiones) > self._max_versiones:
+                    self._versiones.popitem(last=False)
+        self.local.invalidar(clave)
+
+    def estadisticas(self):
+        """Contadores de este worker"""
+        consultas = self.aciertos + self.aciertos_compartidos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "aciertos_compartidos": self.aciertos_compartidos,
+            "fallos": self.fallos,
+            "invalidaciones": self.invalidaciones,
+            "tasa_aciertos": round((self.aciertos + self.aciertos_compartidos) / consultas, 3) if consultas else 0.0,
+            "entradas_locales": len(self.local),
+        }
@@ -0,0 +1,242 @@
+"""Catálogo estático de tours y coordenadas de TravelAsia"""
+
+# DATOS DE TODOS LOS TOURS PREDEFINIDOS
+TOURS_PREDEFINIDOS = {
+    "japon": {
+        "nombre": "Tour Japón Esencial",
+        "pais": "Japón",
+        "ciudad": "Tokio, Kioto, Osaka",
+        "duracion": "10 días",
+        "precio_base": 1500,
+        "incluye": ["Hoteles 4*", "Vuelos internos", "Guía turístico", "Desayunos"],
+        "imagen": "https://images.unsplash.com/photo-1493976040374-85c8e12f0c0e?ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D&auto=format&fit=crop&w=600&q=80",
+        "experiencia": "cultural",
+        "descripcion": "Descubre lo mejor de Japón: desde el moderno Tokio hasta los templos ancestrales de Kioto."
+    },
+    "tailandia": {
+        "nombre": "Aventura Tailandia",
+        "pais": "Tailandia", 
+        "ciudad": "Bangkok, Phuket, Chiang Mai",
+        "duracion": "12 días",
+        "precio_base": 1200,
+        "incluye": ["Hoteles 4*", "Tours incluidos", "Algunas comidas", "Transporte"],
+        "imagen": "https://images.unsplash.com/photo-1552465011-b4e21bf6e79a?w=600",
+        "experiencia": "aventura",
+        "descripcion": "Playas paradisíacas, templos budistas y la vibrante vida nocturna de Bangkok."
+    },
+    "vietnam": {
+        "nombre": "Vietnam Clásico",
+        "pais": "Vietnam",
+        "ciudad": "Hanoi, Halong Bay, Ho Chi Minh",
+        "duracion": "9 días",
+        "precio_base": 900,
+        "incluye": ["Hoteles 3-4*", "Crucero en Halong Bay", "Todas las comidas", "Guía local"],
+        "imagen": "https://images.unsplash.com/photo-1583417319070-4a69db38a482?w=600",
+        "experiencia": "cultural",
+        "descripcion": "Explora la rica historia y paisajes espectaculares de Vietnam."
+    },
+    "china": {
+        "nombre": "Gran Tour de China",
+        "pais": "China",
+        "ciudad": "Beijing, Shanghai, Gran Muralla",
+        "duracion": "14 días",
+        "precio_base": 1100,
+        "incluye": ["Hoteles 4*", "Entradas a atracciones", "Tren bala", "Guía español"],
+        "imagen": "https://images.unsplash.com/photo-1508804185872-d7badad00f7d?w=600",
+        "experiencia": "cultural",
+        "descripcion": "Descubre la milenaria cultura china y sus maravillas modernas."
+    },
+    "corea": {
+        "nombre": "Corea del Sur Completa",
+        "pais": "Corea del Sur",
+        "ciudad": "Seúl, Busan, Jeju Island",
+        "duracion": "11 días",
+        "precio_base": 1300,
+        "incluye": ["Hoteles 4*", "Vuelo a Jeju", "Tours K-pop", "Comidas típicas"],
+        "imagen": "https://images.unsplash.com/photo-1534274867514-d5b47ef89ed7?w=600",
+        "experiencia": "shopping",
+        "descripcion": "Experimenta la mezcla única de tradición y modernidad en Corea."
+    },
+    "indonesia": {
+        "nombre": "Paraíso de Bali",
+        "pais": "Indonesia",
+        "ciudad": "Bali, Ubud, Seminyak",
+        "duracion": "8 días",
+        "precio_base": 800,
+        "incluye": ["Villas de lujo", "Spa y yoga", "Tours culturales", "Desayunos"],
+        "imagen": "https://images.unsplash.com/photo-1537953773345-d172ccf13cf1?w=600",
+        "experiencia": "relax",
+        "descripcion": "Relájate en las playas y templos del paraíso indonesio."
+    },
+    "malasia": {
+        "nombre": "Malasia Diversa",
+        "pais": "Malasia",
+        "ciudad": "Kuala Lumpur, Penang, Langkawi",
+        "duracion": "10 días",
+        "precio_base": 950,
+        "incluye": ["Hoteles 4*", "Vuelos domésticos", "City tours", "Desayunos"],
+        "imagen": "https://images.unsplash.com/photo-1596422846543-75c6fc197f07?w=600",
+        "experiencia": "aventura",
+        "descripcion": "Descubre la diversidad cultural y natural de Malasia."
+    },
+    "singapur": {
+        "nombre": "Singapur Moderno",
+        "pais": "Singapur",
+        "ciudad": "Singapur",
+        "duracion": "5 días",
+        "precio_base": 1400,
+        "incluye": ["Hotel 5*", "Entradas a atracciones", "Tour gastronómico", "Transporte"],
+        "imagen": "https://images.unsplash.com/photo-1525625293386-3f8f99389edd?w=600",
+        "experiencia": "gastronomia",
+        "descripcion": "Vive la experiencia futurista de la ciudad jardín de Singapur."
+    },
+    "india": {
+        "nombre": "India Mística",
+        "pais": "India",
+        "ciudad": "Delhi, Agra, Jaipur",
+        "duracion": "12 días",
+        "precio_base": 850,
+        "incluye": ["Hoteles 4*", "Visita al Taj Mahal", "Guía local", "Desayunos"],
+        "imagen": "https://images.unsplash.com/photo-1524492412937-b28074a5d7da?w=600",
+        "experiencia": "cultural",
+        "descripcion": "Sumérgete en la cultura y espiritualidad de la India."
+    },
+    "filipinas": {
+        "nombre": "Islas Filipinas",
+        "pais": "Filipinas",
+        "ciudad": "Palawan, Cebu, Boracay",
+        "duracion": "10 días",
+        "precio_base": 1100,
+        "incluye": ["Resorts playeros", "Tours de snorkel", "Transporte entre islas", "Desayunos"],
+        "imagen": "https://images.unsplash.com/photo-1558642084-fd07fae5282e?w=600",
+        "experiencia": "relax",
+        "descripcion": "Descubre las playas más hermosas del mundo en Filipinas."
+    },
+    "sri-lanka": {
+        "nombre": "Perla del Índico",
+        "pais": "Sri Lanka",
+        "ciudad": "Colombo, Kandy, Galle",
+        "duracion": "9 días",
+        "precio_base": 950,
+        "incluye": ["Hoteles boutique", "Safari en Yala", "Tren montañoso", "Guía"],
+        "imagen": "https://images.unsplash.com/photo-1573804633921-5c87f5d3a1c9?w=600",
+        "experiencia": "aventura",
+        "descripcion": "Explora los tesoros naturales y culturales de Sri Lanka."
+    },
+    "camboya": {
+        "nombre": "Reino de Angkor",
+        "pais": "Camboya",
+        "ciudad": "Siem Reap, Phnom Penh",
+        "duracion": "7 días",
+        "precio_base": 750,
+        "incluye": ["Hoteles 4*", "Entrada a Angkor Wat", "Tour histórico", "Desayunos"],
+        "imagen": "https://images.unsplash.com/photo-1560169897-fc0cdbdfa4d5?w=600",
+        "experiencia": "cultural",
+        "descripcion": "Maravíllate con los templos ancestrales de Angkor Wat."
+    }
+}
+
+# COORDENADAS DE PAÍSES PARA EL MAPA
+COORDENADAS_PAISES = {
+    "Japón": {"lat": 36.2048, "lng": 138.2529, "zoom": 5},
+    "Tailandia": {"lat": 15.8700, "lng": 100.9925, "zoom": 5},
+    "Vietnam": {"lat": 14.0583, "lng": 108.2772, "zoom": 5},
+    "China": {"lat": 35.8617, "lng": 104.1954, "zoom": 4},
+    "Corea del Sur": {"lat": 35.9078, "lng": 127.7669, "zoom": 6},
+    "Indonesia": {"lat": -0.7893, "lng": 113.9213, "zoom": 5},
+    "Malasia": {"lat": 4.2105, "lng": 101.9758, "zoom": 6},
+    "Singapur": {"lat": 1.3521, "lng": 103.8198, "zoom": 11},
+    "India": {"lat": 20.5937, "lng": 78.9629, "zoom": 4},
+    "Filipinas": {"lat": 12.8797, "lng": 121.7740, "zoom": 5},
+    "Sri Lanka": {"lat": 7.8731, "lng": 80.7718, "zoom": 7},
+    "Camboya": {"lat": 12.5657, "lng": 104.9910, "zoom": 6}
+}
+
+# COORDENADAS DE LAS CIUDADES DE LOS TOURS (para ordenar rutas y el mapa)
+COORDENADAS_CIUDADES = {
+    "Tokio": {"lat": 35.6762, "lng": 139.6503, "pais": "Japón"},
+    "Kioto": {"lat": 35.0116, "lng": 135.7681, "pais": "Japón"},
+    "Osaka": {"lat": 34.6937, "lng": 135.5023, "pais": "Japón"},
+    "Bangkok": {"lat": 13.7563, "lng": 100.5018, "pais": "Tailandia"},
+    "Phuket": {"lat": 7.8804, "lng": 98.3923, "pais": "Tailandia"},
+    "Chiang Mai": {"lat": 18.7883, "lng": 98.9853, "pais": "Tailandia"},
+    "Hanoi": {"lat": 21.0278, "lng": 105.8342, "pais": "Vietnam"},
+    "Halong Bay": {"lat": 20.9101, "lng": 107.1839, "pais": "Vietnam"},
+    "Ho Chi Minh": {"lat": 10.8231, "lng": 106.6297, "pais": "Vietnam"},
+    "Beijing": {"lat": 39.9042, "lng": 116.4074, "pais": "China"},
+    "Shanghai": {"lat": 31.2304, "lng": 121.4737, "pais": "China"},
+    "Gran Muralla": {"lat": 40.4319, "lng": 116.5704, "pais": "China"},
+    "Seúl": {"lat": 37.5665, "lng": 126.9780, "pais": "Corea del Sur"},
+    "Busan": {"lat": 35.1796, "lng": 129.0756, "pais": "Corea del Sur"},
+    "Jeju Island": {"lat": 33.4996, "lng": 126.5312, "pais": "Corea del Sur"},
+    "Bali": {"lat": -8.3405, "lng": 115.0920, "pais": "Indonesia"},
+    "Ubud": {"lat": -8.5069, "lng": 115.2625, "pais": "Indonesia"},
+    "Seminyak": {"lat": -8.6913, "lng": 115.1682, "pais": "Indonesia"},
+    "Kuala Lumpur": {"lat": 3.1390, "lng": 101.6869, "pais": "Malasia"},
+    "Penang": {"lat": 5.4164, "lng": 100.3327, "pais": "Malasia"},
+    "Langkawi": {"lat": 6.3500, "lng": 99.8000, "pais": "Malasia"},
+    "Singapur": {"lat": 1.2903, "lng": 103.8520, "pais": "Singapur"},
+    "Delhi": {"lat": 28.7041, "lng": 77.1025, "pais": "India"},
+    "Agra": {"lat": 27.1767, "lng": 78.0081, "pais": "India"},
+    "Jaipur": {"lat": 26.9124, "lng": 75.7873, "pais": "India"},
+    "Palawan": {"lat": 9.8349, "lng": 118.7384, "pais": "Filipinas"},
+    "Cebu": {"lat": 10.3157, "lng": 123.8854, "pais": "Filipinas"},
+    "Boracay": {"lat": 11.9674, "lng": 121.9248, "pais": "Filipinas"},
+    "Colombo": {"lat": 6.9271, "lng": 79.8612, "pais": "Sri Lanka"},
+    "Kandy": {"lat": 7.2906, "lng": 80.6337, "pais": "Sri Lanka"},
+    "Galle": {"lat": 6.0535, "lng": 80.2210, "pais": "Sri Lanka"},
+    "Siem Reap": {"lat": 13.3671, "lng": 103.8448, "pais": "Camboya"},
+    "Phnom Penh": {"lat": 11.5564, "lng": 104.9282, "pais": "Camboya"}
+}
+
+# REGLAS DE TEMPORADA POR TOUR
+# Rangos "MM-DD" inclusivos (pueden cruzar el fin de año). Las reglas de "*"
+# se aplican a todos los tours; si varias coinciden en un día, se multiplican.
+TEMPORADAS = {
+    "*": [
+        {"nombre": "Fiestas de fin de año", "desde": "12-20", "hasta": "01-06", "multiplicador": 1.25}
+    ],
+    "japon": [
+        {"nombre": "Sakura", "desde": "03-20", "hasta": "04-15", "multiplicador": 1.4},
+        {"nombre": "Golden Week", "desde": "04-29", "hasta": "05-05", "multiplicador": 1.3},
+        {"nombre": "Momiji", "desde": "11-01", "hasta": "11-30", "multiplicador": 1.2}
+    ],
+    "tailandia": [
+        {"nombre": "Songkran", "desde": "04-12", "hasta": "04-16", "multiplicador": 1.2},
+        {"nombre": "Monzón", "desde": "06-01", "hasta": "10-31", "multiplicador": 0.85}
+    ],
+    "vietnam": [
+        {"nombre": "Lluvias en el centro", "desde": "09-01", "hasta": "11-30", "multiplicador": 0.85}
+    ],
+    "china": [
+        {"nombre": "Semana Dorada", "desde": "10-01", "hasta": "10-07", "multiplicador": 1.35}
+    ],
+    "corea": [
+        {"nombre": "Cerezos en flor", "desde": "03-28", "hasta": "04-12", "multiplicador": 1.2},
+        {"nombre": "Otoño", "desde": "10-15", "hasta": "11-10", "multiplicador": 1.15}
+    ],
+    "indonesia": [
+        {"nombre": "Temporada de lluvias", "desde": "01-07", "hasta": "03-31", "multiplicador": 0.85},
+        {"nombre": "Temporada seca", "desde": "07-01", "hasta": "08-31", "multiplicador": 1.2}
+    ],
+    "malasia": [
+        {"nombre": "Monzón del noreste", "desde": "11-01", "hasta": "12-19", "multiplicador": 0.9}
+    ],
+    "singapur": [
+        {"nombre": "Gran Premio", "desde": "09-15", "hasta": "09-25", "multiplicador": 1.3}
+    ],
+    "india": [
+        {"nombre": "Monzón", "desde": "06-15", "hasta": "09-15", "multiplicador": 0.8},
+        {"nombre": "Invierno", "desde": "11-01", "hasta": "02-28", "multiplicador": 1.15}
+    ],
+    "filipinas": [
+        {"nombre": "Tifones", "desde": "07-01", "hasta": "10-31", "multiplicador": 0.8},
+        {"nombre": "Semana Santa", "desde": "03-25", "hasta": "04-10", "multiplicador": 1.2}
+    ],
+    "sri-lanka": [
+        {"nombre": "Monzón del suroeste", "desde": "05-15", "hasta": "08-31", "multiplicador": 0.85}
+    ],
+    "camboya": [
+        {"nombre": "Temporada verde", "desde": "06-01", "hasta": "10-31", "multiplicador": 0.8}
+    ]
+}
@@ -0,0 +1,155 @@
+"""Conexión perezosa y segura ante fork con MongoDB.
+
+El `MongoClient` no se crea al importar la aplicación sino en el primer uso,
+y siempre en el proceso que lo va a usar: si gunicorn hace fork (por ejemplo
+con --preload), cada worker descarta el cliente heredado y crea el suyo.
+Crear el cliente no bloquea; el estado del servidor se conoce por los
+heartbeats de pymongo, así un servidor caído pone la aplicación en modo demo
+sin esperar a serverSelectionTimeoutMS en cada petición.
+"""
+import os
+import threading
+import time
+
+import pymongo
+from pymongo import MongoClient, monitoring
+from pymongo.errors import ConfigurationError, InvalidURI, PyMongoError
+
+# Opciones del pool configurables por entorno: (variable, opción de MongoClient, valor por defecto)
+OPCIONES_ENTORNO = [
+    ("MONGO_MAX_POOL", "maxPoolSize", 50),
+    ("MONGO_MIN_POOL", "minPoolSize", 0),
+    ("MONGO_TIMEOUT_MS", "serverSelectionTimeoutMS", 5000),
+    ("MONGO_CONNECT_TIMEOUT_MS", "connectTimeoutMS", 5000),
+    ("MONGO_SOCKET_TIMEOUT_MS", "socketTimeoutMS", None),
+    ("MONGO_WAIT_QUEUE_TIMEOUT_MS", "waitQueueTimeoutMS", None),
+]
+# Segundos antes de reintentar una URI que falló (p. ej. un fallo de DNS al resolver mongodb+srv)
+REINTENTO_CONFIGURACION = 30
+
+
+def opciones_desde_entorno():
+    """Opciones de MongoClient leídas de las variables MONGO_*"""
+    opciones = {}
+    for variable, opcion, por_defecto in OPCIONES_ENTORNO:
+        valor = os.environ.get(variable, por_defecto)
+        if valor not in (None, ""):
+            opciones[opcion] = int(valor)
+    return opciones
+
+
+class _EstadoServidor(monitoring.ServerHeartbeatListener):
+    """Guarda el resultado del último heartbeat del cliente"""
+
+    def __init__(self):
+        self.disponible = None
+        self.error = None
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.disponible, self.error = True, None
+
+    def failed(self, event):
+        self.disponible, self.error = False, str(event.reply)
+
+
+class ConexionMongo:
+    """Cliente de MongoDB creado bajo demanda, uno por proceso"""
+
+    def __init__(self, uri, nombre_db, **opciones):
+        self.uri = uri
+        self.nombre_db = nombre_db
+        self.opciones = opciones
+        self._cliente = None
+        self._estado = None
+        self._pid = None
+        self._error_configuracion = None
+        self._fallo_configuracion = 0.0
+        self._al_conectar = []
+        self._lock = threading.Lock()
+        # El hijo de un fork nunca debe usar los sockets ni los hilos del padre
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._descartar)
+
+    def _descartar(self):
+        # No se llama a close(): los sockets heredados siguen siendo del padre
+        self._cliente = None
+        self._estado = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def al_conectar(self, funcion):
+        """Registra una función(db) que se ejecuta en segundo plano cuando cada proceso crea su cliente"""
+        self._al_conectar.append(funcion)
+        return funcion
+
+    def cliente(self):
+        """MongoClient de este proceso, o None si no se pudo crear con la URI configurada"""
+        if self._cliente is not None and self._pid == os.getpid():
+            return self._cliente
+        if (self._error_configuracion is not None
+                and time.monotonic() - self._fallo_configuracion < REINTENTO_CONFIGURACION):
+            return None
+        with self._lock:
+            if self._cliente is None or self._pid != os.getpid():
+                estado = _EstadoServidor()
+                try:
+                    # No bloquea: la conexión y los heartbeats van en hilos de pymongo
+                    opciones = dict(self.opciones)
+                    escuchas = [estado] + list(opciones.pop("event_listeners", []))
+                    self._cliente = MongoClient(self.uri, event_listeners=escuchas, **opciones)
+                except (ConfigurationError, InvalidURI, ValueError, TypeError) as e:
+                    self._error_configuracion = str(e)
+                    self._fallo_configuracion = time.monotonic()
+                    print(f"❌ Error MongoDB: {e}")
+                    print("⚠️ La aplicación funcionará en modo demo sin base de datos")
+                    return None
+                self._estado = estado
+                self._error_configuracion = None
+                self._pid = os.getpid()
+                db = self._cliente[self.nombre_db]
+                for funcion in self._al_conectar:
+                    threading.Thread(target=funcion, args=(db,), daemon=True).start()
+        return self._cliente
+
+    def usar_cliente(self, cliente):
+        """Sustituye el cliente de este proceso (p. ej. por un MongoDB en memoria en los benchmarks)"""
+        estado = _EstadoServidor()
+        estado.disponible = True
+        with self._lock:
+            self._cliente, self._estado, self._pid = cliente, estado, os.getpid()
+            self._error_configuracion = None
+
+    def db(self):
+        """Base de datos de este proceso, o None en modo demo.
+
+        Mientras no ha llegado el primer heartbeat se devuelve la base de
+        datos; si el último heartbeat falló se devuelve None hasta que el
+        servidor vuelva a responder.
+        """
+        cliente = self.cliente()
+        if cliente is None or self._estado.disponible is False:
+            return None
+        return cliente[self.nombre_db]
+
+    def coleccion(self, nombre):
+        """Colección de la base de datos de este proceso (las rutas ya comprobaron el modo demo)"""
+        return self.cliente()[self.nombre_db][nombre]
+
+    def comprobar(self, timeout=2.0):
+        """Ping con límite de tiempo para /healthz: (ok, detalles)"""
+        cliente = self.cliente()
+        if cliente is None:
+            return False, {"mongodb": "demo", "error": self._error_configuracion}
+        if self._estado.disponible is False:
+            # El monitor de pymongo ya sabe que está caído: no esperar al timeout
+            return False, {"mongodb": "no disponible", "error": self._estado.error}
+        inicio = time.perf_counter()
+        try:
+            with pymongo.timeout(timeout):
+                cliente.admin.command("ping")
+        except PyMongoError as e:
+            return False, {"mongodb": "no disponible", "error": str(e)}
+        return True, {"mongodb": "ok", "latencia_ms": round((time.perf_counter() - inicio) * 1000, 2)}
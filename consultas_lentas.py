@@ -0,0 +1,233 @@
+"""Registro de consultas lentas con explain() automático y sugerencia de índice.
+
+Modo de diagnóstico que se activa con CONSULTAS_LENTAS_MS: cualquier comando
+de lectura o escritura que tarde más que ese umbral se agrupa por su forma
+(colección, filtro y orden sin valores) y, como mucho una vez cada
+EXPLICAR_CADA segundos por forma, se lanza su explain("executionStats") en un
+hilo aparte. El resultado queda en la colección `consultas_lentas`, un
+documento por forma, y se consulta con:
+
+    flask --app app indices lentas
+"""
+import datetime
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+from flask import has_request_context, request
+from pymongo import monitoring
+
+from migraciones import INDICES, etapas_plan
+
+# Comando → (campo del filtro, campo del orden) dentro del documento del comando
+COMANDOS_ANALIZABLES = {
+    "find": ("filter", "sort"),
+    "findAndModify": ("query", "sort"),
+    "count": ("query", None),
+    "distinct": ("query", None),
+    "aggregate": (None, None),
+    "update": (None, None),
+    "delete": (None, None),
+}
+# Campos del comando que no se pueden reenviar dentro de explain
+CAMPOS_SESION = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+OPERADORES_IGUALDAD = {"$eq", "$in"}
+EXPLICAR_CADA = 300
+MAX_PENDIENTES = 1000
+
+
+# ========== FORMA DE LA CONSULTA ==========
+
+def forma(valor):
+    """Sustituye los valores de un filtro por "?" conservando campos y operadores"""
+    if isinstance(valor, dict):
+        return {k: forma(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        formas = [forma(v) for v in valor]
+        # $or/$and conservan sus ramas; una lista de valores ($in) se reduce a uno
+        return formas if any(isinstance(f, dict) for f in formas) else ["?"]
+    return "?"
+
+def filtro_y_orden(comando, documento):
+    """Extrae (colección, filtro, orden) del documento de un comando analizable"""
+    coleccion = documento.get(comando)
+    campo_filtro, campo_orden = COMANDOS_ANALIZABLES[comando]
+    filtro, orden = {}, None
+    if comando == "aggregate":
+        for etapa in documento.get("pipeline", []):
+            if "$match" in etapa and not filtro:
+                filtro = etapa["$match"]
+            elif "$sort" in etapa and orden is None:
+                orden = etapa["$sort"]
+            elif "$match" not in etapa:
+                break
+    elif comando in ("update", "delete"):
+        sentencias = documento.get(comando + "s") or [{}]
+        filtro = sentencias[0].get("q", {})
+    else:
+        filtro = documento.get(campo_filtro) or {}
+        orden = documento.get(campo_orden) if campo_orden else None
+    return coleccion, filtro, dict(orden) if orden else None
+
+def campos_filtro(filtro):
+    """Separa los campos del filtro en (igualdad, rango) siguiendo sus operadores"""
+    igualdad, rango = [], []
+    for campo, condicion in filtro.items():
+        if campo in ("$and", "$or"):
+            # En un $or de keyset todas las ramas comparten los mismos campos: basta la primera
+            for rama in condicion[:1] if campo == "$or" else condicion:
+                i, r = campos_filtro(rama)
+                igualdad += [c for c in i if c not in igualdad]
+                rango += [c for c in r if c not in rango]
+            continue
+        if campo.startswith("$"):
+            continue
+        operadores = set(condicion) if isinstance(condicion, dict) else set()
+        if operadores and all(o.startswith("$") for o in operadores) and not operadores <= OPERADORES_IGUALDAD:
+            if campo not in rango:
+                rango.append(campo)
+        elif campo not in igualdad:
+            igualdad.append(campo)
+    return igualdad, [c for c in rango if c not in igualdad]
+
+def sugerir_indice(filtro, orden):
+    """Índice compuesto según la regla igualdad → orden → rango (ESR)"""
+    igualdad, rango = campos_filtro(filtro)
+    claves = [(campo, 1) for campo in igualdad]
+    for campo, direccion in (orden or {}).items():
+        if campo not in igualdad:
+            claves.append((campo, direccion))
+    claves += [(campo, 1) for campo in rango if campo not in dict(claves)]
+    return claves
+
+def indice_declarado(coleccion, claves):
+    """True si algún índice de migraciones.INDICES empieza por esas claves"""
+    campos = [campo for campo, _ in claves]
+    for nombre, declaradas, _ in INDICES:
+        if nombre == coleccion and [campo for campo, _ in declaradas][:len(campos)] == campos:
+            return True
+    return False
+
+
+# ========== ANÁLISIS DEL PLAN ==========
+
+def resumen_explain(explain):
+    """Claves y documentos examinados frente a devueltos, y etapas del plan ganador"""
+    estadisticas = explain.get("executionStats", {})
+    plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+    if not plan and "stages" in explain:
+        # aggregate: el plan de la consulta está en la primera etapa ($cursor)
+        cursor = explain["stages"][0].get("$cursor", {})
+        estadisticas = cursor.get("executionStats", estadisticas)
+        plan = cursor.get("queryPlanner", {}).get("winningPlan", {})
+    return {
+        "claves_examinadas": estadisticas.get("totalKeysExamined"),
+        "docs_examinados": estadisticas.get("totalDocsExamined"),
+        "devueltos": estadisticas.get("nReturned"),
+        "tiempo_ejecucion_ms": estadisticas.get("executionTimeMillis"),
+        "etapas": etapas_plan(plan),
+    }
+
+def necesita_indice(resumen):
+    """Un COLLSCAN, un SORT en memoria o muchos más documentos examinados que devueltos"""
+    etapas = resumen["etapas"]
+    if "COLLSCAN" in etapas or "SORT" in etapas:
+        return True
+    examinados, devueltos = resumen["docs_examinados"] or 0, resumen["devueltos"] or 0
+    return examinados > 10 * max(devueltos, 1)
+
+
+# ========== LISTENER ==========
+
+class RegistroConsultasLentas(monitoring.CommandListener):
+    """Detecta comandos por encima del umbral y los analiza en segundo plano"""
+
+    def __init__(self, obtener_cliente, umbral_ms, nombre_db):
+        self.obtener_cliente = obtener_cliente
+        self.umbral_ms = umbral_ms
+        self.nombre_db = nombre_db
+        self._en_curso = {}
+        self._explicadas = {}
+        self._pendientes = queue.Queue(maxsize=MAX_PENDIENTES)
+        self._hilo = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def started(self, event):
+        if event.command_name not in COMANDOS_ANALIZABLES or getattr(self._local, "interno", False):
+            return
+        ruta = request.endpoint if has_request_context() else None
+        self._en_curso[(event.connection_id, event.request_id)] = (event.command, ruta)
+
+    def succeeded(self, event):
+        inicio = self._en_curso.pop((event.connection_id, event.request_id), None)
+        if inicio is None or event.duration_micros < self.umbral_ms * 1000:
+            return
+        documento, ruta = inicio
+        try:
+            self._pendientes.put_nowait((event.command_name, documento, ruta, event.duration_micros / 1000))
+        except queue.Full:
+            return
+        self._arrancar_hilo()
+
+    def failed(self, event):
+        self._en_curso.pop((event.connection_id, event.request_id), None)
+
+    def _arrancar_hilo(self):
+        if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or self._pid != os.getpid() or not self._hilo.is_alive():
+                self._pid = os.getpid()
+                self._hilo = threading.Thread(target=self._procesar, daemon=True)
+                self._hilo.start()
+
+    def _procesar(self):
+        # Los comandos de este hilo (explain, registro) no deben analizarse a sí mismos
+        self._local.interno = True
+        while True:
+            comando, documento, ruta, duracion_ms = self._pendientes.get()
+            try:
+                self.analizar(comando, documento, ruta, duracion_ms)
+            except Exception as e:
+                print(f"❌ Error analizando consulta lenta: {e}")
+
+    def analizar(self, comando, documento, ruta, duracion_ms):
+        """Registra una ejecución lenta; explica su forma si no se explicó hace poco"""
+        coleccion, filtro, orden = filtro_y_orden(comando, documento)
+        forma_consulta = {"comando": comando, "coleccion": coleccion, "filtro": forma(filtro), "orden": orden}
+        clave = hashlib.sha1(json.dumps(forma_consulta, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        db = self.obtener_cliente()[documento.get("$db", self.nombre_db)]
+
+        cambios = {"$inc": {"veces": 1}, "$max": {"max_ms": duracion_ms},
+                   "$set": {"ultima": datetime.datetime.utcnow()}, "$addToSet": {"rutas": ruta}}
+        ahora = time.monotonic()
+        if ahora - self._explicadas.get(clave, -EXPLICAR_CADA) >= EXPLICAR_CADA:
+            self._explicadas[clave] = ahora
+            explicable = {k: v for k, v in documento.items() if not k.startswith("$") and k not in CAMPOS_SESION}
+            for campo in ("updates", "deletes"):
+                if campo in explicable:
+                    # explain solo admite una sentencia por comando de escritura
+                    explicable[campo] = explicable[campo][:1]
+            resumen = resumen_explain(db.command({"explain": explicable, "verbosity": "executionStats"}))
+            sugerencia = sugerir_indice(filtro, orden) if necesita_indice(resumen) else None
+            # El filtro se guarda como texto: sus operadores ($or, $lt...) no son nombres de campo válidos
+            cambios["$set"].update(forma_consulta, filtro=json.dumps(forma(filtro), default=str))
+            cambios["$set"].update(resumen)
+            cambios["$set"]["sugerencia"] = sugerencia
+            cambios["$set"]["indice_declarado"] = bool(sugerencia) and indice_declarado(coleccion, sugerencia)
+            print(f"🐢 Consulta lenta ({duracion_ms:.0f} ms) en {ruta or '-'}: {coleccion}.{comando} "
+                  f"filtro={json.dumps(forma(filtro), default=str)} orden={orden} "
+                  f"examinados={resumen['docs_examinados']} devueltos={resumen['devueltos']} "
+                  f"sugerencia={sugerencia}")
+
+        db.consultas_lentas.update_one({"_id": clave}, cambios, upsert=True)
+
+
+def listar_consultas_lentas(db, limite=20):
+    """Formas registradas, de la más frecuente a la menos"""
+    return list(db.consultas_lentas.find().sort([("veces", -1), ("max_ms", -1)]).limit(limite))
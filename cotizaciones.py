@@ -0,0 +1,279 @@
+"""Motor de precios de TravelAsia.
+
+Lo comparten la ruta del formulario (/procesar_cotizacion), que cotiza una
+combinación, y la API de lotes (/api/cotizaciones/batch), que cotiza miles
+de combinaciones de una vez con operaciones de NumPy sobre arrays.
+
+Las reglas de temporada se compilan al construir el motor en una tabla densa
+de tarifas por noche (tour × categoría × 365 días) y en su suma acumulada,
+así el precio de cualquier estancia con fecha es una resta de dos posiciones.
+"""
+import csv
+import datetime
+import io
+
+import numpy as np
+
+# Ajustes por categoría
+MULTIPLICADORES_CATEGORIA = {
+    "economico": 0.8,
+    "estandar": 1.0,
+    "premium": 1.5,
+    "lujo": 2.0
+}
+
+NOCHES_POR_DEFECTO = 7
+DIAS_CALENDARIO = 365
+MAX_COMBINACIONES_LOTE = 200_000
+COLUMNAS = ("pais", "categoria", "personas", "noches", "precio")
+
+
+class CotizacionError(ValueError):
+    """Datos de cotización inválidos"""
+
+
+def dia_calendario(fecha):
+    """Índice 0-364 de una fecha (date o 'AAAA-MM-DD'); el 29 de febrero usa la tarifa del 28"""
+    if isinstance(fecha, str):
+        try:
+            fecha = datetime.datetime.strptime(fecha, "%Y-%m-%d").date()
+        except ValueError:
+            raise CotizacionError(f"Fecha inválida: {fecha}")
+    if not isinstance(fecha, datetime.date):
+        raise CotizacionError(f"Fecha inválida: {fecha!r}")
+    if fecha.month == 2 and fecha.day == 29:
+        return 58
+    return datetime.date(2001, fecha.month, fecha.day).timetuple().tm_yday - 1
+
+def dia_mes(mes_dia):
+    """Índice 0-364 de un 'MM-DD' de las reglas de temporada"""
+    mes, dia = (int(parte) for parte in mes_dia.split("-"))
+    return dia_calendario(datetime.date(2001, mes, dia))
+
+def compilar_factores(reglas):
+    """Array (365,) de multiplicadores diarios a partir de reglas declarativas"""
+    factores = np.ones(DIAS_CALENDARIO, dtype=np.float64)
+    for regla in reglas:
+        desde, hasta = dia_mes(regla["desde"]), dia_mes(regla["hasta"])
+        if desde <= hasta:
+            factores[desde:hasta + 1] *= regla["multiplicador"]
+        else:
+            # El rango cruza el fin de año
+            factores[desde:] *= regla["multiplicador"]
+            factores[:hasta + 1] *= regla["multiplicador"]
+    return factores
+
+
+class MotorCotizaciones:
+    """Precios de los tours precalculados como arrays indexados por posición"""
+
+    def __init__(self, tours, temporadas=None):
+        self.paises = list(tours)
+        self.indice_pais = {pais: i for i, pais in enumerate(self.paises)}
+        self.precios_base = np.array([tours[pais]["precio_base"] for pais in self.paises], dtype=np.float64)
+
+        self.categorias = list(MULTIPLICADORES_CATEGORIA)
+        self.indice_categoria = {categoria: i for i, categoria in enumerate(self.categorias)}
+        # La última posición es la de una categoría desconocida (multiplicador 1.0)
+        self.multiplicadores = np.array(
+            [MULTIPLICADORES_CATEGORIA[c] for c in self.categorias] + [1.0], dtype=np.float64
+        )
+        self.compilar_temporadas(temporadas or {})
+
+    def compilar_temporadas(self, temporadas):
+        """Compila las reglas de temporada en las tablas de tarifas.
+
+        Se llama al arrancar y cada vez que cambian las reglas; las tablas se
+        sustituyen de una vez, así las peticiones en curso nunca ven una mezcla.
+        """
+        generales = temporadas.get("*", [])
+        factores = np.stack([
+            compilar_factores(generales + temporadas.get(pais, [])) for pais in self.paises
+        ]) if self.paises else np.ones((0, DIAS_CALENDARIO))
+
+        # Tarifa por persona y noche: (tour, categoría, día)
+        tarifa_noche = (self.precios_base[:, None, None] * self.multiplicadores[None, :, None]
+                        * factores[:, None, :] / 7)
+        # Suma acumulada sobre dos años seguidos para estancias que cruzan el 31 de diciembre
+        acumulado = np.zeros(tarifa_noche.shape[:2] + (2 * DIAS_CALENDARIO + 1,), dtype=np.float64)
+        np.cumsum(np.concatenate([tarifa_noche, tarifa_noche], axis=2), axis=2, out=acumulado[:, :, 1:])
+
+        self.temporadas = temporadas
+        self.factores, self.tarifa_noche, self.acumulado = factores, tarifa_noche, acumulado
+
+    def cotizar(self, pais, categoria, personas, noches, fecha=None):
+        """Precio de una sola combinación (mismas reglas que el cálculo por lotes)"""
+        if pais not in self.indice_pais:
+            raise CotizacionError(f"Tour no disponible: {pais}")
+        precios = self.cotizar_indices(
+            np.array([self.indice_pais[pais]]),
+            np.array([self.indice_categoria.get(categoria, len(self.categorias))]),
+            np.array([personas]),
+            np.array([noches]),
+            dias=None if not fecha else np.array([dia_calendario(fecha)])
+        )
+        return float(precios[0])
+
+    def cotizar_indices(self, idx_pais, idx_categoria, personas, noches, dias=None):
+        """Calcula los precios de arrays paralelos de índices, personas y noches.
+
+        `dias` (opcional) es el día de salida 0-364 de cada combinación, o -1
+        para cotizar sin fecha con la tarifa base.
+        """
+        personas = np.asarray(personas, dtype=np.float64)
+        noches = np.asarray(noches, dtype=np.float64)
+        # Evitar división por cero: noches no positivas cuentan como una semana
+        noches = np.where(noches <= 0, NOCHES_POR_DEFECTO, noches)
+        precios = self.precios_base[idx_pais] * self.multiplicadores[idx_categoria] * personas * (noches / 7)
+
+        if dias is not None:
+            dias = np.asarray(dias, dtype=np.int64)
+            con_fecha = dias >= 0
+            inicio = np.where(con_fecha, dias, 0)
+            anios, resto = np.divmod(noches.astype(np.int64), DIAS_CALENDARIO)
+            acumulado = self.acumulado
+            estancia = (anios * acumulado[idx_pais, idx_categoria, DIAS_CALENDARIO]
+                        + acumulado[idx_pais, idx_categoria, inicio + resto]
+                        - acumulado[idx_pais, idx_categoria, inicio])
+            precios = np.where(con_fecha, estancia * personas, precios)
+        return np.round(precios, 2)
+
+    def calendario(self, pais, noches=None):
+        """Tabla de 365 días por categoría para un tour.
+
+        Sin `noches` devuelve la tarifa por persona y noche de cada día; con
+        `noches` devuelve el precio por persona de una estancia que empieza ese día.
+        """
+        if pais not in self.indice_pais:
+            raise CotizacionError(f"Tour no disponible: {pais}")
+        i = self.indice_pais[pais]
+        if noches is None:
+            tabla = self.tarifa_noche[i]
+        else:
+            if noches <= 0:
+                raise CotizacionError("noches debe ser positivo")
+            anios, resto = divmod(noches, DIAS_CALENDARIO)
+            dias = np.arange(DIAS_CALENDARIO)
+            acumulado = self.acumulado[i]
+            tabla = (anios * acumulado[:, DIAS_CALENDARIO:DIAS_CALENDARIO + 1]
+                     + acumulado[:, dias + resto] - acumulado[:, dias])
+        tabla = np.round(tabla, 2)
+        return {categoria: tabla[j] for j, categoria in enumerate(self.categorias)}
+
+    def indices_paises(self, paises):
+        """Convierte claves de tour en índices; CotizacionError si alguna no existe"""
+        try:
+            return np.fromiter((self.indice_pais[p] for p in paises), dtype=np.intp, count=len(paises))
+        except KeyError as e:
+            raise CotizacionError(f"Tour no disponible: {e.args[0]}")
+        except TypeError:
+            # Un pais que no es hashable (lista, objeto JSON) no puede ser una clave de tour
+            raise CotizacionError("Cada pais debe ser la clave de un tour")
+
+    def indices_categorias(self, categorias):
+        """Convierte categorías en índices (las desconocidas usan multiplicador 1.0)"""
+        desconocida = len(self.categorias)
+        try:
+            return np.fromiter((self.indice_categoria.get(c, desconocida) for c in categorias),
+                               dtype=np.intp, count=len(categorias))
+        except TypeError:
+            raise CotizacionError("Cada categoria debe ser un texto")
+
+    def cotizar_combinaciones(self, combinaciones):
+        """Cotiza una lista de combinaciones {pais, categoria, personas, noches}"""
+        if len(combinaciones) > MAX_COMBINACIONES_LOTE:
+            raise CotizacionError(f"Máximo {MAX_COMBINACIONES_LOTE} combinaciones por lote")
+        try:
+            paises = [c["pais"] for c in combinaciones]
+            categorias = [c.get("categoria", "estandar") for c in combinaciones]
+            personas = np.array([c.get("personas", 1) for c in combinaciones], dtype=np.int64)
+            noches = np.array([c.get("noches", NOCHES_POR_DEFECTO) for c in combinaciones], dtype=np.int64)
+            fechas = [c.get("fecha") for c in combinaciones]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise CotizacionError("Cada combinación necesita pais y valores numéricos de personas y noches")
+
+        idx_pais = self.indices_paises(paises)
+        idx_categoria = self.indices_categorias(categorias)
+        dias = None
+        if any(fechas):
+            dias = np.fromiter((dia_calendario(f) if f else -1 for f in fechas),
+                               dtype=np.int64, count=len(fechas))
+        precios = self.cotizar_indices(idx_pais, idx_categoria, personas, noches, dias)
+        return {
+            "pais": paises,
+            "categoria": categorias,
+            "personas": personas,
+            "noches": noches,
+            "precio": precios
+        }
+
+    def cotizar_rejilla(self, paises=None, categorias=None, personas=(1, 10), noches=(3, 30), fecha=None):
+        """Cotiza el producto cartesiano completo sin bucles de Python.
+
+        `paises` y `categorias` son listas (None = todos); `personas` y
+        `noches` son rangos inclusivos (min, max); `fecha` es la salida común.
+        """
+        try:
+            paises = self.paises if paises is None else list(paises)
+            categorias = self.categorias if categorias is None else list(categorias)
+            min_personas, max_personas = int(personas[0]), int(personas[1])
+            min_noches, max_noches = int(noches[0]), int(noches[1])
+        except (TypeError, ValueError, IndexError):
+            raise CotizacionError("personas y noches deben ser rangos [min, max]")
+        if min_personas > max_personas or min_noches > max_noches:
+            raise CotizacionError("personas y noches deben ser rangos [min, max] con min <= max")
+
+        # El tamaño se calcula con enteros de Python antes de reservar ningún array:
+        # un rango enorme se rechaza aquí en lugar de agotar la memoria del worker
+        total = (len(paises) * len(categorias)
+                 * (max_personas - min_personas + 1) * (max_noches - min_noches + 1))
+        if total > MAX_COMBINACIONES_LOTE:
+            raise CotizacionError(f"Máximo {MAX_COMBINACIONES_LOTE} combinaciones por lote")
+        rango_personas = np.arange(min_personas, max_personas + 1, dtype=np.int64)
+        rango_noches = np.arange(min_noches, max_noches + 1, dtype=np.int64)
+
+        # Posiciones de cada eje de la rejilla, aplanadas a arrays paralelos
+        pos_pais, pos_categoria, p, n = (eje.ravel() for eje in np.meshgrid(
+            np.arange(len(paises)),
+            np.arange(len(categorias)),
+            rango_personas,
+            rango_noches,
+            indexing="ij"
+        ))
+        precios = self.cotizar_indices(
+            self.indices_paises(paises)[pos_pais],
+            self.indices_categorias(categorias)[pos_categoria],
+            p,
+            n,
+            dias=None if not fecha else np.full(len(p), dia_calendario(fecha), dtype=np.int64)
+        )
+        return {
+            "pais": np.array(paises, dtype=object)[pos_pais],
+            "categoria": np.array(categorias, dtype=object)[pos_categoria],
+            "personas": p,
+            "noches": n,
+            "precio": precios
+        }
+
+
+def columnas_json(resultado):
+    """Resultado columnar listo para jsonify (listas de Python, no arrays)"""
+    columnas = {col: np.asarray(resultado[col]).tolist() for col in COLUMNAS}
+    columnas["total"] = len(columnas["precio"])
+    return columnas
+
+def generar_csv(resultado, filas_por_bloque=5000):
+    """Genera el resultado como CSV en bloques, para enviarlo en streaming"""
+    columnas = [np.asarray(resultado[col]) for col in COLUMNAS]
+    total = len(columnas[-1])
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUMNAS)
+    for inicio in range(0, total, filas_por_bloque):
+        fin = inicio + filas_por_bloque
+        escritor.writerows(zip(*(c[inicio:fin].tolist() for c in columnas)))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if total == 0:
+        yield buffer.getvalue()
@@ -0,0 +1,524 @@
+"""Importación y exportación masiva de destinos, itinerarios y usuarios.
+
+Las validaciones de los formularios viven aquí (validar_destino,
+validar_itinerario, validar_usuario): las usan las rutas de la aplicación y
+también la importación, así que una fila del fichero se acepta o se rechaza
+con los mismos criterios que el formulario equivalente.
+
+Formatos: NDJSON (un documento por línea, el mismo que genera la API con
+serializacion.py) y CSV (listas separadas por "|" y las actividades como
+JSON en su columna). Se elige por la extensión o con --formato; "-" es la
+entrada o la salida estándar.
+
+    flask --app app datos export destinos destinos.ndjson
+    flask --app app datos export itinerarios - --usuario ana@ejemplo.com --formato csv
+    flask --app app datos import destinos socio.csv --rechazos rechazos.ndjson
+    flask --app app datos import itinerarios copia.ndjson --usuario ana@ejemplo.com
+
+La exportación recorre un cursor por lotes y escribe documento a documento
+(memoria constante). Los itinerarios incluyen por defecto los de
+`itinerarios_archivo` (llevan fecha_archivado; --sin-archivados los omite).
+Al importarlos vuelven a la colección principal y el siguiente
+`flask archivo ejecutar` los archiva de nuevo. La importación valida y escribe con
+insert_many(ordered=False) en lotes de --lote filas: un duplicado u otra
+fila rechazada no detiene el resto, y cada rechazo se informa con su número
+de línea. Los workers recogen los destinos nuevos cuando caducan su caché y
+su índice de búsqueda (CACHE_DESTINOS_TTL, REINDEXAR_CADA).
+"""
+import csv
+import datetime
+import io
+import itertools
+import json
+import re
+
+import click
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from flask.cli import AppGroup
+from pymongo.errors import BulkWriteError
+from werkzeug.http import parse_date
+from werkzeug.security import generate_password_hash
+
+from rutas import RutaError, ordenar_paradas
+from serializacion import a_json, linea_ndjson, valor_json
+
+TAMANO_LOTE_DATOS = 1000
+COLECCIONES = ("destinos", "itinerarios", "usuarios")
+ESTADOS_ITINERARIO = {"planificando", "confirmado", "en_progreso", "activo", "completado"}
+PRIORIDADES = {"alta", "media", "baja"}
+# Hash de werkzeug ya calculado (exportado con --con-contrasenas): se conserva tal cual
+_HASH_CONTRASENA = re.compile(r"^(scrypt|pbkdf2):[^$]+\$[^$]+\$[0-9a-f]+$")
+
+# Columnas de cada colección en CSV (en NDJSON va el documento completo)
+COLUMNAS_CSV = {
+    "destinos": ["_id", "nombre", "pais", "ciudad", "mejor_epoca", "presupuesto", "actividades",
+                 "descripcion", "imagen", "calificacion"],
+    "itinerarios": ["_id", "usuario_id", "nombre_viaje", "descripcion", "paises", "ciudades",
+                    "fecha_inicio", "fecha_fin", "presupuesto_total", "presupuesto_restante", "estado",
+                    "prioridad", "favorito", "actividades", "fecha_creacion", "fecha_actualizacion",
+                    "fecha_archivado"],
+    "usuarios": ["_id", "nombre", "email", "tipo_usuario", "pais_interes", "presupuesto", "fecha_registro"],
+}
+
+
+class ValidacionError(ValueError):
+    """Formulario o fila de importación que no pasa las validaciones"""
+
+
+# ========== VALIDACIONES (formularios e importación) ==========
+
+def texto(campos, clave):
+    valor = campos.get(clave)
+    return str(valor).strip() if valor is not None else ""
+
+def validar_destino(campos):
+    """Documento de un destino nuevo a partir de los campos del formulario /new"""
+    nombre = texto(campos, "nombre")
+    pais = texto(campos, "pais")
+    descripcion = texto(campos, "descripcion")
+    if not nombre or not pais or not descripcion:
+        raise ValidacionError("Completa todos los campos obligatorios: Nombre, País y Descripción")
+    try:
+        presupuesto = float(campos.get("presupuesto", 0) or 0)
+        calificacion = int(campos.get("calificacion", 3))
+    except (TypeError, ValueError):
+        raise ValidacionError("El presupuesto y la calificación deben ser números")
+    return {
+        "nombre": nombre,
+        "pais": pais,
+        "ciudad": texto(campos, "ciudad"),
+        "mejor_epoca": campos.get("mejor_epoca", "Todo el año"),
+        "presupuesto": presupuesto,
+        "actividades": texto(campos, "actividades"),
+        "descripcion": descripcion,
+        "imagen": texto(campos, "imagen"),
+        "calificacion": calificacion
+    }
+
+def validar_itinerario(campos, paises, usuario_id, ahora=None):
+    """Documento de un itinerario nuevo (sin actividades) como lo crea /crear-itinerario"""
+    nombre_viaje = texto(campos, "nombre_viaje")
+    fecha_inicio = campos.get("fecha_inicio")
+    fecha_fin = campos.get("fecha_fin")
+    try:
+        presupuesto_total = float(campos.get("presupuesto_total", 0) or 0)
+    except (TypeError, ValueError):
+        raise ValidacionError("El presupuesto debe ser un número")
+
+    if not nombre_viaje or not fecha_inicio or not fecha_fin:
+        raise ValidacionError("Nombre del viaje y fechas son obligatorios")
+    try:
+        duracion_dias = (datetime.datetime.strptime(fecha_fin, "%Y-%m-%d")
+                         - datetime.datetime.strptime(fecha_inicio, "%Y-%m-%d")).days
+    except (TypeError, ValueError):
+        raise ValidacionError("Las fechas deben tener el formato AAAA-MM-DD")
+    if duracion_dias <= 0:
+        raise ValidacionError("La fecha fin debe ser posterior a la fecha inicio")
+    if not paises:
+        raise ValidacionError("Selecciona al menos un país")
+
+    # Países en el orden que minimiza la distancia recorrida
+    try:
+        ruta = ordenar_paradas(paises)
+    except RutaError as e:
+        raise ValidacionError(str(e))
+
+    ahora = ahora or datetime.datetime.utcnow()
+    return {
+        "usuario_id": usuario_id,
+        "nombre_viaje": nombre_viaje,
+        "descripcion": texto(campos, "descripcion"),
+        "paises": ruta["paradas"],
+        "ruta_km": ruta["distancia_km"],
+        "ciudades": [],
+        "fecha_inicio": fecha_inicio,
+        "fecha_fin": fecha_fin,
+        "duracion_dias": duracion_dias,
+        "presupuesto_total": presupuesto_total,
+        "presupuesto_restante": presupuesto_total,
+        "actividades": [],
+        "actividades_total": 0,
+        "actividades_completadas": 0,
+        "transportes": [],
+        "estado": "planificando",
+        "fecha_creacion": ahora,
+        "fecha_actualizacion": ahora,
+        "prioridad": "media",
+        "favorito": False
+    }
+
+def validar_usuario(campos, hash_contrasena=None, ahora=None):
+    """Documento de un usuario nuevo como lo crea /register (hash_contrasena: uno ya calculado)"""
+    nombre = texto(campos, "nombre")
+    email = texto(campos, "email").lower()
+    password = texto(campos, "password")
+    if not nombre or not email or not (password or hash_contrasena):
+        raise ValidacionError("Todos los campos son obligatorios")
+    if hash_contrasena is None and len(password) < 6:
+        raise ValidacionError("La contraseña debe tener al menos 6 caracteres")
+    try:
+        presupuesto = float(campos.get("presupuesto", 0) or 0)
+    except (TypeError, ValueError):
+        raise ValidacionError("El presupuesto debe ser un número")
+    return {
+        "nombre": nombre,
+        "email": email,
+        "password": hash_contrasena or generate_password_hash(password),
+        "tipo_usuario": campos.get("tipo_usuario", "viajero"),
+        "pais_interes": campos.get("pais_interes", ""),
+        "presupuesto": presupuesto,
+        "fecha_registro": ahora or datetime.datetime.utcnow()
+    }
+
+
+# ========== CONVERSIÓN DE FILAS ==========
+
+def identificador(valor):
+    """ObjectId de un campo importado (texto en NDJSON y CSV)"""
+    try:
+        return ObjectId(valor)
+    except (InvalidId, TypeError):
+        raise ValidacionError(f"Identificador inválido: {valor}")
+
+def fecha(valor):
+    """Fecha importada: formato HTTP (el que exporta serializacion.py) o ISO 8601, en UTC sin zona"""
+    if isinstance(valor, datetime.datetime):
+        resultado = valor
+    else:
+        resultado = parse_date(valor)
+        if resultado is None:
+            try:
+                resultado = datetime.datetime.fromisoformat(valor)
+            except (TypeError, ValueError):
+                raise ValidacionError(f"Fecha inválida: {valor}")
+    if resultado.tzinfo is not None:
+        resultado = resultado.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return resultado
+
+def lista(valor):
+    """Lista importada: lista JSON o texto separado por "|" (CSV)"""
+    if isinstance(valor, list):
+        return valor
+    return [parte.strip() for parte in str(valor or "").split("|") if parte.strip()]
+
+def booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    return str(valor).strip().lower() in ("1", "true", "si", "sí", "yes")
+
+def presente(fila, clave):
+    return fila.get(clave) not in (None, "")
+
+def actividad_importada(actividad):
+    """Actividad de un itinerario importado, con los tipos que escriben las rutas"""
+    if not isinstance(actividad, dict):
+        raise ValidacionError("Cada actividad debe ser un objeto")
+    try:
+        costo = float(actividad.get("costo", 0) or 0)
+    except (TypeError, ValueError):
+        raise ValidacionError("El costo de una actividad debe ser un número")
+    return {
+        "_id": identificador(actividad["_id"]) if presente(actividad, "_id") else ObjectId(),
+        "pais": texto(actividad, "pais"),
+        "ciudad": texto(actividad, "ciudad"),
+        "actividad": texto(actividad, "actividad"),
+        "tipo": actividad.get("tipo") or "cultural",
+        "costo": costo,
+        "fecha": texto(actividad, "fecha"),
+        "descripcion": texto(actividad, "descripcion"),
+        "completada": booleano(actividad.get("completada", False)),
+        "fecha_creacion": fecha(actividad["fecha_creacion"]) if presente(actividad, "fecha_creacion")
+                          else datetime.datetime.utcnow()
+    }
+
+def destino_importado(fila, contexto):
+    destino = validar_destino(fila)
+    if presente(fila, "_id"):
+        destino["_id"] = identificador(fila["_id"])
+    return destino
+
+def itinerario_importado(fila, contexto):
+    usuario_id = contexto.get("usuario_id")
+    if usuario_id is None:
+        if not presente(fila, "usuario_id"):
+            raise ValidacionError("Falta usuario_id (o indica --usuario)")
+        usuario_id = identificador(fila["usuario_id"])
+    itinerario = validar_itinerario(fila, lista(fila.get("paises")), usuario_id, contexto["ahora"])
+
+    # Lo que el formulario no pide pero una copia de seguridad sí conserva
+    if presente(fila, "_id"):
+        itinerario["_id"] = identificador(fila["_id"])
+    if presente(fila, "estado"):
+        if fila["estado"] not in ESTADOS_ITINERARIO:
+            raise ValidacionError(f"Estado desconocido: {fila['estado']}")
+        itinerario["estado"] = fila["estado"]
+    if presente(fila, "prioridad"):
+        if fila["prioridad"] not in PRIORIDADES:
+            raise ValidacionError(f"Prioridad desconocida: {fila['prioridad']}")
+        itinerario["prioridad"] = fila["prioridad"]
+    if presente(fila, "favorito"):
+        itinerario["favorito"] = booleano(fila["favorito"])
+    if presente(fila, "ciudades"):
+        itinerario["ciudades"] = lista(fila["ciudades"])
+    if presente(fila, "actividades"):
+        actividades = fila["actividades"]
+        if isinstance(actividades, str):
+            try:
+                actividades = json.loads(actividades)
+            except ValueError:
+                raise ValidacionError("La columna actividades no es JSON válido")
+        if not isinstance(actividades, list):
+            raise ValidacionError("actividades debe ser una lista")
+        itinerario["actividades"] = [actividad_importada(a) for a in actividades]
+    # Los contadores y el presupuesto restante se derivan de las actividades, como en las rutas
+    itinerario["actividades_total"] = len(itinerario["actividades"])
+    itinerario["actividades_completadas"] = sum(a["completada"] for a in itinerario["actividades"])
+    itinerario["presupuesto_restante"] = (
+        itinerario["presupuesto_total"] - sum(a["costo"] for a in itinerario["actividades"]))
+    for campo in ("fecha_creacion", "fecha_actualizacion"):
+        if presente(fila, campo):
+            itinerario[campo] = fecha(fila[campo])
+    return itinerario
+
+def usuario_importado(fila, contexto):
+    hash_contrasena = fila.get("password") if _HASH_CONTRASENA.match(str(fila.get("password") or "")) else None
+    usuario = validar_usuario(fila, hash_contrasena, contexto["ahora"])
+    if presente(fila, "_id"):
+        usuario["_id"] = identificador(fila["_id"])
+    if presente(fila, "fecha_registro"):
+        usuario["fecha_registro"] = fecha(fila["fecha_registro"])
+    return usuario
+
+CONVERSORES = {
+    "destinos": destino_importado,
+    "itinerarios": itinerario_importado,
+    "usuarios": usuario_importado,
+}
+
+
+# ========== LECTURA Y ESCRITURA ==========
+
+def formato_de(ruta, formato=None):
+    """Formato explícito o deducido de la extensión del fichero"""
+    if formato:
+        return formato
+    return "csv" if str(ruta).lower().endswith(".csv") else "ndjson"
+
+def leer_filas(entrada, formato):
+    """Genera (número de línea, fila o None, error o None) de un fichero de texto"""
+    if formato == "csv":
+        lector = csv.DictReader(entrada)
+        for fila in lector:
+            yield lector.line_num, fila, None
+        return
+    for numero, linea in enumerate(entrada, 1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError as e:
+            yield numero, None, f"JSON inválido: {e}"
+            continue
+        if isinstance(fila, dict):
+            yield numero, fila, None
+        else:
+            yield numero, None, "Cada línea debe ser un objeto JSON"
+
+def celda_csv(valor):
+    """Valor de un documento como celda de CSV"""
+    if valor is None:
+        return ""
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    if isinstance(valor, (str, int, float)):
+        return valor
+    if isinstance(valor, list) and all(isinstance(v, str) for v in valor):
+        return "|".join(valor)
+    if isinstance(valor, (list, dict)):
+        return a_json(valor)
+    return valor_json(valor)
+
+def exportar(db, coleccion, salida, formato="ndjson", filtro=None, proyeccion=None,
+             tamano_lote=TAMANO_LOTE_DATOS, incluir_archivados=False):
+    """Escribe la colección en `salida` (binaria) documento a documento; devuelve cuántos.
+
+    Con `incluir_archivados` los itinerarios de `itinerarios_archivo` van
+    detrás de los de la colección principal.
+    """
+    colecciones = [coleccion]
+    if incluir_archivados and coleccion == "itinerarios":
+        colecciones.append("itinerarios_archivo")
+    # Un cursor detrás de otro: el del archivo no se abre hasta terminar el primero
+    cursor = itertools.chain.from_iterable(
+        db[nombre].find(filtro or {}, proyeccion).sort("_id", 1).batch_size(tamano_lote) for nombre in colecciones
+    )
+    total = 0
+    if formato == "csv":
+        columnas = COLUMNAS_CSV[coleccion] + (["password"] if proyeccion is None and coleccion == "usuarios" else [])
+        texto_salida = io.TextIOWrapper(salida, encoding="utf-8", newline="", write_through=True)
+        escritor = csv.writer(texto_salida)
+        escritor.writerow(columnas)
+        for documento in cursor:
+            escritor.writerow([celda_csv(documento.get(columna)) for columna in columnas])
+            total += 1
+        texto_salida.detach()
+        return total
+    for documento in cursor:
+        salida.write(linea_ndjson(documento))
+        total += 1
+    return total
+
+def importar(db, coleccion, filas, tamano_lote=TAMANO_LOTE_DATOS, usuario_id=None, al_rechazar=None,
+             ahora=None):
+    """Valida e inserta las filas por lotes con insert_many(ordered=False).
+
+    `filas` es lo que genera leer_filas; `al_rechazar(linea, motivo, fila)` recibe
+    cada fila rechazada (por validación o por MongoDB, p. ej. un duplicado).
+    Devuelve {"leidas", "insertadas", "rechazadas"}.
+    """
+    convertir = CONVERSORES[coleccion]
+    contexto = {"usuario_id": usuario_id, "ahora": ahora or datetime.datetime.utcnow()}
+    resultado = {"leidas": 0, "insertadas": 0, "rechazadas": 0}
+    usuarios_conocidos = set()
+    usuarios_afectados = set()
+
+    def rechazar(linea, motivo, fila):
+        resultado["rechazadas"] += 1
+        if al_rechazar is not None:
+            al_rechazar(linea, motivo, fila)
+
+    def escribir(lote):
+        if coleccion == "itinerarios":
+            # Un solo viaje a MongoDB por lote para comprobar que los usuarios existen
+            nuevos = {doc["usuario_id"] for _, _, doc in lote} - usuarios_conocidos
+            if nuevos:
+                usuarios_conocidos.update(u["_id"] for u in db.usuarios.find({"_id": {"$in": list(nuevos)}}, {"_id": 1}))
+            for linea, fila, doc in [e for e in lote if e[2]["usuario_id"] not in usuarios_conocidos]:
+                rechazar(linea, f"Usuario inexistente: {doc['usuario_id']}", fila)
+            lote = [e for e in lote if e[2]["usuario_id"] in usuarios_conocidos]
+            # El índice único de _id no ve el archivo: sin esto habría copia caliente y fría
+            con_id = [doc["_id"] for _, _, doc in lote if "_id" in doc]
+            archivados = set()
+            if con_id:
+                archivados = {it["_id"] for it in db.itinerarios_archivo.find({"_id": {"$in": con_id}}, {"_id": 1})}
+            for linea, fila, doc in [e for e in lote if e[2].get("_id") in archivados]:
+                rechazar(linea, "Duplicado (archivado)", fila)
+            lote = [e for e in lote if e[2].get("_id") not in archivados]
+        if not lote:
+            return
+        try:
+            db[coleccion].insert_many([doc for _, _, doc in lote], ordered=False)
+            insertados = list(range(len(lote)))
+        except BulkWriteError as e:
+            fallidos = {error["index"] for error in e.details["writeErrors"]}
+            for error in e.details["writeErrors"]:
+                linea, fila, _ = lote[error["index"]]
+                rechazar(linea, "Duplicado" if error.get("code") == 11000 else error.get("errmsg"), fila)
+            insertados = [i for i in range(len(lote)) if i not in fallidos]
+        resultado["insertadas"] += len(insertados)
+        if coleccion == "itinerarios":
+            usuarios_afectados.update(lote[i][2]["usuario_id"] for i in insertados)
+
+    lote = []
+    for linea, fila, error in filas:
+        resultado["leidas"] += 1
+        if error is not None:
+            rechazar(linea, error, fila)
+            continue
+        try:
+            lote.append((linea, fila, convertir(fila, contexto)))
+        except ValidacionError as e:
+            rechazar(linea, str(e), fila)
+            continue
+        if len(lote) >= tamano_lote:
+            escribir(lote)
+            lote = []
+    escribir(lote)
+
+    if usuarios_afectados:
+        # Lo importado no está en las estadísticas materializadas ni en el mapa cacheado:
+        # las revisiones nuevas obligan a recalcularlos
+        db.usuarios.update_many({"_id": {"$in": list(usuarios_afectados)}},
+                                {"$inc": {"rev_estadisticas": 1, "rev_itinerarios": 1}})
+    return resultado
+
+
+# ========== COMANDOS FLASK ==========
+
+def registrar_comandos_datos(app, obtener_db):
+    """Registra el grupo `flask datos` en la aplicación"""
+    datos_cli = AppGroup("datos", help="Importación y exportación masiva (NDJSON o CSV)")
+
+    def base_de_datos():
+        db = obtener_db()
+        if db is None:
+            raise click.ClickException("Base de datos no disponible")
+        return db
+
+    def usuario_por_email(db, email):
+        usuario = db.usuarios.find_one({"email": email.strip().lower()}, {"_id": 1})
+        if usuario is None:
+            raise click.ClickException(f"No existe el usuario {email}")
+        return usuario["_id"]
+
+    @datos_cli.command("export")
+    @click.argument("coleccion", type=click.Choice(COLECCIONES))
+    @click.argument("salida", default="-")
+    @click.option("--formato", type=click.Choice(["ndjson", "csv"]), help="Por defecto, según la extensión")
+    @click.option("--usuario", help="Solo los itinerarios de este email")
+    @click.option("--con-contrasenas", is_flag=True,
+                  help="Incluye el hash de la contraseña (sin él los usuarios no se pueden reimportar)")
+    @click.option("--con-archivados/--sin-archivados", default=True, show_default=True,
+                  help="Itinerarios: incluye los de itinerarios_archivo")
+    @click.option("--lote", default=TAMANO_LOTE_DATOS, show_default=True, help="Documentos por lote del cursor")
+    def exportar_comando(coleccion, salida, formato, usuario, con_contrasenas, con_archivados, lote):
+        """Exporta una colección en streaming"""
+        db = base_de_datos()
+        filtro = {"usuario_id": usuario_por_email(db, usuario)} if usuario and coleccion == "itinerarios" else None
+        proyeccion = None
+        if coleccion == "usuarios":
+            proyeccion = None if con_contrasenas else {
+                "password": 0, "estadisticas": 0, "estadisticas_rev": 0, "rev_estadisticas": 0,
+                "rev_itinerarios": 0}
+        with click.open_file(salida, "wb") as fichero:
+            total = exportar(db, coleccion, fichero, formato_de(salida, formato), filtro, proyeccion, lote,
+                             incluir_archivados=con_archivados)
+        click.echo(f"✅ {total} documentos de {coleccion} exportados", err=True)
+
+    @datos_cli.command("import")
+    @click.argument("coleccion", type=click.Choice(COLECCIONES))
+    @click.argument("entrada", default="-")
+    @click.option("--formato", type=click.Choice(["ndjson", "csv"]), help="Por defecto, según la extensión")
+    @click.option("--usuario", help="Asigna los itinerarios a este email (si no, usuario_id de cada fila)")
+    @click.option("--lote", default=TAMANO_LOTE_DATOS, show_default=True, help="Filas por insert_many")
+    @click.option("--rechazos", help="Fichero NDJSON donde guardar las filas rechazadas")
+    def importar_comando(coleccion, entrada, formato, usuario, lote, rechazos):
+        """Valida e importa un fichero a una colección"""
+        db = base_de_datos()
+        usuario_id = usuario_por_email(db, usuario) if usuario and coleccion == "itinerarios" else None
+        fichero_rechazos = click.open_file(rechazos, "wb") if rechazos else None
+        mostrados = []
+
+        def al_rechazar(linea, motivo, fila):
+            if fichero_rechazos is not None:
+                fichero_rechazos.write(linea_ndjson({"linea": linea, "motivo": motivo, "fila": fila}))
+            if len(mostrados) < 10:
+                mostrados.append(f"   línea {linea}: {motivo}")
+
+        with click.open_file(entrada, "rb") as fichero:
+            # utf-8-sig: los CSV guardados desde una hoja de cálculo suelen llevar BOM
+            texto_entrada = io.TextIOWrapper(fichero, encoding="utf-8-sig", newline="")
+            resultado = importar(db, coleccion, leer_filas(texto_entrada, formato_de(entrada, formato)),
+                                 lote, usuario_id, al_rechazar)
+        if fichero_rechazos is not None:
+            fichero_rechazos.close()
+
+        click.echo(f"✅ {resultado['insertadas']} de {resultado['leidas']} filas importadas en {coleccion}")
+        if resultado["rechazadas"]:
+            click.echo(f"⚠️ {resultado['rechazadas']} filas rechazadas"
+                       + (f" (detalle en {rechazos})" if rechazos else ""))
+            for mensaje in mostrados:
+                click.echo(mensaje)
+
+    app.cli.add_command(datos_cli)
@@ -0,0 +1,74 @@
+"""Caché de fragmentos HTML de las plantillas por versión del itinerario.
+
+Las tarjetas del planificador y la lista de actividades de un itinerario
+solo cambian cuando cambia el documento, y todas las rutas que lo modifican
+actualizan `fecha_actualizacion`. La etiqueta
+
+    {% fragmento "tarjeta", itinerario %} ... {% endfragmento %}
+
+guarda el HTML del bloque bajo (plantilla, nombre, _id, fecha_actualizacion):
+tras una escritura la clave es otra y el bloque se vuelve a renderizar, sin
+invalidaciones explícitas. Las versiones viejas salen por LRU o por TTL. Un
+documento sin `fecha_actualizacion` (anterior a ese campo) no se cachea.
+
+Además las plantillas compiladas se guardan en disco (bytecode de Jinja),
+así que un worker nuevo no vuelve a compilar las plantillas grandes.
+"""
+import os
+from collections.abc import Mapping
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+
+def clave_fragmento(plantilla, nombre, documento):
+    """Clave del fragmento para un documento, o None si no se puede versionar"""
+    if isinstance(documento, Mapping):
+        oid, fecha = documento.get("_id"), documento.get("fecha_actualizacion")
+    else:
+        oid, fecha = getattr(documento, "_id", None), getattr(documento, "fecha_actualizacion", None)
+    if oid is None or fecha is None:
+        return None
+    return f"{plantilla}:{nombre}:{oid}:{fecha.isoformat()}"
+
+
+class FragmentosExtension(Extension):
+    """Etiqueta {% fragmento nombre, documento %} ... {% endfragmento %}"""
+
+    tags = {"fragmento"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        # Sin caché asignada los fragmentos se renderizan siempre (p. ej. en el benchmark)
+        environment.extend(cache_fragmentos=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        nombre = parser.parse_expression()
+        parser.stream.expect("comma")
+        documento = parser.parse_expression()
+        cuerpo = parser.parse_statements(("name:endfragmento",), drop_needle=True)
+        argumentos = [nodes.Const(parser.name), nombre, documento]
+        return nodes.CallBlock(self.call_method("_renderizar", argumentos), [], [], cuerpo).set_lineno(lineno)
+
+    def _renderizar(self, plantilla, nombre, documento, caller):
+        cache = self.environment.cache_fragmentos
+        clave = clave_fragmento(plantilla, nombre, documento) if cache is not None else None
+        if clave is None:
+            return caller()
+        html = cache.obtener(clave)
+        if html is None:
+            html = caller()
+            cache.guardar(clave, html)
+        return html
+
+
+def configurar_plantillas(app, cache_fragmentos, directorio_bytecode=None):
+    """Registra la etiqueta de fragmentos y la caché de bytecode en el entorno Jinja de la app"""
+    entorno = app.jinja_env
+    entorno.add_extension(FragmentosExtension)
+    entorno.cache_fragmentos = cache_fragmentos
+    if directorio_bytecode:
+        os.makedirs(directorio_bytecode, exist_ok=True)
+    # Sin directorio, Jinja usa uno privado del usuario dentro del directorio temporal
+    entorno.bytecode_cache = FileSystemBytecodeCache(directorio_bytecode)
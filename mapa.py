@@ -0,0 +1,162 @@
+"""GeoJSON del mapa del planificador con agrupación (clustering) en el servidor.
+
+MongoDB agrega las actividades del usuario por (país, ciudad) y los países
+por número de itinerarios, así que lo que llega a Python es como mucho una
+fila por lugar distinto, no una por actividad. Los lugares se sitúan con
+COORDENADAS_CIUDADES (o con el centro del país si la ciudad no está en el
+catálogo) y se agrupan para cada nivel de zoom en una rejilla de
+RADIO_CLUSTER_PX píxeles en proyección Web Mercator.
+
+Cada feature lleva `zoom_min` y `zoom_max`: el cliente pinta las que
+contienen su zoom actual. Un grupo que no cambia entre niveles consecutivos
+se emite una sola vez, así que la respuesta crece con los lugares distintos,
+no con el número de itinerarios o de actividades.
+"""
+import hashlib
+import math
+
+import numpy as np
+
+from busqueda import normalizar
+from catalogo import COORDENADAS_CIUDADES, COORDENADAS_PAISES
+from serializacion import a_json
+
+ZOOM_MIN = 2
+ZOOM_MAX = 12
+RADIO_CLUSTER_PX = 60
+TAMANO_TESELA = 256
+
+_CIUDADES = {normalizar(nombre): datos for nombre, datos in COORDENADAS_CIUDADES.items()}
+_PAISES = {normalizar(nombre): (nombre, datos) for nombre, datos in COORDENADAS_PAISES.items()}
+
+
+def pipeline_mapa(usuario_id):
+    """Agregación que resume los países y los lugares de actividad de un usuario"""
+    return [
+        {"$match": {"usuario_id": usuario_id}},
+        {"$facet": {
+            "paises": [
+                {"$project": {"paises": 1}},
+                {"$unwind": "$paises"},
+                {"$group": {"_id": "$paises", "itinerarios": {"$sum": 1}}},
+            ],
+            "lugares": [
+                {"$project": {"actividades.pais": 1, "actividades.ciudad": 1, "actividades.completada": 1}},
+                {"$unwind": "$actividades"},
+                # Primero por itinerario para poder contar en cuántos aparece cada lugar
+                {"$group": {
+                    "_id": {"it": "$_id", "pais": "$actividades.pais", "ciudad": "$actividades.ciudad"},
+                    "total": {"$sum": 1},
+                    "completadas": {"$sum": {"$cond": ["$actividades.completada", 1, 0]}},
+                }},
+                {"$group": {
+                    "_id": {"pais": "$_id.pais", "ciudad": "$_id.ciudad"},
+                    "total": {"$sum": "$total"},
+                    "completadas": {"$sum": "$completadas"},
+                    "itinerarios": {"$sum": 1},
+                }},
+            ],
+        }},
+    ]
+
+def ubicar(pais, ciudad):
+    """(lat, lng, aproximada) de un lugar, o None si ni la ciudad ni el país son conocidos"""
+    datos = _CIUDADES.get(normalizar(ciudad))
+    if datos is not None and (not pais or normalizar(datos["pais"]) == normalizar(pais)):
+        return datos["lat"], datos["lng"], False
+    encontrado = _PAISES.get(normalizar(pais))
+    if encontrado is not None:
+        return encontrado[1]["lat"], encontrado[1]["lng"], True
+    return None
+
+def mercator(latitudes, longitudes):
+    """Coordenadas en píxeles a zoom 0 (proyección Web Mercator)"""
+    lat = np.radians(np.clip(latitudes, -85.05112878, 85.05112878))
+    x = (np.asarray(longitudes) + 180.0) / 360.0 * TAMANO_TESELA
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * TAMANO_TESELA
+    return x, y
+
+def agrupar(puntos):
+    """Grupos de cada nivel de zoom: lista de (zoom_min, zoom_max, índices de los puntos)"""
+    if not puntos:
+        return []
+    x, y = mercator(np.array([p["lat"] for p in puntos]), np.array([p["lng"] for p in puntos]))
+    grupos, abiertos = [], {}
+    for zoom in range(ZOOM_MIN, ZOOM_MAX + 1):
+        escala = 2 ** zoom / RADIO_CLUSTER_PX
+        celdas = np.stack([np.floor(x * escala), np.floor(y * escala)], axis=1)
+        _, grupo = np.unique(celdas, axis=0, return_inverse=True)
+        grupo = grupo.ravel()
+        orden = np.argsort(grupo, kind="stable")
+        cortes = np.flatnonzero(np.diff(grupo[orden])) + 1
+        actuales = {}
+        for indices in np.split(orden, cortes):
+            miembros = tuple(indices.tolist())
+            if miembros in abiertos:
+                # Mismo grupo que en el zoom anterior: se alarga su rango
+                abiertos[miembros][1] = zoom
+                actuales[miembros] = abiertos[miembros]
+            else:
+                actuales[miembros] = [zoom, zoom, miembros]
+                grupos.append(actuales[miembros])
+        abiertos = actuales
+    return [tuple(g) for g in grupos]
+
+def feature(lat, lng, propiedades):
+    """Feature GeoJSON de un punto (GeoJSON usa el orden lng, lat)"""
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [round(lng, 5), round(lat, 5)]},
+            "properties": propiedades}
+
+def construir_mapa(resumen):
+    """FeatureCollection a partir del resultado de pipeline_mapa (o de un resumen vacío)"""
+    itinerarios_pais = {fila["_id"]: fila["itinerarios"] for fila in resumen.get("paises", [])}
+    features = []
+
+    # Todos los países del catálogo, sin agrupar: son los que se seleccionan en el mapa
+    for nombre, datos in COORDENADAS_PAISES.items():
+        features.append(feature(datos["lat"], datos["lng"], {
+            "tipo": "pais", "nombre": nombre, "itinerarios": itinerarios_pais.get(nombre, 0),
+            "zoom_min": ZOOM_MIN, "zoom_max": ZOOM_MAX,
+        }))
+
+    # Las variantes de un mismo lugar ("Tokio", "tokio") se funden en un punto
+    por_ubicacion, sin_ubicacion = {}, 0
+    for fila in sorted(resumen.get("lugares", []), key=lambda f: -f["total"]):
+        pais, ciudad = fila["_id"].get("pais"), fila["_id"].get("ciudad")
+        ubicacion = ubicar(pais, ciudad)
+        if ubicacion is None:
+            sin_ubicacion += fila["total"]
+            continue
+        lat, lng, aproximada = ubicacion
+        punto = por_ubicacion.setdefault((lat, lng), {
+            "lat": lat, "lng": lng, "pais": pais, "ciudad": ciudad, "aproximada": aproximada,
+            "total": 0, "completadas": 0, "itinerarios": 0})
+        punto["total"] += fila["total"]
+        punto["completadas"] += fila["completadas"]
+        punto["itinerarios"] += fila["itinerarios"]
+    puntos = list(por_ubicacion.values())
+
+    for zoom_min, zoom_max, miembros in agrupar(puntos):
+        grupo = [puntos[i] for i in miembros]
+        total = sum(p["total"] for p in grupo)
+        propiedades = {"zoom_min": zoom_min, "zoom_max": zoom_max, "total": total,
+                       "completadas": sum(p["completadas"] for p in grupo)}
+        if len(grupo) == 1:
+            punto = grupo[0]
+            propiedades.update(tipo="lugar", pais=punto["pais"], ciudad=punto["ciudad"],
+                               itinerarios=punto["itinerarios"], aproximada=punto["aproximada"])
+            features.append(feature(punto["lat"], punto["lng"], propiedades))
+        else:
+            # Centro ponderado por número de actividades
+            lat = sum(p["lat"] * p["total"] for p in grupo) / total
+            lng = sum(p["lng"] * p["total"] for p in grupo) / total
+            propiedades.update(tipo="grupo", lugares=len(grupo))
+            features.append(feature(lat, lng, propiedades))
+
+    return {"type": "FeatureCollection", "features": features, "zoom_min": ZOOM_MIN, "zoom_max": ZOOM_MAX,
+            "sin_ubicacion": sin_ubicacion}
+
+def mapa_serializado(resumen):
+    """(cuerpo JSON, ETag) del mapa, listos para guardar en caché"""
+    cuerpo = a_json(construir_mapa(resumen)).encode("utf-8")
+    return cuerpo, hashlib.sha1(cuerpo).hexdigest()[:20]
@@ -0,0 +1,341 @@
+"""Métricas de latencia por ruta y de comandos de MongoDB en formato Prometheus.
+
+Cada worker acumula sus métricas en memoria: los hooks de Flask miden cada
+petición, las señales de Jinja el tiempo de render y los listeners de
+pymongo los comandos y el pool de conexiones. Periódicamente el worker
+vuelca una instantánea en METRICAS_DIR (un fichero por pid); /metrics suma
+las instantáneas de todos los workers, así el resultado no depende de qué
+worker atienda el scrape.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from pymongo import monitoring
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_COMANDOS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# nombre: (tipo, ayuda, buckets)
+METRICAS = {
+    "travelasia_http_peticiones_total":
+        ("counter", "Peticiones HTTP atendidas", None),
+    "travelasia_http_peticion_segundos":
+        ("histogram", "Latencia total de cada petición por endpoint", BUCKETS_LATENCIA),
+    "travelasia_http_peticion_mongodb_segundos":
+        ("histogram", "Tiempo de cada petición esperando a MongoDB", BUCKETS_LATENCIA),
+    "travelasia_http_peticion_plantillas_segundos":
+        ("histogram", "Tiempo de cada petición renderizando plantillas Jinja", BUCKETS_LATENCIA),
+    "travelasia_http_peticion_comandos_mongodb":
+        ("histogram", "Comandos de MongoDB enviados por petición", BUCKETS_COMANDOS),
+    "travelasia_mongodb_comando_segundos":
+        ("histogram", "Duración de los comandos de MongoDB", BUCKETS_LATENCIA),
+    "travelasia_mongodb_comandos_fallidos_total":
+        ("counter", "Comandos de MongoDB que devolvieron error", None),
+    "travelasia_mongodb_pool_checkouts_total":
+        ("counter", "Conexiones tomadas del pool", None),
+    "travelasia_mongodb_pool_checkouts_fallidos_total":
+        ("counter", "Intentos de tomar una conexión del pool que fallaron", None),
+    "travelasia_mongodb_pool_espera_segundos":
+        ("histogram", "Espera hasta obtener una conexión del pool", BUCKETS_LATENCIA),
+    "travelasia_mongodb_pool_conexiones_creadas_total":
+        ("counter", "Conexiones abiertas por el pool", None),
+    "travelasia_mongodb_pool_conexiones_cerradas_total":
+        ("counter", "Conexiones cerradas por el pool", None),
+    "travelasia_cache_itinerarios_total":
+        ("counter", "Lecturas de la caché de itinerarios por resultado (local, compartido, fallo)", None),
+}
+
+INTERVALO_VOLCADO = 5
+
+
+class RegistroMetricas:
+    """Contadores e histogramas de un proceso, indexados por (nombre, etiquetas)"""
+
+    def __init__(self):
+        self._contadores = {}
+        self._histogramas = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, nombre, etiquetas=(), valor=1):
+        clave = (nombre, tuple(etiquetas))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, etiquetas=()):
+        clave = (nombre, tuple(etiquetas))
+        buckets = METRICAS[nombre][2]
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                # Cuentas por bucket (no acumuladas), suma y número de observaciones
+                histograma = self._histogramas[clave] = [[0] * len(buckets), 0.0, 0]
+            posicion = bisect_left(buckets, valor)
+            if posicion < len(buckets):
+                histograma[0][posicion] += 1
+            histograma[1] += valor
+            histograma[2] += 1
+
+    def instantanea(self):
+        """Copia serializable en JSON del estado actual"""
+        with self._lock:
+            return {
+                "contadores": [[n, list(e), v] for (n, e), v in self._contadores.items()],
+                "histogramas": [[n, list(e), list(h[0]), h[1], h[2]] for (n, e), h in self._histogramas.items()],
+            }
+
+
+def combinar(instantaneas):
+    """Suma las instantáneas de varios workers"""
+    contadores, histogramas = {}, {}
+    for instantanea in instantaneas:
+        for nombre, etiquetas, valor in instantanea.get("contadores", []):
+            clave = (nombre, tuple(map(tuple, etiquetas)))
+            contadores[clave] = contadores.get(clave, 0) + valor
+        for nombre, etiquetas, cuentas, suma, total in instantanea.get("histogramas", []):
+            clave = (nombre, tuple(map(tuple, etiquetas)))
+            actual = histogramas.setdefault(clave, [[0] * len(cuentas), 0.0, 0])
+            actual[0] = [a + b for a, b in zip(actual[0], cuentas)]
+            actual[1] += suma
+            actual[2] += total
+    return contadores, histogramas
+
+def _etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ""
+    texto = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pares)
+    return "{" + texto + "}"
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+def formato_prometheus(contadores, histogramas):
+    """Texto de exposición de Prometheus (versión 0.0.4)"""
+    lineas = []
+    for nombre, (tipo, ayuda, buckets) in METRICAS.items():
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        if tipo == "counter":
+            for (n, etiquetas), valor in sorted(contadores.items()):
+                if n == nombre:
+                    lineas.append(f"{nombre}{_etiquetas(etiquetas)} {_numero(valor)}")
+            continue
+        for (n, etiquetas), (cuentas, suma, total) in sorted(histogramas.items()):
+            if n != nombre:
+                continue
+            acumulado = 0
+            for limite, cuenta in zip(buckets, cuentas):
+                acumulado += cuenta
+                lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas, [('le', limite)])} {acumulado}")
+            lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas, [('le', '+Inf')])} {total}")
+            lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {_numero(suma)}")
+            lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {total}")
+    return "\n".join(lineas) + "\n"
+
+
+def _proceso_vivo(nombre_fichero):
+    """True si el pid de un fichero worker_<pid>.json sigue en ejecución"""
+    try:
+        os.kill(int(nombre_fichero[len("worker_"):-len(".json")]), 0)
+    except ValueError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class _EscuchaComandos(monitoring.CommandListener):
+    """Mide cada comando y lo suma a la petición en curso del mismo hilo"""
+
+    def __init__(self, metricas):
+        self.metricas = metricas
+
+    def started(self, event):
+        peticion = self.metricas.peticion_actual()
+        if peticion is not None:
+            peticion["comandos"] += 1
+
+    def succeeded(self, event):
+        self._terminar(event)
+
+    def failed(self, event):
+        self.metricas.registro.incrementar("travelasia_mongodb_comandos_fallidos_total",
+                                           [("comando", event.command_name)])
+        self._terminar(event)
+
+    def _terminar(self, event):
+        segundos = event.duration_micros / 1e6
+        self.metricas.registro.observar("travelasia_mongodb_comando_segundos", segundos,
+                                        [("comando", event.command_name)])
+        peticion = self.metricas.peticion_actual()
+        if peticion is not None:
+            peticion["mongodb"] += segundos
+
+
+class _EscuchaPool(monitoring.ConnectionPoolListener):
+    """Checkouts, esperas y conexiones del pool de pymongo"""
+
+    def __init__(self, metricas):
+        self.metricas = metricas
+        self._inicio = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._inicio.valor = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        registro = self.metricas.registro
+        registro.incrementar("travelasia_mongodb_pool_checkouts_total")
+        inicio = getattr(self._inicio, "valor", None)
+        if inicio is not None:
+            registro.observar("travelasia_mongodb_pool_espera_segundos", time.perf_counter() - inicio)
+            self._inicio.valor = None
+
+    def connection_check_out_failed(self, event):
+        self.metricas.registro.incrementar("travelasia_mongodb_pool_checkouts_fallidos_total",
+                                           [("motivo", event.reason)])
+        self._inicio.valor = None
+
+    def connection_created(self, event):
+        self.metricas.registro.incrementar("travelasia_mongodb_pool_conexiones_creadas_total")
+
+    def connection_closed(self, event):
+        self.metricas.registro.incrementar("travelasia_mongodb_pool_conexiones_cerradas_total")
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+class Metricas:
+    """Instrumentación de la aplicación y agregación entre workers"""
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or os.path.join(tempfile.gettempdir(), "travelasia_metricas")
+        self.registro = RegistroMetricas()
+        self._pid = os.getpid()
+        self._ultimo_volcado = 0.0
+        if hasattr(os, "register_at_fork"):
+            # Cada worker empieza de cero: lo heredado ya está en el fichero del padre
+            os.register_at_fork(after_in_child=self._reiniciar)
+
+    def _reiniciar(self):
+        self.registro = RegistroMetricas()
+        self._pid = os.getpid()
+        self._ultimo_volcado = 0.0
+
+    def escuchas_mongodb(self):
+        """Listeners para pasar a MongoClient(event_listeners=...)"""
+        return [_EscuchaComandos(self), _EscuchaPool(self)]
+
+    def peticion_actual(self):
+        """Acumuladores de la petición en curso de este hilo, o None fuera de una petición"""
+        if not has_request_context():
+            return None
+        return g.get("_metricas")
+
+    def instrumentar(self, app):
+        """Registra los hooks de Flask y las señales de render de plantillas"""
+
+        @app.before_request
+        def iniciar_medicion():
+            g._metricas = {"inicio": time.perf_counter(), "comandos": 0, "mongodb": 0.0, "plantillas": 0.0}
+
+        @app.after_request
+        def registrar_medicion(respuesta):
+            peticion = g.pop("_metricas", None)
+            if peticion is None:
+                return respuesta
+            etiquetas = [("endpoint", request.endpoint or "sin_ruta"), ("metodo", request.method)]
+            registro = self.registro
+            registro.incrementar("travelasia_http_peticiones_total",
+                                 etiquetas + [("estado", respuesta.status_code)])
+            registro.observar("travelasia_http_peticion_segundos",
+                              time.perf_counter() - peticion["inicio"], etiquetas)
+            registro.observar("travelasia_http_peticion_mongodb_segundos", peticion["mongodb"], etiquetas)
+            registro.observar("travelasia_http_peticion_plantillas_segundos", peticion["plantillas"], etiquetas)
+            registro.observar("travelasia_http_peticion_comandos_mongodb", peticion["comandos"], etiquetas)
+            if time.monotonic() - self._ultimo_volcado >= INTERVALO_VOLCADO:
+                self.volcar()
+            return respuesta
+
+        def inicio_render(sender, template, context, **extra):
+            peticion = self.peticion_actual()
+            if peticion is not None:
+                # Pila: una plantilla puede renderizar otras (p. ej. un parcial)
+                peticion.setdefault("renders", []).append(time.perf_counter())
+
+        def fin_render(sender, template, context, **extra):
+            peticion = self.peticion_actual()
+            if peticion is not None and peticion.get("renders"):
+                inicio = peticion["renders"].pop()
+                if not peticion["renders"]:
+                    peticion["plantillas"] += time.perf_counter() - inicio
+
+        before_render_template.connect(inicio_render, app, weak=False)
+        template_rendered.connect(fin_render, app, weak=False)
+
+    def volcar(self):
+        """Escribe la instantánea de este worker (escritura atómica con rename)"""
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            destino = os.path.join(self.directorio, f"worker_{self._pid}.json")
+            temporal = f"{destino}.{threading.get_ident()}.tmp"
+            with open(temporal, "w") as f:
+                json.dump(self.registro.instantanea(), f)
+            os.replace(temporal, destino)
+            self._ultimo_volcado = time.monotonic()
+        except OSError as e:
+            print(f"❌ Error volcando métricas: {e}")
+
+    def exportar(self):
+        """Métricas de todos los workers en formato Prometheus.
+
+        Los ficheros de workers que ya no existen se borran; Prometheus trata
+        la bajada de los totales como un reinicio de contador.
+        """
+        self.volcar()
+        instantaneas = []
+        propio = f"worker_{self._pid}.json"
+        try:
+            nombres = [n for n in os.listdir(self.directorio) if n.endswith(".json")]
+        except OSError:
+            nombres = []
+        for nombre in nombres:
+            if nombre == propio:
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            if not _proceso_vivo(nombre):
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(ruta) as f:
+                    instantaneas.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        # El worker que atiende el scrape usa su estado en memoria, no el fichero
+        instantaneas.append(self.registro.instantanea())
+        return formato_prometheus(*combinar(instantaneas))
@@ -0,0 +1,308 @@
+"""Índices y migraciones versionadas de la base de datos de TravelAsia.
+
+Se ejecuta de forma idempotente al arrancar cada worker y también como
+comando de Flask:
+
+    flask --app app indices migrar [--forzar]
+    flask --app app indices verificar
+    flask --app app indices lentas
+"""
+import datetime
+import os
+import socket
+
+import click
+from bson.objectid import ObjectId
+from flask.cli import AppGroup
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from archivo import filtro_archivables
+
+# ========== DECLARACIÓN DE ÍNDICES ==========
+
+# Minutos tras los que una migración "en_curso" se da por abandonada (worker
+# muerto a mitad por el timeout de gunicorn, un despliegue o el OOM killer)
+LEASE_MIGRACION_MINUTOS = int(os.environ.get("LEASE_MIGRACION_MINUTOS", 30))
+
+# Días que se conservan las marcas de itinerarios eliminados para la sincronización incremental
+RETENCION_TOMBSTONES_DIAS = 30
+
+# (colección, claves, opciones). Los índices que ya existían conservan su nombre por defecto.
+INDICES = [
+    ("usuarios", [("email", ASCENDING)], {"unique": True}),
+    ("itinerarios", [("usuario_id", ASCENDING), ("fecha_creacion", DESCENDING), ("_id", DESCENDING)],
+     {"name": "usuario_fecha_creacion"}),
+    ("itinerarios", [("_id", ASCENDING), ("usuario_id", ASCENDING)], {"name": "id_usuario"}),
+    ("destinos", [("pais", ASCENDING)], {}),
+    ("itinerarios", [("usuario_id", ASCENDING), ("fecha_actualizacion", ASCENDING), ("_id", ASCENDING)],
+     {"name": "usuario_fecha_actualizacion"}),
+    ("itinerarios_eliminados", [("usuario_id", ASCENDING), ("fecha_eliminacion", ASCENDING), ("_id", ASCENDING)],
+     {"name": "usuario_fecha_eliminacion"}),
+    ("itinerarios_eliminados", [("fecha_eliminacion", ASCENDING)],
+     {"name": "caducidad_tombstones", "expireAfterSeconds": RETENCION_TOMBSTONES_DIAS * 86400}),
+    # Archivo: cada rama del filtro de archivables tiene su índice; la colección fría se lista como la caliente
+    ("itinerarios", [("fecha_fin", ASCENDING)], {"name": "fecha_fin"}),
+    ("itinerarios", [("estado", ASCENDING), ("fecha_actualizacion", ASCENDING)],
+     {"name": "estado_fecha_actualizacion"}),
+    ("itinerarios_archivo", [("usuario_id", ASCENDING), ("fecha_creacion", DESCENDING), ("_id", DESCENDING)],
+     {"name": "usuario_fecha_creacion"}),
+]
+
+# Índices de versiones anteriores que quedan cubiertos por los compuestos
+INDICES_OBSOLETOS = [
+    ("itinerarios", "usuario_id_1"),
+    ("itinerarios", "fecha_creacion_-1"),
+]
+
+# Forma de las consultas calientes de cada ruta: (ruta, colección, filtro, orden)
+CONSULTAS_RUTAS = [
+    ("login/register", "usuarios", {"email": ""}, None),
+    ("profile", "usuarios", {"_id": ObjectId()}, None),
+    ("planificador/mis_itinerarios/api_itinerarios", "itinerarios",
+     {"usuario_id": ObjectId()}, [("fecha_creacion", DESCENDING), ("_id", DESCENDING)]),
+    ("ver/editar/duplicar_itinerario", "itinerarios",
+     {"_id": ObjectId(), "usuario_id": ObjectId()}, None),
+    ("view/edit", "destinos", {"_id": ObjectId()}, None),
+    ("api_itinerarios_cambios", "itinerarios",
+     {"usuario_id": ObjectId(), "fecha_actualizacion": {"$gt": datetime.datetime(1970, 1, 1)}},
+     [("fecha_actualizacion", ASCENDING), ("_id", ASCENDING)]),
+    ("api_itinerarios_cambios", "itinerarios_eliminados",
+     {"usuario_id": ObjectId(), "fecha_eliminacion": {"$gt": datetime.datetime(1970, 1, 1)}},
+     [("fecha_eliminacion", ASCENDING), ("_id", ASCENDING)]),
+    ("mis_itinerarios?archivados=1", "itinerarios_archivo",
+     {"usuario_id": ObjectId()}, [("fecha_creacion", DESCENDING), ("_id", DESCENDING)]),
+    ("archivo ejecutar", "itinerarios", filtro_archivables(datetime.datetime(2000, 1, 1)), None),
+]
+
+
+class PlanConsultaError(RuntimeError):
+    """Una consulta de una ruta se resuelve con un recorrido completo de la colección"""
+
+
+# ========== MIGRACIONES ==========
+
+def crear_indices(db):
+    """Crea los índices declarados en INDICES (create_index es idempotente)"""
+    for coleccion, claves, opciones in INDICES:
+        db[coleccion].create_index(claves, **opciones)
+
+def eliminar_indices_obsoletos(db):
+    """Elimina los índices de una sola clave que sustituyen los compuestos"""
+    for coleccion, nombre in INDICES_OBSOLETOS:
+        if nombre in db[coleccion].index_information():
+            db[coleccion].drop_index(nombre)
+
+def asignar_ids_actividades(db, tamano_lote=500):
+    """Asigna un _id propio a cada actividad de itinerario que aún no lo tenga"""
+    operaciones = []
+    pendientes = db.itinerarios.find(
+        {"actividades": {"$elemMatch": {"_id": {"$exists": False}}}},
+        {"actividades._id": 1}
+    )
+    for itinerario in pendientes:
+        for i, actividad in enumerate(itinerario.get("actividades", [])):
+            if "_id" in actividad:
+                continue
+            # El filtro por posición evita pisar una actividad que cambió entretanto
+            operaciones.append(UpdateOne(
+                {"_id": itinerario["_id"], f"actividades.{i}._id": {"$exists": False}},
+                {"$set": {f"actividades.{i}._id": ObjectId()}}
+            ))
+        if len(operaciones) >= tamano_lote:
+            db.itinerarios.bulk_write(operaciones, ordered=False)
+            operaciones = []
+    if operaciones:
+        db.itinerarios.bulk_write(operaciones, ordered=False)
+
+def inicializar_contadores_actividades(db):
+    """Calcula actividades_total y actividades_completadas en los itinerarios que no los tienen"""
+    db.itinerarios.update_many(
+        {"actividades_total": {"$exists": False}},
+        [{"$set": {
+            "actividades_total": {"$size": {"$ifNull": ["$actividades", []]}},
+            "actividades_completadas": {"$size": {"$filter": {
+                "input": {"$ifNull": ["$actividades", []]},
+                "as": "a",
+                "cond": {"$eq": ["$$a.completada", True]}
+            }}}
+        }}]
+    )
+
+def completar_fecha_actualizacion(db):
+    """Usa fecha_creacion como fecha_actualizacion en los itinerarios que no la tienen"""
+    db.itinerarios.update_many(
+        {"fecha_actualizacion": {"$exists": False}},
+        [{"$set": {"fecha_actualizacion": {"$ifNull": ["$fecha_creacion", datetime.datetime.utcnow()]}}}]
+    )
+
+# Lista ordenada de (versión, descripción, función). Nunca reordenar ni reutilizar versiones.
+MIGRACIONES = [
+    (1, "Índices compuestos para las consultas por usuario", crear_indices),
+    (2, "Eliminar índices de una sola clave obsoletos", eliminar_indices_obsoletos),
+    (3, "Identificador estable para cada actividad", asignar_ids_actividades),
+    (4, "Contadores de actividades en cada itinerario", inicializar_contadores_actividades),
+    (5, "fecha_actualizacion en todos los itinerarios", completar_fecha_actualizacion),
+]
+
+def propietario_migracion():
+    """Proceso que reclama una migración (para saber quién la dejó en curso)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def reclamar_migracion(db, version, descripcion, forzar=False):
+    """True si este proceso se queda la versión: libre, con el lease vencido o con `forzar`.
+
+    Las migraciones son idempotentes, así que retomar una cuyo worker sigue
+    vivo (una migración más larga que el lease) solo repite trabajo.
+    """
+    ahora = datetime.datetime.utcnow()
+    reclamo = {"estado": "en_curso", "fecha_inicio": ahora, "propietario": propietario_migracion()}
+    try:
+        db.migraciones.insert_one(dict(reclamo, _id=version, descripcion=descripcion))
+        return True
+    except DuplicateKeyError:
+        pass
+    filtro = {"_id": version, "estado": "en_curso"}
+    if not forzar:
+        filtro["fecha_inicio"] = {"$lt": ahora - datetime.timedelta(minutes=LEASE_MIGRACION_MINUTOS)}
+    # Atómico: de los workers que ven el mismo reclamo vencido solo uno lo retoma
+    return db.migraciones.find_one_and_update(filtro, {"$set": reclamo}) is not None
+
+def migraciones_en_curso(db):
+    """Reclamos sin terminar: bloquean esa versión y las siguientes"""
+    return list(db.migraciones.find({"estado": "en_curso"}).sort("_id", ASCENDING))
+
+def aplicar_migraciones(db, forzar=False):
+    """Aplica las migraciones pendientes y asegura los índices declarados.
+
+    Cada migración se reclama en la colección `migraciones`; si otro worker
+    la tiene en curso, este proceso se detiene ahí para no adelantarse a ella.
+    Un reclamo más antiguo que LEASE_MIGRACION_MINUTOS (o cualquiera, con
+    `forzar`) se retoma. Devuelve las versiones aplicadas aquí; las que
+    quedan bloqueadas se consultan con migraciones_en_curso().
+    """
+    aplicadas = []
+    for version, descripcion, funcion in MIGRACIONES:
+        if not reclamar_migracion(db, version, descripcion, forzar):
+            existente = db.migraciones.find_one({"_id": version}, {"estado": 1})
+            if existente and existente.get("estado") == "aplicada":
+                continue
+            return aplicadas
+
+        try:
+            funcion(db)
+        except Exception:
+            # Liberar la versión para que el siguiente arranque la reintente
+            db.migraciones.delete_one({"_id": version, "propietario": propietario_migracion()})
+            raise
+
+        db.migraciones.update_one(
+            {"_id": version},
+            {"$set": {"estado": "aplicada", "fecha_fin": datetime.datetime.utcnow()}}
+        )
+        aplicadas.append(version)
+
+    # Los índices declarados siempre deben existir, aunque alguien los borrara a mano
+    crear_indices(db)
+    return aplicadas
+
+# ========== VERIFICACIÓN DE PLANES ==========
+
+def etapas_plan(plan):
+    """Recorre un plan de explain() y devuelve todas sus etapas"""
+    etapas = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            etapas.append(plan["stage"])
+        for valor in plan.values():
+            etapas.extend(etapas_plan(valor))
+    elif isinstance(plan, list):
+        for valor in plan:
+            etapas.extend(etapas_plan(valor))
+    return etapas
+
+def verificar_planes(db):
+    """Ejecuta explain() sobre la consulta de cada ruta.
+
+    Devuelve {ruta: etapas del plan ganador} y lanza PlanConsultaError si
+    alguna consulta cae en COLLSCAN.
+    """
+    planes = {}
+    errores = []
+    for ruta, coleccion, filtro, orden in CONSULTAS_RUTAS:
+        cursor = db[coleccion].find(filtro)
+        if orden:
+            cursor = cursor.sort(orden)
+        plan_ganador = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        etapas = etapas_plan(plan_ganador)
+        planes[ruta] = etapas
+        if "COLLSCAN" in etapas:
+            errores.append(f"{ruta} ({coleccion}: {sorted(filtro)})")
+
+    if errores:
+        raise PlanConsultaError("Consultas sin índice (COLLSCAN): " + ", ".join(errores))
+    return planes
+
+# ========== COMANDOS FLASK ==========
+
+def registrar_comandos(app, obtener_db):
+    """Registra el grupo `flask indices` en la aplicación"""
+    indices_cli = AppGroup("indices", help="Índices y migraciones de MongoDB")
+
+    @indices_cli.command("migrar")
+    @click.option("--forzar", is_flag=True,
+                  help="Retoma las migraciones en curso aunque su lease no haya vencido")
+    def migrar(forzar):
+        """Aplica las migraciones pendientes y crea los índices"""
+        db = obtener_db()
+        if db is None:
+            raise click.ClickException("Base de datos no disponible")
+        aplicadas = aplicar_migraciones(db, forzar=forzar)
+        bloqueadas = migraciones_en_curso(db)
+        if not bloqueadas:
+            click.echo(f"✅ Migraciones aplicadas: {aplicadas or 'ninguna pendiente'}")
+            return
+        if aplicadas:
+            click.echo(f"✅ Migraciones aplicadas: {aplicadas}")
+        for migracion in bloqueadas:
+            click.echo(f"⏳ Migración {migracion['_id']} ({migracion.get('descripcion')}) en curso desde "
+                       f"{migracion.get('fecha_inicio'):%Y-%m-%d %H:%M} UTC por {migracion.get('propietario', '?')}")
+        raise click.ClickException(
+            f"Migraciones bloqueadas: se retoman solas pasados {LEASE_MIGRACION_MINUTOS} minutos, "
+            f"o ahora con --forzar si ese proceso ya no existe")
+
+    @indices_cli.command("verificar")
+    def verificar():
+        """Comprueba con explain() que ninguna ruta hace COLLSCAN"""
+        db = obtener_db()
+        if db is None:
+            raise click.ClickException("Base de datos no disponible")
+        try:
+            planes = verificar_planes(db)
+        except (PlanConsultaError, OperationFailure) as e:
+            raise click.ClickException(str(e))
+        for ruta, etapas in planes.items():
+            click.echo(f"✅ {ruta}: {' > '.join(etapas)}")
+
+    @indices_cli.command("lentas")
+    @click.option("--limite", default=20, show_default=True, help="Número de formas a mostrar")
+    def lentas(limite):
+        """Muestra las consultas lentas registradas y el índice sugerido para cada una"""
+        from consultas_lentas import listar_consultas_lentas
+
+        db = obtener_db()
+        if db is None:
+            raise click.ClickException("Base de datos no disponible")
+        for consulta in listar_consultas_lentas(db, limite):
+            click.echo(f"🐢 {consulta.get('coleccion')}.{consulta.get('comando')} "
+                       f"×{consulta.get('veces')} (máx. {consulta.get('max_ms', 0):.0f} ms) "
+                       f"rutas={consulta.get('rutas')}")
+            click.echo(f"   filtro={consulta.get('filtro')} orden={consulta.get('orden')}")
+            click.echo(f"   examinados: {consulta.get('claves_examinadas')} claves, "
+                       f"{consulta.get('docs_examinados')} docs → {consulta.get('devueltos')} devueltos "
+                       f"({' > '.join(consulta.get('etapas') or [])})")
+            if consulta.get("sugerencia"):
+                declarado = " (ya declarado en INDICES: falta aplicar migraciones)" if consulta.get("indice_declarado") else ""
+                click.echo(f"   💡 Índice sugerido: {[tuple(c) for c in consulta['sugerencia']]}{declarado}")
+
+    app.cli.add_command(indices_cli)
@@ -0,0 +1,155 @@
+"""Modelos compactos de los documentos que pintan las plantillas.
+
+Cada vista declara con nombre la proyección que necesita (PROYECCIONES de
+cada modelo), así que MongoDB solo envía los campos que esa vista pinta: el
+perfil no recibe el hash de la contraseña y los listados no reciben los
+arrays de actividades. El documento proyectado se convierte en un objeto con
+`__slots__` (dataclass), más pequeño que el dict del que sale.
+
+Los campos que la proyección no trae toman el valor por defecto del modelo,
+y los que el modelo no declara se descartan. Las plantillas acceden por
+atributo (`itinerario.nombre_viaje`), igual que con los dicts.
+
+La proyección None significa documento completo: es la de las vistas que
+leen el itinerario de cache_itinerarios, que comparte el documento con las
+rutas que lo copian o lo modifican.
+"""
+from dataclasses import dataclass, field, fields
+
+
+_CAMPOS = {}
+
+
+class Modelo:
+    """Construcción desde documentos de MongoDB y proyecciones por vista"""
+
+    # Sin __slots__ vacío aquí las subclases tendrían __dict__ igualmente
+    __slots__ = ()
+    PROYECCIONES = {}
+
+    @classmethod
+    def proyeccion(cls, vista):
+        """Proyección de MongoDB declarada para `vista` (KeyError si no existe)"""
+        return cls.PROYECCIONES[vista]
+
+    @classmethod
+    def desde_documento(cls, documento, **calculados):
+        """Modelo a partir de un documento (proyectado o no) y de campos calculados por la vista"""
+        nombres = _CAMPOS.get(cls)
+        if nombres is None:
+            nombres = _CAMPOS[cls] = frozenset(f.name for f in fields(cls))
+        valores = {clave: valor for clave, valor in documento.items() if clave in nombres}
+        valores.update(calculados)
+        return cls(**valores)
+
+
+@dataclass(slots=True)
+class Actividad(Modelo):
+    _id: object = None
+    actividad: str = ""
+    pais: str = ""
+    ciudad: str = ""
+    tipo: str = "cultural"
+    costo: float = 0.0
+    fecha: str = ""
+    descripcion: str = ""
+    completada: bool = False
+
+
+@dataclass(slots=True)
+class Itinerario(Modelo):
+    _id: object = None
+    nombre_viaje: str = ""
+    descripcion: str = ""
+    paises: list = field(default_factory=list)
+    fecha_inicio: str = ""
+    fecha_fin: str = ""
+    presupuesto_total: float = 0.0
+    presupuesto_restante: float = 0.0
+    estado: str = "planificando"
+    prioridad: str = "media"
+    favorito: bool = False
+    duracion_dias: int = 0
+    ruta_km: float = None
+    actividades: list = field(default_factory=list)
+    actividades_total: int = 0
+    actividades_completadas: int = 0
+    fecha_creacion: object = None
+    fecha_actualizacion: object = None
+    fecha_archivado: object = None
+    # Calculados por la vista
+    porcentaje_completado: int = 0
+    porcentaje_presupuesto: int = 0
+    dias_restantes: int = None
+
+    # fecha_creacion y _id los usa el cursor de paginación; fecha_actualizacion, la caché de fragmentos
+    PROYECCIONES = {
+        "planificador": {
+            "nombre_viaje": 1, "estado": 1, "prioridad": 1, "favorito": 1, "paises": 1,
+            "fecha_inicio": 1, "fecha_fin": 1, "presupuesto_total": 1, "presupuesto_restante": 1,
+            "actividades_total": 1, "actividades_completadas": 1,
+            "fecha_creacion": 1, "fecha_actualizacion": 1,
+        },
+        "mis_itinerarios": {
+            "nombre_viaje": 1, "descripcion": 1, "estado": 1, "favorito": 1, "paises": 1,
+            "fecha_inicio": 1, "duracion_dias": 1, "presupuesto_total": 1, "presupuesto_restante": 1,
+            "actividades_total": 1, "actividades_completadas": 1,
+            "fecha_creacion": 1, "fecha_actualizacion": 1, "fecha_archivado": 1,
+        },
+        "detalle": None,
+    }
+
+    @classmethod
+    def desde_documento(cls, documento, **calculados):
+        itinerario = super(Itinerario, cls).desde_documento(documento, **calculados)
+        itinerario.actividades = [Actividad.desde_documento(a) for a in itinerario.actividades]
+        return itinerario
+
+
+@dataclass(slots=True)
+class Usuario(Modelo):
+    _id: object = None
+    nombre: str = ""
+    email: str = ""
+    tipo_usuario: str = "viajero"
+    pais_interes: str = ""
+    presupuesto: float = 0.0
+    fecha_registro: object = None
+    # Estadísticas (materializadas en el documento o calculadas por la vista)
+    itinerarios_count: int = 0
+    viajes_activos: int = 0
+    presupuesto_total: float = 0.0
+
+    PROYECCIONES = {
+        # El login es la única lectura que necesita el hash de la contraseña
+        "login": {"nombre": 1, "email": 1, "tipo_usuario": 1, "password": 1},
+        "registro": {"_id": 1},
+        "perfil": {
+            "nombre": 1, "email": 1, "tipo_usuario": 1, "pais_interes": 1, "presupuesto": 1,
+            "fecha_registro": 1, "estadisticas": 1, "estadisticas_rev": 1, "rev_estadisticas": 1,
+        },
+    }
+
+
+@dataclass(slots=True)
+class Destino(Modelo):
+    _id: object = None
+    nombre: str = ""
+    pais: str = ""
+    ciudad: str = ""
+    descripcion: str = ""
+    mejor_epoca: str = ""
+    presupuesto: float = 0.0
+    actividades: str = ""
+    imagen: str = ""
+    calificacion: int = 0
+
+    PROYECCIONES = {
+        "tarjeta": {"nombre": 1, "pais": 1, "ciudad": 1, "imagen": 1, "calificacion": 1, "presupuesto": 1},
+        "busqueda": {"nombre": 1, "pais": 1, "ciudad": 1, "descripcion": 1, "imagen": 1, "presupuesto": 1},
+        "plan": {"nombre": 1, "pais": 1, "ciudad": 1, "actividades": 1, "calificacion": 1},
+        "detalle": {
+            "nombre": 1, "pais": 1, "ciudad": 1, "descripcion": 1, "mejor_epoca": 1, "presupuesto": 1,
+            "actividades": 1, "imagen": 1, "calificacion": 1,
+        },
+    }
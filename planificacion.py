@@ -0,0 +1,322 @@
+"""Motor de planificación de itinerarios automáticos de TravelAsia.
+
+A partir del presupuesto, la duración, el tipo de viaje y el perfil de los
+viajeros elige los países (tours de TOURS_PREDEFINIDOS), reparte los días
+entre sus ciudades y rellena cada día con actividades del catálogo (plantillas
+por ciudad y destinos de la comunidad).
+
+La selección es una mochila por grupos: cada día aporta un conjunto de
+opciones (subconjuntos de sus actividades candidatas) y se maximiza el
+interés total sin pasar del presupuesto de actividades. La programación
+dinámica usa un array de NumPy de PASOS_PRESUPUESTO posiciones, así un viaje
+de 30 días se resuelve en pocos milisegundos; si se supera el límite de
+tiempo se completa el plan con una selección voraz, que también aprovecha
+lo que el redondeo de los pasos deja sin gastar.
+"""
+import datetime
+import math
+import re
+import time
+from functools import lru_cache
+from itertools import combinations
+
+import numpy as np
+
+from busqueda import normalizar
+
+# Personas que pagan cada actividad y actividades por día según el perfil
+PERSONAS_POR_PERFIL = {"solo": 1, "pareja": 2, "familia": 4, "amigos": 4}
+ACTIVIDADES_POR_DIA = {"solo": 3, "pareja": 3, "familia": 2, "amigos": 3}
+
+# Parte del presupuesto para actividades; el resto queda para vuelos y alojamiento
+FRACCION_ACTIVIDADES = 0.4
+DIAS_POR_PAIS = 7
+MAX_PAISES = 3
+DIAS_MIN_CIUDAD = 2
+MAX_CANDIDATOS_DIA = 6
+MAX_DURACION = 90
+PASOS_PRESUPUESTO = 1000
+LIMITE_MS = 40
+# Interés de la 1ª, 2ª y 3ª actividad de un mismo día (rendimientos decrecientes)
+DESCUENTO_DIA = (1.0, 0.8, 0.6)
+
+# Tipo de actividad (los del formulario de ver_itinerario) que corresponde a cada tipo de viaje
+TIPO_ACTIVIDAD = {
+    "cultural": "cultural",
+    "aventura": "aventura",
+    "relax": "relajacion",
+    "gastronomia": "gastronomia",
+    "shopping": "compras",
+}
+
+# Afinidad de cada tipo de viaje con cada tipo de actividad
+AFINIDAD = {
+    "cultural": {"cultural": 1.0, "gastronomia": 0.6, "naturaleza": 0.5, "compras": 0.3, "relajacion": 0.3, "aventura": 0.3},
+    "aventura": {"aventura": 1.0, "naturaleza": 0.9, "gastronomia": 0.4, "cultural": 0.4, "relajacion": 0.3, "compras": 0.2},
+    "relax": {"relajacion": 1.0, "naturaleza": 0.7, "gastronomia": 0.6, "cultural": 0.4, "compras": 0.4, "aventura": 0.2},
+    "gastronomia": {"gastronomia": 1.0, "cultural": 0.6, "compras": 0.5, "relajacion": 0.4, "naturaleza": 0.3, "aventura": 0.2},
+    "shopping": {"compras": 1.0, "gastronomia": 0.7, "cultural": 0.5, "relajacion": 0.4, "naturaleza": 0.2, "aventura": 0.2},
+}
+
+# Ajuste del interés según quién viaja
+PREFERENCIAS_PERFIL = {
+    "solo": {"aventura": 1.1, "cultural": 1.1},
+    "pareja": {"relajacion": 1.15, "gastronomia": 1.1},
+    "familia": {"relajacion": 1.2, "naturaleza": 1.15, "aventura": 0.8},
+    "amigos": {"aventura": 1.2, "gastronomia": 1.1, "compras": 1.05},
+}
+
+# Actividades por ciudad: (texto, fracción de la tarifa diaria del tour por persona)
+PLANTILLAS = {
+    "cultural": [("Templos y santuarios de {ciudad}", 0.30), ("Museo y barrio histórico de {ciudad}", 0.15)],
+    "naturaleza": [("Parque natural cerca de {ciudad}", 0.20), ("Miradores y jardines de {ciudad}", 0.05)],
+    "gastronomia": [("Clase de cocina local en {ciudad}", 0.40), ("Ruta de comida callejera por {ciudad}", 0.12)],
+    "aventura": [("Excursión de trekking desde {ciudad}", 0.45), ("Ruta en bicicleta o kayak por {ciudad}", 0.25)],
+    "compras": [("Distrito comercial de {ciudad}", 0.30), ("Mercado nocturno de {ciudad}", 0.08)],
+    "relajacion": [("Spa y masaje tradicional en {ciudad}", 0.35), ("Tarde libre en {ciudad}", 0.0)],
+}
+# Un destino de la comunidad cuesta esta fracción de la tarifa diaria del país
+FRACCION_DESTINO = 0.25
+
+# Palabras de un destino que indican el tipo de actividad (prefijos normalizados)
+PALABRAS_TIPO = {
+    "templo": "cultural", "museo": "cultural", "palacio": "cultural", "santuario": "cultural", "historic": "cultural",
+    "playa": "relajacion", "spa": "relajacion", "masaje": "relajacion", "isla": "relajacion",
+    "trekking": "aventura", "buceo": "aventura", "surf": "aventura", "escalada": "aventura", "rafting": "aventura",
+    "montana": "naturaleza", "parque": "naturaleza", "selva": "naturaleza", "lago": "naturaleza", "volcan": "naturaleza",
+    "mercado": "compras", "compras": "compras", "tienda": "compras",
+    "comida": "gastronomia", "gastronom": "gastronomia", "cocina": "gastronomia", "restaurante": "gastronomia",
+}
+_PALABRA_TIPO = re.compile(r"\b(" + "|".join(PALABRAS_TIPO) + ")")
+
+
+class PlanificacionError(ValueError):
+    """Datos de planificación inválidos"""
+
+
+def dias_tour(tour):
+    """Días de un tour a partir de su texto de duración ('10 días' → 10)"""
+    try:
+        return max(1, int(str(tour.get("duracion", "")).split()[0]))
+    except (ValueError, IndexError):
+        return DIAS_POR_PAIS
+
+def tipo_destino(destino):
+    """Tipo de actividad de un destino según las palabras de su nombre y actividades"""
+    coincidencia = _PALABRA_TIPO.search(normalizar(f"{destino.get('nombre', '')} {destino.get('actividades', '')}"))
+    return PALABRAS_TIPO[coincidencia.group(1)] if coincidencia else "cultural"
+
+@lru_cache(maxsize=1024)
+def normalizar_ciudad(ciudad):
+    """Nombre de ciudad normalizado (los destinos repiten las mismas ciudades)"""
+    return normalizar(ciudad)
+
+def repartir(total, partes):
+    """Divide `total` días en `partes` bloques consecutivos lo más iguales posible"""
+    base, resto = divmod(total, partes)
+    return [base + (1 if i < resto else 0) for i in range(partes)]
+
+
+class PlanificadorViajes:
+    """Genera planes día a día sobre el catálogo de tours"""
+
+    def __init__(self, tours):
+        self.tours = {}
+        for clave, tour in tours.items():
+            self.tours[clave] = {
+                "pais": tour["pais"],
+                "ciudades": [c.strip() for c in tour["ciudad"].split(",") if c.strip()],
+                "tarifa_diaria": tour["precio_base"] / dias_tour(tour),
+                "tipo": TIPO_ACTIVIDAD.get(tour.get("experiencia"), "cultural"),
+            }
+
+    def elegir_paises(self, presupuesto, duracion, tipo_viaje, viajeros):
+        """Claves de los tours que mejor encajan con el tipo de viaje y caben en el presupuesto"""
+        self._validar(presupuesto, duracion, tipo_viaje, viajeros)
+        numero = max(1, min(MAX_PAISES, math.ceil(duracion / DIAS_POR_PAIS), len(self.tours)))
+        dias = duracion / numero
+        presupuesto_estancia = presupuesto * (1 - FRACCION_ACTIVIDADES) / numero
+        personas = PERSONAS_POR_PERFIL[viajeros]
+
+        def puntuacion(clave):
+            tour = self.tours[clave]
+            afinidad = AFINIDAD[tipo_viaje][tour["tipo"]] * PREFERENCIAS_PERFIL[viajeros].get(tour["tipo"], 1.0)
+            # Penaliza lo que la estancia estimada se pase del presupuesto de cada país
+            exceso = tour["tarifa_diaria"] * personas * dias / presupuesto_estancia - 1
+            return afinidad - max(0.0, exceso)
+
+        return sorted(self.tours, key=puntuacion, reverse=True)[:numero]
+
+    def planificar(self, presupuesto, duracion, tipo_viaje, viajeros, destinos=(),
+                   paises=None, fecha_inicio=None, limite_ms=LIMITE_MS):
+        """Plan día a día: países, actividades con fecha y coste, y cómo se resolvió"""
+        inicio = time.perf_counter()
+        limite = inicio + limite_ms / 1000
+        self._validar(presupuesto, duracion, tipo_viaje, viajeros)
+        paises = paises or self.elegir_paises(presupuesto, duracion, tipo_viaje, viajeros)
+        fecha_inicio = fecha_inicio or datetime.date.today()
+
+        dias = self._dias(paises, duracion, fecha_inicio)
+        candidatos = self._candidatos(dias, destinos, tipo_viaje, viajeros)
+        presupuesto_actividades = presupuesto * FRACCION_ACTIVIDADES
+        maximo = ACTIVIDADES_POR_DIA[viajeros]
+
+        elegidas, metodo = self._mochila(candidatos, presupuesto_actividades, maximo, limite), "dp"
+        if elegidas is None:
+            elegidas, metodo = [[] for _ in candidatos], "voraz"
+        # Lo que el redondeo de la mochila dejó sin gastar se rellena de forma voraz
+        elegidas = self._voraz(candidatos, presupuesto_actividades, maximo, elegidas)
+
+        actividades = []
+        for dia, seleccion in zip(dias, elegidas):
+            for candidato in sorted(seleccion, key=lambda c: -c["valor"]):
+                actividades.append({
+                    "pais": dia["pais"],
+                    "ciudad": dia["ciudad"],
+                    "actividad": candidato["actividad"],
+                    "tipo": candidato["tipo"],
+                    "costo": candidato["costo"],
+                    "fecha": dia["fecha"],
+                })
+        return {
+            "paises": [self.tours[clave]["pais"] for clave in paises],
+            "ciudades": list(dict.fromkeys(dia["ciudad"] for dia in dias)),
+            "fecha_inicio": dias[0]["fecha"],
+            "fecha_fin": dias[-1]["fecha"],
+            "actividades": actividades,
+            "costo_actividades": round(sum(a["costo"] for a in actividades), 2),
+            "interes": round(sum(self._valor_dia(s) for s in elegidas), 3),
+            "metodo": metodo,
+            "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 2),
+        }
+
+    # ========== PASOS INTERNOS ==========
+
+    def _validar(self, presupuesto, duracion, tipo_viaje, viajeros):
+        if tipo_viaje not in AFINIDAD:
+            raise PlanificacionError(f"Tipo de viaje no reconocido: {tipo_viaje}")
+        if viajeros not in PERSONAS_POR_PERFIL:
+            raise PlanificacionError(f"Perfil de viajeros no reconocido: {viajeros}")
+        if not 1 <= duracion <= MAX_DURACION:
+            raise PlanificacionError(f"La duración debe estar entre 1 y {MAX_DURACION} días")
+        if presupuesto <= 0:
+            raise PlanificacionError("El presupuesto debe ser mayor que 0")
+
+    def _dias(self, paises, duracion, fecha_inicio):
+        """Asigna a cada día un país y una ciudad en bloques consecutivos"""
+        dias = []
+        for clave, dias_pais in zip(paises, repartir(duracion, len(paises))):
+            tour = self.tours[clave]
+            ciudades = tour["ciudades"][:max(1, dias_pais // DIAS_MIN_CIUDAD)]
+            for ciudad, dias_ciudad in zip(ciudades, repartir(dias_pais, len(ciudades))):
+                for _ in range(dias_ciudad):
+                    fecha = fecha_inicio + datetime.timedelta(days=len(dias))
+                    dias.append({"tour": clave, "pais": tour["pais"], "ciudad": ciudad,
+                                 "fecha": fecha.strftime("%Y-%m-%d")})
+        return dias
+
+    def _candidatos(self, dias, destinos, tipo_viaje, viajeros):
+        """Actividades candidatas de cada día, sin repetir ninguna entre días de la misma ciudad"""
+        personas = PERSONAS_POR_PERFIL[viajeros]
+        preferencias = PREFERENCIAS_PERFIL[viajeros]
+
+        def candidato(actividad, tipo, costo_persona, calidad):
+            return {"actividad": actividad, "tipo": tipo, "costo": round(costo_persona * personas, 2),
+                    "valor": AFINIDAD[tipo_viaje][tipo] * preferencias.get(tipo, 1.0) * calidad}
+
+        # Días de cada bloque (tour, ciudad), en orden
+        bloques = {}
+        for indice, dia in enumerate(dias):
+            bloques.setdefault((dia["tour"], dia["ciudad"]), []).append(indice)
+
+        # Los destinos van a la ciudad del mismo nombre o, si no está en el plan, a la primera del país
+        ciudades_pais = {}
+        for clave in bloques:
+            ciudades_pais.setdefault(self.tours[clave[0]]["pais"], {}).setdefault(normalizar_ciudad(clave[1]), clave)
+        destinos_bloque = {}
+        for destino in destinos:
+            ciudades = ciudades_pais.get(destino.get("pais"))
+            if ciudades:
+                bloque = ciudades.get(normalizar_ciudad(destino.get("ciudad"))) or next(iter(ciudades.values()))
+                destinos_bloque.setdefault(bloque, []).append(destino)
+
+        por_dia = [[] for _ in dias]
+        for (clave, ciudad), indices in bloques.items():
+            tarifa = self.tours[clave]["tarifa_diaria"]
+            lista = [candidato(texto.format(ciudad=ciudad), tipo, tarifa * fraccion, 1.0 - 0.1 * posicion)
+                     for tipo, plantillas in PLANTILLAS.items()
+                     for posicion, (texto, fraccion) in enumerate(plantillas)]
+            for destino in destinos_bloque.get((clave, ciudad), []):
+                calidad = (destino.get("calificacion") or 3) / 4
+                lugar = destino.get("ciudad") or ciudad
+                texto = f"Visita a {destino['nombre']}" + (f" ({lugar})" if normalizar_ciudad(lugar) != normalizar_ciudad(ciudad) else "")
+                lista.append(candidato(texto, tipo_destino(destino), tarifa * FRACCION_DESTINO, calidad))
+            lista.sort(key=lambda c: -c["valor"])
+            # Reparto alterno: el día i del bloque recibe las candidatas i, i+n, i+2n...
+            for posicion, indice in enumerate(indices):
+                por_dia[indice] = lista[posicion::len(indices)][:MAX_CANDIDATOS_DIA]
+        return por_dia
+
+    def _valor_dia(self, seleccion):
+        valores = sorted((c["valor"] for c in seleccion), reverse=True)
+        return sum(valor * descuento for valor, descuento in zip(valores, DESCUENTO_DIA))
+
+    def _opciones(self, candidatos, maximo, unidad):
+        """Subconjuntos de las candidatas de un día no dominados: (coste en pasos, interés, subconjunto)"""
+        opciones = []
+        for tamano in range(min(maximo, len(candidatos)) + 1):
+            for subconjunto in combinations(candidatos, tamano):
+                coste = math.ceil(round(sum(c["costo"] for c in subconjunto) / unidad, 6))
+                if coste <= PASOS_PRESUPUESTO:
+                    opciones.append((coste, self._valor_dia(subconjunto), subconjunto))
+        # Frontera de Pareto: más caro solo si aporta más interés
+        opciones.sort(key=lambda o: (o[0], -o[1]))
+        frontera, mejor = [], -1.0
+        for opcion in opciones:
+            if opcion[1] > mejor:
+                frontera.append(opcion)
+                mejor = opcion[1]
+        return frontera
+
+    def _mochila(self, candidatos, presupuesto, maximo, limite):
+        """Mochila por grupos con el presupuesto discretizado; None si se agota el tiempo"""
+        unidad = presupuesto / PASOS_PRESUPUESTO
+        # mejor[b] = máximo interés de los días ya vistos gastando como mucho b pasos
+        mejor = np.zeros(PASOS_PRESUPUESTO + 1)
+        tablas, opciones_dias = [], []
+        for candidatos_dia in candidatos:
+            if time.perf_counter() > limite:
+                return None
+            opciones = self._opciones(candidatos_dia, maximo, unidad)
+            nuevo = np.full(PASOS_PRESUPUESTO + 1, -np.inf)
+            for coste, valor, _ in opciones:
+                np.maximum(nuevo[coste:], mejor[:PASOS_PRESUPUESTO + 1 - coste] + valor, out=nuevo[coste:])
+            tablas.append(mejor)
+            opciones_dias.append(opciones)
+            mejor = nuevo
+
+        # Reconstrucción hacia atrás desde el presupuesto completo
+        elegidas, pasos = [], PASOS_PRESUPUESTO
+        for anterior, opciones in zip(reversed(tablas), reversed(opciones_dias)):
+            objetivo = mejor[pasos]
+            for coste, valor, subconjunto in opciones:
+                if coste <= pasos and math.isclose(anterior[pasos - coste] + valor, objetivo, abs_tol=1e-9):
+                    elegidas.append(subconjunto)
+                    pasos -= coste
+                    break
+            mejor = anterior
+        return elegidas[::-1]
+
+    def _voraz(self, candidatos, presupuesto, maximo, elegidas):
+        """Añade actividades por interés/coste a una selección mientras quede presupuesto"""
+        elegidas = [list(seleccion) for seleccion in elegidas]
+        usadas = {id(c) for seleccion in elegidas for c in seleccion}
+        orden = sorted(((c["valor"] / (c["costo"] + 1), dia, c)
+                        for dia, lista in enumerate(candidatos) for c in lista if id(c) not in usadas),
+                       key=lambda t: -t[0])
+        restante = presupuesto - sum(c["costo"] for seleccion in elegidas for c in seleccion)
+        for _, dia, candidato in orden:
+            if len(elegidas[dia]) < maximo and candidato["costo"] <= restante:
+                elegidas[dia].append(candidato)
+                restante -= candidato["costo"]
+        return elegidas
@@ -0,0 +1,90 @@
+"""Respuestas precalculadas para las páginas del catálogo.
+
+El catálogo de tours es inmutable durante la vida del proceso, así que estas
+páginas se generan una sola vez por worker y se guardan como bytes, con su
+variante gzip y un ETag fuerte. Cada petición posterior solo compara el
+ETag (304 Not Modified) o copia los bytes ya codificados.
+"""
+import gzip
+import hashlib
+import threading
+from functools import wraps
+
+from flask import Response, request, session
+
+MAX_AGE_POR_DEFECTO = 300
+
+
+class RespuestaPrecalculada:
+    """Cuerpo ya codificado de una respuesta, con su versión gzip y su ETag"""
+
+    def __init__(self, cuerpo, mimetype, max_age=MAX_AGE_POR_DEFECTO):
+        self.cuerpo = cuerpo
+        self.cuerpo_gzip = gzip.compress(cuerpo, compresslevel=9)
+        self.mimetype = mimetype
+        self.max_age = max_age
+        self.etag = hashlib.sha256(cuerpo).hexdigest()[:32]
+        # Cada codificación es una representación distinta: necesita su propio ETag fuerte
+        self.etag_gzip = self.etag + "-gz"
+
+    def servir(self):
+        """Construye la respuesta para la petición actual (200 o 304)"""
+        usar_gzip = "gzip" in request.accept_encodings
+        etag = self.etag_gzip if usar_gzip else self.etag
+
+        if request.if_none_match.contains(etag):
+            respuesta = Response(status=304)
+        else:
+            respuesta = Response(self.cuerpo_gzip if usar_gzip else self.cuerpo, mimetype=self.mimetype)
+            if usar_gzip:
+                respuesta.headers["Content-Encoding"] = "gzip"
+
+        respuesta.set_etag(etag)
+        respuesta.headers["Cache-Control"] = f"public, max-age={self.max_age}"
+        respuesta.vary.add("Accept-Encoding")
+        return respuesta
+
+
+_respuestas = {}
+_lock = threading.Lock()
+
+def es_peticion_anonima():
+    """True si la página no depende de la sesión (sin usuario ni mensajes flash)"""
+    return "user_id" not in session and not session.get("_flashes")
+
+def obtener_respuesta(clave, construir, max_age=MAX_AGE_POR_DEFECTO):
+    """Devuelve la respuesta precalculada de `clave`, construyéndola la primera vez"""
+    respuesta = _respuestas.get(clave)
+    if respuesta is None:
+        with _lock:
+            respuesta = _respuestas.get(clave)
+            if respuesta is None:
+                generada = construir()
+                if isinstance(generada, str):
+                    generada = Response(generada, mimetype="text/html")
+                respuesta = RespuestaPrecalculada(generada.get_data(), generada.mimetype, max_age)
+                _respuestas[clave] = respuesta
+    return respuesta
+
+def precalculada(max_age=MAX_AGE_POR_DEFECTO, solo_anonimas=True):
+    """Decorador: sirve la vista desde bytes precalculados.
+
+    Con `solo_anonimas`, las peticiones con sesión iniciada o mensajes flash
+    pendientes se renderizan normalmente, porque la barra de navegación
+    depende de la sesión. La clave es la ruta, sin la query string.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if solo_anonimas and not es_peticion_anonima():
+                return vista(*args, **kwargs)
+            respuesta = obtener_respuesta(request.path, lambda: vista(*args, **kwargs), max_age)
+            return respuesta.servir()
+        return envoltura
+    return decorador
+
+def precalcular(app, rutas):
+    """Genera de antemano las respuestas de `rutas` (p. ej. al arrancar con --preload)"""
+    cliente = app.test_client()
+    for ruta in rutas:
+        cliente.get(ruta, headers={"Accept-Encoding": "gzip"})
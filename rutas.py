@@ -0,0 +1,166 @@
+"""Orden de las paradas de un itinerario por distancia de círculo máximo.
+
+La matriz de distancias (haversine, en km) entre todos los países de
+COORDENADAS_PAISES y las ciudades de COORDENADAS_CIUDADES se calcula una vez
+al importar, con operaciones vectorizadas de NumPy. Ordenar una ruta es
+entonces buscar el camino abierto más corto que visita todas las paradas:
+
+- Hasta EXACTO_HASTA paradas se evalúan todas las permutaciones de golpe
+  sobre una tabla precalculada (resultado exacto).
+- Con más paradas, vecino más próximo desde cada inicio y mejora con 2-opt.
+
+Las rutas ya resueltas se guardan en una caché LRU, así que repetir una
+combinación de paradas cuesta microsegundos.
+"""
+from functools import lru_cache
+from itertools import permutations
+
+import numpy as np
+
+from catalogo import COORDENADAS_CIUDADES, COORDENADAS_PAISES
+
+RADIO_TIERRA_KM = 6371.0
+EXACTO_HASTA = 7
+MAX_PARADAS = 60
+
+
+class RutaError(ValueError):
+    """Paradas de ruta inválidas"""
+
+
+def matriz_haversine(latitudes, longitudes):
+    """Matriz (n, n) de distancias de círculo máximo en km entre puntos en grados"""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lng = np.radians(np.asarray(longitudes, dtype=np.float64))
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+@lru_cache(maxsize=None)
+def _permutaciones(n):
+    """Todas las permutaciones de range(n) como array (n!, n)"""
+    return np.array(list(permutations(range(n))), dtype=np.intp).reshape(-1, n)
+
+def longitud(distancias, orden):
+    """Longitud de un camino abierto que sigue `orden` sobre la matriz"""
+    return float(sum(distancias[a, b] for a, b in zip(orden, orden[1:])))
+
+def orden_exacto(distancias, fijar_inicio=False):
+    """Camino abierto más corto probando todas las permutaciones (fijar_inicio: empieza en 0)"""
+    n = len(distancias)
+    permutaciones = _permutaciones(n)
+    if fijar_inicio:
+        permutaciones = permutaciones[permutaciones[:, 0] == 0]
+    costes = distancias[permutaciones[:, :-1], permutaciones[:, 1:]].sum(axis=1)
+    return [int(i) for i in permutaciones[int(np.argmin(costes))]]
+
+def vecino_mas_proximo(distancias, inicio):
+    """Camino que siempre salta a la parada pendiente más cercana"""
+    pendientes = np.ones(len(distancias), dtype=bool)
+    orden = [inicio]
+    pendientes[inicio] = False
+    while pendientes.any():
+        actual = orden[-1]
+        siguiente = int(np.argmin(np.where(pendientes, distancias[actual], np.inf)))
+        orden.append(siguiente)
+        pendientes[siguiente] = False
+    return orden
+
+def dos_opt(distancias, orden, fijar_inicio=False):
+    """Invierte tramos del camino abierto mientras alguno lo acorte"""
+    orden = np.array(orden, dtype=np.intp)
+    n = len(orden)
+    mejora = True
+    while mejora:
+        mejora = False
+        for i in range(1 if fijar_inicio else 0, n - 1):
+            # Invertir orden[i..j]: cambian la arista de entrada a i y la de salida de j
+            j = np.arange(i + 1, n)
+            antes = distancias[orden[i - 1], orden[i]] if i > 0 else 0.0
+            despues = np.where(j < n - 1, distancias[orden[j], orden[np.minimum(j + 1, n - 1)]], 0.0)
+            nueva_entrada = distancias[orden[i - 1], orden[j]] if i > 0 else np.zeros(len(j))
+            nueva_salida = np.where(j < n - 1, distancias[orden[i], orden[np.minimum(j + 1, n - 1)]], 0.0)
+            delta = nueva_entrada + nueva_salida - antes - despues
+            mejor = int(np.argmin(delta))
+            if delta[mejor] < -1e-9:
+                orden[i:j[mejor] + 1] = orden[i:j[mejor] + 1][::-1].copy()
+                mejora = True
+    return [int(i) for i in orden]
+
+def orden_heuristico(distancias, fijar_inicio=False):
+    """Vecino más próximo desde cada inicio posible, el mejor mejorado con 2-opt"""
+    inicios = [0] if fijar_inicio else range(len(distancias))
+    candidatos = [vecino_mas_proximo(distancias, inicio) for inicio in inicios]
+    mejor = min(candidatos, key=lambda orden: longitud(distancias, orden))
+    return dos_opt(distancias, mejor, fijar_inicio)
+
+
+class MatrizDistancias:
+    """Distancias precalculadas entre los puntos conocidos y orden óptimo de rutas"""
+
+    def __init__(self, coordenadas):
+        self.nombres = list(coordenadas)
+        self.indice = {nombre: i for i, nombre in enumerate(self.nombres)}
+        self.km = matriz_haversine([coordenadas[n]["lat"] for n in self.nombres],
+                                   [coordenadas[n]["lng"] for n in self.nombres])
+        self.km.setflags(write=False)
+
+    def __contains__(self, nombre):
+        return nombre in self.indice
+
+    def distancia(self, origen, destino):
+        """Km entre dos puntos conocidos"""
+        return float(self.km[self.indice[origen], self.indice[destino]])
+
+    def ordenar(self, paradas, inicio=None):
+        """Ruta más corta por las paradas conocidas; las desconocidas se añaden al final.
+
+        Devuelve {paradas, distancia_km, distancia_original_km, tramos, exacta, desconocidas}.
+        """
+        paradas = list(dict.fromkeys(p for p in paradas if p))
+        if len(paradas) > MAX_PARADAS:
+            raise RutaError(f"Como máximo {MAX_PARADAS} paradas por ruta")
+        if inicio is not None and inicio not in paradas:
+            raise RutaError(f"La parada inicial {inicio} no está en la ruta")
+        conocidas = [p for p in paradas if p in self.indice]
+        desconocidas = [p for p in paradas if p not in self.indice]
+        fijar_inicio = inicio in self.indice
+        # Clave de caché independiente del orden de entrada; la parada inicial va primera
+        indices = sorted(self.indice[p] for p in conocidas if p != inicio)
+        if fijar_inicio:
+            indices.insert(0, self.indice[inicio])
+        orden, exacta = self._ordenar(tuple(indices), fijar_inicio)
+        ordenadas = [self.nombres[i] for i in orden]
+        tramos = [{"desde": a, "hasta": b, "km": round(self.distancia(a, b), 1)}
+                  for a, b in zip(ordenadas, ordenadas[1:])]
+        original = [self.indice[p] for p in paradas if p in self.indice]
+        return {
+            "paradas": ordenadas + desconocidas,
+            "distancia_km": round(sum(t["km"] for t in tramos), 1),
+            "distancia_original_km": round(longitud(self.km, original), 1),
+            "tramos": tramos,
+            "exacta": exacta,
+            "desconocidas": desconocidas,
+        }
+
+    @lru_cache(maxsize=4096)
+    def _ordenar(self, indices, fijar_inicio):
+        """Orden (en índices de la matriz) de las paradas; cacheado por combinación"""
+        if len(indices) <= 2:
+            return indices, True
+        distancias = self.km[np.ix_(indices, indices)]
+        exacta = len(indices) <= EXACTO_HASTA
+        local = orden_exacto(distancias, fijar_inicio) if exacta else orden_heuristico(distancias, fijar_inicio)
+        return tuple(indices[i] for i in local), exacta
+
+
+# Países y ciudades del catálogo; si un nombre es país y ciudad (Singapur) se usa el de la ciudad
+matriz_distancias = MatrizDistancias({**COORDENADAS_PAISES, **COORDENADAS_CIUDADES})
+# Tablas de permutaciones del orden exacto generadas al importar, no en la primera petición
+for _n in range(3, EXACTO_HASTA + 1):
+    _permutaciones(_n)
+
+def ordenar_paradas(paradas, inicio=None):
+    """Ruta más corta por países y ciudades del catálogo (ver MatrizDistancias.ordenar)"""
+    return matriz_distancias.ordenar(paradas, inicio)
@@ -0,0 +1,38 @@
+"""Serialización JSON de documentos de MongoDB para las APIs y exportaciones.
+
+Un único `JSONEncoder` reutilizado (sin espacios, sin escapar Unicode) que
+entiende los tipos BSON que guardamos: ObjectId como texto y fechas en el
+mismo formato HTTP que usa `jsonify`, para que la respuesta JSON y la NDJSON
+de un mismo documento sean idénticas campo a campo.
+"""
+import datetime
+import json
+import uuid
+from decimal import Decimal
+
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from werkzeug.http import http_date
+
+
+def valor_json(valor):
+    """Convierte un tipo BSON que json no conoce"""
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, (datetime.datetime, datetime.date)):
+        return http_date(valor)
+    if isinstance(valor, Decimal128):
+        return str(valor.to_decimal())
+    if isinstance(valor, (Decimal, uuid.UUID)):
+        return str(valor)
+    raise TypeError(f"Tipo no serializable a JSON: {type(valor).__name__}")
+
+_codificador = json.JSONEncoder(default=valor_json, separators=(",", ":"), ensure_ascii=False)
+
+def a_json(documento):
+    """Documento como texto JSON compacto"""
+    return _codificador.encode(documento)
+
+def linea_ndjson(documento):
+    """Documento como una línea NDJSON (bytes UTF-8 terminados en salto de línea)"""
+    return (_codificador.encode(documento) + "\n").encode("utf-8")